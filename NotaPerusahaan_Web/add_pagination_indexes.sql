@@ -0,0 +1,17 @@
+-- Add pagination and search indexes to an existing receipts table
+-- Jalankan script ini di Supabase SQL Editor
+
+-- Keyset pagination for GET /api/receipts: (created_at, id) newest first
+CREATE INDEX IF NOT EXISTS idx_receipts_created_at_id ON receipts(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_receipts_company_created_at_id ON receipts(company_code, created_at DESC, id DESC);
+
+-- Trigram indexes for the history search (?q=, ILIKE '%...%')
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_receipts_receipt_number_trgm ON receipts USING GIN (receipt_number gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_receipts_recipient_trgm ON receipts USING GIN (recipient gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_receipts_company_name_trgm ON receipts USING GIN (company_name gin_trgm_ops);
+
+-- Verify the indexes were added
+SELECT indexname, indexdef FROM pg_indexes WHERE tablename = 'receipts';
+
+SELECT 'Pagination indexes added successfully' as status;
@@ -1,37 +1,189 @@
-from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for
-from supabase import create_client, Client
+from flask import Flask, render_template, request, jsonify, send_file, session, redirect, url_for, make_response, g
 from config import Config
+from database import pool_stats
+from storage import init_storage, get_storage, get_archive
+from receipt_numbers import ReceiptNumberError
+from repository import QueryError
+from export import write_export
+from cache import TTLCache
+from receipt_pdf import generate_receipt_pdf
+from pdf_cache import PDFCache, content_hash, render_cached, add_footer
+from pdf_batch import render_batch, merge_pdfs, write_zip, get_executor
+from render_pool import RenderPool, PoolFull
+from events import EventBroadcaster, TooManyClients
+from recipients import RecipientIndex, load_recipients
+from sales_report import build_report as build_sales_report, rebuild_rollups
+from bulk_import import BulkImport, WORKBOOK_SUFFIXES, CSV_SUFFIXES
+from jobs import JobRunner, JobError
+from profiler import Profiler, flamegraph_svg
+import metrics
+from metrics import REQUEST_SECONDS, RESPONSE_BYTES, PDF_RENDER_SECONDS, PDF_BYTES, CONDITIONAL_REQUESTS
 import os
-import pandas as pd
-from datetime import datetime
 import io
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+import tempfile
+from datetime import datetime, date, timedelta, timezone
 import hashlib
+import hmac
 import secrets
+import threading
+import time
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
 app.config.from_object(Config)
 app.secret_key = app.config.get('SECRET_KEY', 'rahasia123456789')
+init_storage(app.config)
 
-def get_supabase():
-    """Get Supabase client"""
-    try:
-        if not app.config.get('SUPABASE_URL') or not app.config.get('SUPABASE_KEY'):
-            return None
-        
-        supabase: Client = create_client(
-            app.config['SUPABASE_URL'],
-            app.config['SUPABASE_KEY']
+# /api/stats is polled by every open tab; counts are cached briefly and
+# dropped whenever receipts are created or exported
+stats_cache = TTLCache(app.config.get('STATS_CACHE_TTL', 15))
+
+# Version of the receipts table behind the ETags of the read endpoints; a
+# revalidation with a current ETag is answered 304 without a query
+watermark_cache = TTLCache(app.config.get('WATERMARK_TTL', 5))
+
+# Decode logos and load font metrics now rather than on the first print
+if app.config.get('WARM_UP_ON_START', True):
+    from pdf_assets import get_assets
+    get_assets()
+
+# Rendered nota pages by content hash (see pdf_cache.py)
+pdf_cache = PDFCache(
+    max_bytes=app.config.get('PDF_CACHE_MAX_BYTES', 32 * 1024 * 1024),
+    disk_dir=app.config.get('PDF_CACHE_DIR') or None
+)
+
+# Change feed for open tabs (/api/events): new nota, finished exports, new counts
+broadcaster = EventBroadcaster(
+    max_clients=app.config.get('EVENTS_MAX_CLIENTS', 500),
+    keepalive=app.config.get('EVENTS_KEEPALIVE_SECONDS', 15)
+)
+
+# Renders wait here for a free render thread instead of piling onto the
+# request threads; /login and /api/stats stay fast during print rushes
+render_pool = RenderPool(
+    workers=app.config.get('PDF_RENDER_WORKERS', 1),
+    max_queue=app.config.get('PDF_RENDER_QUEUE', 16),
+    per_user=app.config.get('PDF_RENDER_PER_USER', 2)
+)
+
+# Stack sampler for a share of requests, switched on by an admin when a
+# route is slow (/api/admin/profiler)
+profiler = Profiler(
+    rate=app.config.get('PROFILER_SAMPLE_RATE', 0.05),
+    interval=app.config.get('PROFILER_INTERVAL_MS', 5) / 1000,
+    max_stacks=app.config.get('PROFILER_MAX_STACKS', 20000),
+    enabled=app.config.get('PROFILER_ENABLED', False)
+)
+
+# Recipient autocomplete, built in the background so start-up is not delayed
+recipient_index = RecipientIndex()
+_recipient_loader = None
+_recipient_loader_lock = threading.Lock()
+
+
+def start_recipient_index():
+    """Start building the recipient index, once per process"""
+    global _recipient_loader
+    with _recipient_loader_lock:
+        if _recipient_loader is None and get_storage() is not None:
+            _recipient_loader = threading.Thread(
+                target=load_recipients, args=(recipient_index, get_storage(), get_archive()),
+                name='recipient-index', daemon=True
+            )
+            _recipient_loader.start()
+
+
+if app.config.get('WARM_UP_ON_START', True):
+    start_recipient_index()
+
+# Export, import, rollup rebuild and archive run as background jobs (jobs.py);
+# handlers are registered next to their routes below
+job_runner = JobRunner(
+    app.config.get('JOBS_DIR', 'jobs'),
+    workers=app.config.get('JOB_WORKERS', 1),
+    retention_hours=app.config.get('JOB_RETENTION_HOURS', 24)
+)
+
+# Company dropdown of the nota form, built once from Config.COMPANIES
+COMPANY_OPTIONS = [{'code': code, 'name': name} for code, name in Config.COMPANIES.items()]
+
+# Cache and connection counters, read when /metrics is scraped
+metrics.GaugeFunction(
+    'nota_pdf_cache', 'PDF cache counters and size',
+    lambda: {(name,): value for name, value in pdf_cache.stats().items()}, ('stat',)
+)
+metrics.GaugeFunction(
+    'nota_pdf_render_pool', 'PDF render threads, queue depth and rejections',
+    lambda: {(name,): value for name, value in render_pool.stats().items()}, ('stat',)
+)
+metrics.GaugeFunction(
+    'nota_events', 'Open /api/events streams and events published',
+    lambda: {(name,): value for name, value in broadcaster.stats().items()}, ('stat',)
+)
+metrics.GaugeFunction(
+    'nota_stats_cache', 'Stats cache hits and misses',
+    lambda: {('hits',): stats_cache.hits, ('misses',): stats_cache.misses}, ('stat',)
+)
+metrics.GaugeFunction(
+    'nota_jobs', 'Background jobs per status',
+    lambda: {(status,): count for status, count in job_runner.counts().items()}, ('status',)
+)
+def conditional_hit_ratios():
+    ratios = {}
+    for route in ('/api/receipts', '/api/receipts/<int:receipt_id>', '/api/stats'):
+        hit, miss, none = (CONDITIONAL_REQUESTS.value(route=route, result=r) for r in ('hit', 'miss', 'none'))
+        if hit + miss:
+            ratios[(route, 'revalidations')] = hit / (hit + miss)
+        if hit + miss + none:
+            ratios[(route, 'requests')] = hit / (hit + miss + none)
+    return ratios
+
+metrics.GaugeFunction(
+    'nota_http_conditional_hit_ratio', 'Share of revalidations (or of all GETs) answered 304',
+    conditional_hit_ratios, ('route', 'scope')
+)
+metrics.GaugeFunction(
+    'nota_watermark_cache', 'Receipts version cache hits and misses',
+    lambda: {('hits',): watermark_cache.hits, ('misses',): watermark_cache.misses}, ('stat',)
+)
+metrics.GaugeFunction(
+    'nota_profiler', 'Sampling profiler state, samples and overhead',
+    lambda: {(name,): float(value) for name, value in profiler.stats().items() if name != 'routes'}, ('stat',)
+)
+metrics.GaugeFunction(
+    'nota_supabase_pool', 'Supabase connection pool counters',
+    lambda: {(name,): value for name, value in pool_stats().items()}, ('stat',)
+)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if profiler.enabled and request.url_rule:
+        g.profile = profiler.begin(f'{request.method} {request.url_rule.rule}')
+
+@app.teardown_request
+def stop_request_profile(exc):
+    profiler.end(g.pop('profile', None))
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            route=route, method=request.method, status=str(response.status_code)
         )
-        return supabase
+        if response.content_length is not None:
+            RESPONSE_BYTES.observe(response.content_length, route=route)
+    return response
+
+def get_db():
+    """Get the storage backend (Supabase or local SQLite) for this worker"""
+    try:
+        return get_storage()
     except Exception as e:
-        print(f"Error connecting to Supabase: {e}")
+        print(f"Error connecting to database: {e}")
         return None
 
 def hash_password(password):
@@ -47,16 +199,94 @@ def require_login(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def require_admin(f):
+    """Decorator for operator routes: a user in ADMIN_USERNAMES, or ``Authorization: Bearer <METRICS_TOKEN>``"""
+    def decorated_function(*args, **kwargs):
+        token = app.config.get('METRICS_TOKEN')
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if token and supplied and hmac.compare_digest(supplied, token):
+            return f(*args, **kwargs)
+        if 'user_id' in session and session.get('username') in app.config.get('ADMIN_USERNAMES', []):
+            return f(*args, **kwargs)
+        return jsonify({'error': 'Admin access required'}), 403
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+def current_watermark(db):
+    """The receipts version, from the cache when it is fresh"""
+    watermark = watermark_cache.get('receipts')
+    if watermark is None:
+        watermark = db.receipts_watermark()
+        watermark_cache.set('receipts', watermark)
+    return watermark
+
+def watermark_etag(watermark, *parts):
+    """ETag for a response derived from the receipts version and ``parts`` (route, arguments)"""
+    key = '|'.join(str(part) for part in (watermark['version'], watermark['last_created_at'], *parts))
+    return hashlib.sha256(key.encode()).hexdigest()[:20]
+
+def watermark_last_modified(watermark):
+    """Time of the last write rounded up to whole seconds, once that second has passed.
+
+    HTTP dates have no fractions; rounded down, a second write in the same
+    second would not move Last-Modified. Until then only the ETag is sent.
+    """
+    if not watermark.get('updated_at'):
+        return None
+    updated_at = datetime.fromisoformat(watermark['updated_at'])
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    updated_at = updated_at.replace(microsecond=0) + timedelta(seconds=1)
+    return updated_at if updated_at <= datetime.now(timezone.utc) else None
+
+def not_modified(etag, watermark):
+    """304 response when the client's copy is current, else None.
+
+    If-None-Match wins over If-Modified-Since, as in RFC 9110.
+    """
+    route = request.url_rule.rule
+    last_modified = watermark_last_modified(watermark)
+    if request.if_none_match:
+        hit = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        hit = last_modified <= request.if_modified_since
+    else:
+        CONDITIONAL_REQUESTS.inc(route=route, result='none')
+        return None
+    CONDITIONAL_REQUESTS.inc(route=route, result='hit' if hit else 'miss')
+    return with_validators(make_response('', 304), etag, watermark) if hit else None
+
+def with_validators(response, etag, watermark):
+    """Add ETag/Last-Modified; the browser revalidates on every use"""
+    response.set_etag(etag, weak=True)
+    last_modified = watermark_last_modified(watermark)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def render_pool_full(e):
+    """503 telling the client when to try again"""
+    response = jsonify({'error': 'Server sedang sibuk mencetak, coba lagi sebentar', 'reason': e.reason})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+def job_owner():
+    """Jobs are only visible to the user who started them"""
+    return str(session.get('user_id'))
+
+def job_accepted(job):
+    """202 response pointing at the job's status URL"""
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response
+
 @app.route('/')
 @require_login
 def index():
-    # Define companies data for the template
-    companies = [
-        {'code': 'CH', 'name': 'PT. CHASTE GEMILANG MANDIRI'},
-        {'code': 'CR', 'name': 'PT CREATIVE GLOBAL MULIA'},
-        {'code': 'CP', 'name': 'CV. COMPAGRE'}
-    ]
-    return render_template('index.html', companies=companies, username=session.get('username'))
+    return render_template('index.html', companies=COMPANY_OPTIONS, username=session.get('username'))
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -69,22 +299,21 @@ def login():
             return jsonify({'error': 'Username dan password harus diisi'}), 400
         
         try:
-            db = get_supabase()
+            db = get_db()
             if not db:
                 return jsonify({'error': 'Database not configured'}), 500
             
             # Check if users table exists, if not create it
             try:
-                response = db.table('users').select('*').eq('username', username).execute()
+                user = db.find_user('username', username)
             except Exception as e:
                 print(f"Error accessing users table: {e}")
                 # For now, just return error - user needs to run setup_users_table.sql first
                 return jsonify({'error': 'Users table not found. Please run setup_users_table.sql in Supabase first.'}), 500
             
-            if not response.data:
+            if not user:
                 return jsonify({'error': 'Username tidak ditemukan'}), 401
             
-            user = response.data[0]
             hashed_password = hash_password(password)
             
             if user['password'] != hashed_password:
@@ -123,18 +352,16 @@ def register():
             return jsonify({'error': 'Password minimal 6 karakter'}), 400
         
         try:
-            db = get_supabase()
+            db = get_db()
             if not db:
                 return jsonify({'error': 'Database not configured'}), 500
             
             # Check if username already exists
-            existing_user = db.table('users').select('*').eq('username', username).execute()
-            if existing_user.data:
+            if db.find_user('username', username):
                 return jsonify({'error': 'Username sudah digunakan'}), 400
             
             # Check if email already exists
-            existing_email = db.table('users').select('*').eq('email', email).execute()
-            if existing_email.data:
+            if db.find_user('email', email):
                 return jsonify({'error': 'Email sudah digunakan'}), 400
             
             # Create user
@@ -147,9 +374,9 @@ def register():
                 'created_at': datetime.now().isoformat()
             }
             
-            result = db.table('users').insert(user_data).execute()
+            result = db.create_user(user_data)
             
-            if result.data:
+            if result:
                 return jsonify({'success': True, 'message': 'Akun berhasil dibuat! Silakan login.'})
             else:
                 return jsonify({'error': 'Gagal membuat akun'}), 500
@@ -179,36 +406,53 @@ def setup():
 def receipts_api():
     """Handle GET and POST requests for receipts"""
     if request.method == 'GET':
-        """Get all receipts or filter by company"""
+        """List receipts, newest first, one page at a time"""
         try:
-            db = get_supabase()
+            db = get_db()
             if not db:
                 return jsonify({'error': 'Database not configured'}), 500
 
-            # Check if company filter is requested
-            company = request.args.get('company')
+            max_limit = app.config.get('MAX_RECEIPTS_PER_PAGE', 50)
+            try:
+                limit = int(request.args.get('limit', max_limit))
+            except ValueError:
+                return jsonify({'error': 'limit must be a number'}), 400
+            limit = max(1, min(limit, max_limit))
 
-            if company:
-                # Filter by company code
-                response = db.table('receipts').select('*').eq('company_code', company).order('created_at', desc=True).execute()
-            else:
-                # Get all receipts
-                response = db.table('receipts').select('*').order('created_at', desc=True).execute()
+            watermark = current_watermark(db)
+            etag = watermark_etag(watermark, 'list', sorted(request.args.items(multi=True)), limit)
+            cached = not_modified(etag, watermark)
+            if cached:
+                return cached
 
-            receipts = response.data if response.data else []
-            
-            return jsonify({
+            receipts, next_cursor, total = db.list_receipts(
+                company=request.args.get('company'),
+                date_from=request.args.get('date_from'),
+                date_to=request.args.get('date_to'),
+                q=request.args.get('q', '').strip(),
+                fields=request.args.get('fields'),
+                limit=limit,
+                cursor=request.args.get('cursor'),
+                with_items=request.args.get('include') == 'items'
+            )
+
+            return with_validators(jsonify({
                 'receipts': receipts,
-                'total': len(receipts)
-            })
+                'total': total if total is not None else len(receipts),
+                'limit': limit,
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }), etag, watermark)
 
+        except QueryError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
     elif request.method == 'POST':
         """Create new receipt"""
         try:
-            db = get_supabase()
+            db = get_db()
             if not db:
                 return jsonify({'error': 'Database not configured'}), 500
 
@@ -234,18 +478,11 @@ def receipts_api():
                 'created_at': datetime.now().isoformat()
             }
 
-            receipt_response = db.table('receipts').insert(receipt_data).execute()
-            
-            if not receipt_response.data:
-                return jsonify({'error': 'Failed to create receipt'}), 500
-
-            receipt_id = receipt_response.data[0]['id']
-
-            # Insert items
+            # Items are written together with the receipt
+            items = []
             if data.get('items') and isinstance(data['items'], list):
                 for item in data['items']:
-                    item_data = {
-                        'receipt_id': receipt_id,
+                    items.append({
                         'quantity': item.get('quantity'),
                         'item_type': item.get('item_type'),
                         'size': item.get('size'),
@@ -253,8 +490,16 @@ def receipts_api():
                         'unit_price': item.get('unit_price'),
                         'total_price': item.get('total_price'),
                         'created_at': datetime.now().isoformat()
-                    }
-                    db.table('items').insert(item_data).execute()
+                    })
+
+            receipt_id = db.create_receipt(receipt_data, items)
+            if not receipt_id:
+                return jsonify({'error': 'Failed to create receipt'}), 500
+
+            data_changed()
+            recipient_index.add(data['recipient'], data['address'], data['company_code'], receipt_data['created_at'],
+                                receipt_data['receipt_number'])
+            broadcaster.publish('receipt-created', dict(receipt_data, id=receipt_id))
 
             return jsonify({
                 'success': True,
@@ -266,32 +511,130 @@ def receipts_api():
             print(f"Error creating receipt: {e}")
             return jsonify({'error': str(e)}), 500
 
-@app.route('/api/receipts/<int:receipt_id>', methods=['GET'])
+@app.route('/api/receipts/next-number', methods=['POST'])
 @require_login
-def get_receipt(receipt_id):
-    """Get a specific receipt with items"""
+def next_receipt_number():
+    """Reserve the next receipt number (or a block of numbers) for a company"""
     try:
-        db = get_supabase()
+        db = get_db()
         if not db:
             return jsonify({'error': 'Database not configured'}), 500
 
-        # Get receipt
-        receipt_response = db.table('receipts').select('*').eq('id', receipt_id).execute()
-        if not receipt_response.data:
-            return jsonify({'error': 'Receipt not found'}), 404
+        data = request.get_json(silent=True) or {}
+        company = data.get('company') or request.args.get('company')
+        count = data.get('count', request.args.get('count', 1))
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'count must be a positive integer'}), 400
+
+        numbers = db.reserve_receipt_numbers(company, count)
+
+        return jsonify({
+            'receipt_number': numbers[0],
+            'receipt_numbers': numbers,
+            'company': company
+        })
+
+    except ReceiptNumberError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error reserving receipt number: {e}")
+        return jsonify({'error': str(e)}), 500
 
-        receipt = receipt_response.data[0]
+@app.route('/api/recipients', methods=['GET'])
+@require_login
+def recipients_api():
+    """Autocomplete for "Kepada Yth": recipients starting with ``prefix`` (or ``q``), most used first"""
+    if get_db() is None:
+        return jsonify({'error': 'Database not configured'}), 500
+
+    company = request.args.get('company') or None
+    if company and company not in app.config.get('COMPANIES', {}):
+        return jsonify({'error': f'Unknown company code: {company}'}), 400
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+
+    start_recipient_index()
+    if not recipient_index.wait_ready(timeout=5):
+        return jsonify({'error': 'Recipient index is still loading'}), 503
 
-        # Get items for this receipt
-        items_response = db.table('items').select('*').eq('receipt_id', receipt_id).execute()
-        items = items_response.data if items_response.data else []
+    start = time.perf_counter()
+    prefix = request.args.get('prefix', request.args.get('q', ''))
+    recipients = recipient_index.suggest(prefix, company=company, limit=limit)
+    return jsonify({
+        'recipients': recipients,
+        'took_ms': round((time.perf_counter() - start) * 1000, 3)
+    })
+
+@app.route('/api/search', methods=['GET'])
+@require_login
+def search_api():
+    """Ranked full-text search over receipts and their items, one page at a time"""
+    try:
+        db = get_db()
+        if not db:
+            return jsonify({'error': 'Database not configured'}), 500
 
-        receipt['items'] = items
+        max_limit = app.config.get('MAX_RECEIPTS_PER_PAGE', 50)
+        try:
+            limit = int(request.args.get('limit', 20))
+            page = int(request.args.get('page', 1))
+        except ValueError:
+            return jsonify({'error': 'limit and page must be numbers'}), 400
+        limit = max(1, min(limit, max_limit))
+        page = max(1, page)
 
+        start = time.perf_counter()
+        results, total = db.search(
+            request.args.get('q', ''),
+            company=request.args.get('company') or None,
+            date_from=request.args.get('date_from') or None,
+            date_to=request.args.get('date_to') or None,
+            limit=limit,
+            offset=(page - 1) * limit
+        )
         return jsonify({
-            'receipt': receipt
+            'results': results,
+            'total': total,
+            'page': page,
+            'limit': limit,
+            'has_more': page * limit < total,
+            'took_ms': round((time.perf_counter() - start) * 1000, 3)
         })
 
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error searching receipts: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/receipts/<int:receipt_id>', methods=['GET'])
+@require_login
+def get_receipt(receipt_id):
+    """Get a specific receipt with items"""
+    try:
+        db = get_db()
+        if not db:
+            return jsonify({'error': 'Database not configured'}), 500
+
+        watermark = current_watermark(db)
+        etag = watermark_etag(watermark, 'receipt', receipt_id)
+        cached = not_modified(etag, watermark)
+        if cached:
+            return cached
+
+        # Receipt and its items in one request
+        receipt = db.get_receipt(receipt_id)
+        if not receipt:
+            return jsonify({'error': 'Receipt not found'}), 404
+
+        return with_validators(jsonify({
+            'receipt': receipt
+        }), etag, watermark)
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -300,298 +643,569 @@ def get_receipt(receipt_id):
 def generate_pdf(receipt_id):
     """Generate PDF for a receipt"""
     try:
-        db = get_supabase()
+        db = get_db()
         if not db:
             return jsonify({'error': 'Database not configured'}), 500
 
-        # Get receipt with items
-        receipt_response = db.table('receipts').select('*').eq('id', receipt_id).execute()
-        if not receipt_response.data:
+        # Get receipt with items (one request)
+        receipt = db.get_receipt(receipt_id)
+        if not receipt:
             return jsonify({'error': 'Receipt not found'}), 404
 
-        receipt = receipt_response.data[0]
-
-        # Get items
-        items_response = db.table('items').select('*').eq('receipt_id', receipt_id).execute()
-        items = items_response.data if items_response.data else []
+        items = receipt.pop('items', None) or []
 
         # Get current user info
         current_user = session.get('username', 'Unknown')
         current_time = datetime.now().strftime('%d/%m/%Y %H:%M')
 
-        # Generate PDF
-        pdf_buffer = generate_receipt_pdf(receipt, items, current_user, current_time)
-        pdf_buffer.seek(0)
+        # Same receipt content + same user = same download (only the print time differs)
+        pdf_key = content_hash(receipt, items)
+        etag = f"{pdf_key[:32]}-{hashlib.sha256(current_user.encode()).hexdigest()[:8]}"
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+            response.set_etag(etag, weak=True)
+            return response
+
+        # Render the page once per content hash, add the footer per download.
+        # A cache miss waits for a render thread (or is turned away with 503).
+        # In async mode the render runs in the PDF process pool (when there
+        # is more than one worker), so it does not hold the GIL against the
+        # threads waiting on queries
+        workers = app.config.get('PDF_BATCH_WORKERS', 1)
+        executor = get_executor(workers) if app.config.get('ASYNC_IO') and workers > 1 else None
+        _, cached_pdf = render_cached(
+            pdf_cache, receipt, items, executor=executor,
+            run=lambda render: render_pool.run(current_user, 'single', profiler.bind(render))
+        )
+        try:
+            with PDF_RENDER_SECONDS.time(kind='footer'):
+                pdf_bytes = add_footer(cached_pdf, current_user, current_time)
+        except Exception as e:
+            print(f"Error adding PDF footer, rendering full page: {e}")
+            pdf_bytes = generate_receipt_pdf(receipt, items, current_user, current_time).getvalue()
+        PDF_BYTES.observe(len(pdf_bytes), kind='single')
 
         # Generate filename
         filename = f"nota_{receipt['receipt_number']}.pdf"
 
-        return send_file(
-            pdf_buffer,
+        response = send_file(
+            io.BytesIO(pdf_bytes),
             as_attachment=True,
             download_name=filename,
             mimetype='application/pdf'
         )
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
 
+    except PoolFull as e:
+        return render_pool_full(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def generate_receipt_pdf(receipt, items, username, timestamp):
-    """Generate PDF content for a receipt with 2 copies on 1 A4 page (like Excel template)"""
-    buffer = io.BytesIO()
-    
-    # Create canvas for single A4 page
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    
-    # Company-specific styling
-    company_code = receipt['company_code']
-    is_ppn_company = company_code == 'CH'  # Only CH has PPN
-    company_name = receipt['company_name']
-    total_amount = receipt['total_amount']
-    
-    # Function to add receipt content at specific Y position
-    def add_receipt_content(start_y, page_type=""):
-        # Add logo for CHASTE company (top left)
-        if company_code == 'CH':
-            try:
-                possible_paths = [
-                    "static/images/CHASTE GEMILANG MANDIRI.png",
-                    "NotaPerusahaan_Web/static/images/CHASTE GEMILANG MANDIRI.png",
-                    "CHASTE GEMILANG MANDIRI.png"
-                ]
-                
-                logo_path = None
-                for path in possible_paths:
-                    if os.path.exists(path):
-                        logo_path = path
-                        break
-                
-                if logo_path:
-                    # Draw logo at top left
-                    logo_width = 50
-                    logo_height = 40
-                    logo_x = 50
-                    logo_y = start_y - 10  # At the top
-                    
-                    c.drawImage(logo_path, logo_x, logo_y, logo_width, logo_height)
-                    
-                    # Company name below logo (rata kiri)
-                    company_x = 50
-                    company_y = logo_y - 20  # Below logo
-                else:
-                    company_x = 50
-                    company_y = start_y
-            except Exception as e:
-                print(f"Error adding CHASTE logo: {e}")
-                company_x = 50
-                company_y = start_y
-        else:
-            company_x = 50
-            company_y = start_y
-        
-        # Add company header (rata kiri dengan logo)
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(50, company_y, company_name)
-        c.setFont("Helvetica", 10)
-        c.drawString(50, company_y - 20, f"NOTA: {receipt['receipt_number']}")
-        c.drawString(50, company_y - 40, f"Tanggal: {receipt['date']}")
-        c.drawString(50, company_y - 60, f"Kepada Yth: {receipt['recipient']}")
-        
-        # Add address (with word wrapping and better spacing)
-        address = receipt.get('address', '')
-        address_lines = []
-        if address:
-            # Split address into lines if too long
-            words = address.split()
-            current_line = ""
-            
-            for word in words:
-                if len(current_line + word) < 60:  # Max characters per line
-                    current_line += word + " "
-                else:
-                    if current_line:
-                        address_lines.append(current_line.strip())
-                    current_line = word + " "
-            
-            if current_line:
-                address_lines.append(current_line.strip())
-            
-            # Draw address lines with better spacing
-            y_pos = start_y - 80
-            for line in address_lines:
-                c.drawString(50, y_pos, f"Alamat: {line}")
-                y_pos -= 18  # Better space between address lines
-        
-        # Add items table (better spacing) - adjust for address
-        y_position = start_y - 100 - (len(address_lines) * 18)
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(50, y_position, "No")
-        c.drawString(80, y_position, "Jenis Barang")
-        c.drawString(180, y_position, "Ukuran")
-        c.drawString(250, y_position, "Warna")
-        c.drawString(300, y_position, "Qty")
-        c.drawString(350, y_position, "Harga Satuan")
-        c.drawString(450, y_position, "Total")
-        
-        y_position -= 25  # Better space before items
-        c.setFont("Helvetica", 8)
-        if items:
-            for i, item in enumerate(items, 1):
-                c.drawString(50, y_position, str(i))
-                c.drawString(80, y_position, str(item['item_type'])[:20])  # Allow longer names
-                c.drawString(180, y_position, str(item['size'])[:15])
-                c.drawString(250, y_position, str(item['color'])[:15])
-                c.drawString(300, y_position, str(item['quantity']))
-                c.drawString(350, y_position, f"Rp {item['unit_price']:,.0f}")
-                c.drawString(450, y_position, f"Rp {item['total_price']:,.0f}")
-                y_position -= 20  # Better space between items
-        
-        # Add totals (better formatting with more space)
-        y_position -= 30  # Better space before totals
-        c.setFont("Helvetica-Bold", 10)
-        if is_ppn_company:
-            subtotal = total_amount / 1.11
-            ppn = total_amount - subtotal
-            c.drawString(350, y_position, f"Total Sebelum PPN: Rp {subtotal:,.0f}")
-            y_position -= 25  # Better space between total lines
-            c.drawString(350, y_position, f"PPN (11%): Rp {ppn:,.0f}")
-            y_position -= 25  # Better space between total lines
-            c.drawString(350, y_position, f"Total + PPN: Rp {total_amount:,.0f}")
-        else:
-            c.drawString(350, y_position, f"Total: Rp {total_amount:,.0f}")
-        
-        # Add signature (controlled space to not exceed separator line)
-        y_position -= 40  # Controlled space before signature
-        c.setFont("Helvetica", 10)
-        c.drawString(50, y_position, "Hormat Kami,")
-        y_position -= 30  # Controlled space for signature line (enough room but not too much)
-        c.drawString(50, y_position, "_________________")
-        
-        
-        # Add "Printed By" only to the COPY receipt (bottom right corner)
-        if page_type == "COPY":
-            c.setFont("Helvetica", 7)
-            c.setFillColor(colors.grey)
-            # Position at the very bottom right corner of copy receipt
-            printed_by_y = y_position - 20  # Below signature line
-            # Right align the text
-            printed_by_text = f"Printed By: {username} | {timestamp}"
-            text_width = c.stringWidth(printed_by_text, "Helvetica", 7)
-            printed_by_x = width - text_width - 50  # Right margin
-            c.drawString(printed_by_x, printed_by_y, printed_by_text)
-        
-        # Reset color back to black for next receipt
-        c.setFillColor(colors.black)
-    
-    # Calculate positions for 2 receipts on 1 A4 page (like Excel template)
-    receipt_height = 300  # Height needed for each receipt (controlled to avoid collision)
-    margin_top = 50  # More margin from top
-    spacing = 60  # Perbesar jarak antara nota 1 dan 2
-    
-    # Receipt 1: Original (top half) - with controlled margin to avoid collision
-    original_y = height - margin_top - 20  # Controlled extra margin for top receipt
-    add_receipt_content(original_y, "ORIGINAL")
-    
-    # No separator line between receipts
-    
-    # Receipt 2: Copy (bottom half) - with red watermark and proper spacing
-    copy_y = original_y - receipt_height - spacing - 10  # Controlled spacing to avoid collision
-    # Add red watermark
-    c.setFont("Helvetica-Bold", 60)
-    c.setFillColor(colors.red)
-    c.setFillAlpha(0.1)  # Slightly more visible
-    c.drawCentredString(width/2, copy_y - 120, "COPY")
-    c.setFillAlpha(1.0)  # Reset transparency
-    c.setFillColor(colors.black)
-    add_receipt_content(copy_y, "COPY")
-    
-    c.save()
-    buffer.seek(0)
-    
-    return buffer
+@app.route('/api/receipts/pdf/batch', methods=['POST'])
+@require_login
+def generate_pdf_batch():
+    """Generate one merged PDF (or a ZIP of PDFs) for many receipts"""
+    try:
+        db = get_db()
+        if not db:
+            return jsonify({'error': 'Database not configured'}), 500
+
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            return jsonify({'error': 'ids must be a list of receipt ids'}), 400
+
+        output_format = data.get('format', 'pdf')
+        if output_format not in ('pdf', 'zip'):
+            return jsonify({'error': 'format must be pdf or zip'}), 400
+
+        receipts = db.fetch_receipts_for_batch(
+            ids=ids,
+            company=data.get('company'),
+            date_from=data.get('date_from'),
+            date_to=data.get('date_to'),
+            max_receipts=app.config.get('PDF_BATCH_MAX_RECEIPTS', 500)
+        )
+        if not receipts:
+            return jsonify({'error': 'Receipt not found'}), 404
+
+        # Get current user info
+        current_user = session.get('username', 'Unknown')
+        current_time = datetime.now().strftime('%d/%m/%Y %H:%M')
+
+        with PDF_RENDER_SECONDS.time(kind='batch'):
+            pdfs = render_pool.run(
+                current_user, 'batch', profiler.bind(render_batch),
+                receipts, current_user, current_time, app.config.get('PDF_BATCH_WORKERS', 1)
+            )
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        if output_format == 'zip':
+            return send_file(
+                write_zip(receipts, pdfs),
+                as_attachment=True,
+                download_name=f"nota_batch_{timestamp}.zip",
+                mimetype='application/zip'
+            )
+
+        return send_file(
+            io.BytesIO(merge_pdfs(pdfs)),
+            as_attachment=True,
+            download_name=f"nota_batch_{timestamp}.pdf",
+            mimetype='application/pdf'
+        )
+
+    except PoolFull as e:
+        return render_pool_full(e)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def build_stats(db):
+    """Collect overall and per-company counts and totals"""
+    company_names = app.config.get('COMPANIES', {})
+    per_company = db.fetch_stats(company_names)
+
+    receipts_count = sum(c['receipts_count'] for c in per_company.values())
+    if any(c['items_count'] is None for c in per_company.values()):
+        items_count = db.count_items()
+    else:
+        items_count = sum(c['items_count'] for c in per_company.values())
+
+    if any(c['total_amount'] is None for c in per_company.values()):
+        total_amount = None
+    else:
+        total_amount = sum(c['total_amount'] for c in per_company.values())
+
+    # Export threshold
+    export_threshold = app.config.get('EXPORT_THRESHOLD', 1000)
+    approaching_limit = receipts_count >= (export_threshold * 0.8)
+
+    return {
+        'receipts_count': receipts_count,
+        'items_count': items_count,
+        'total_amount': total_amount,
+        'export_threshold': export_threshold,
+        'approaching_limit': approaching_limit,
+        'companies': {
+            code: dict(counts, name=company_names.get(code, code))
+            for code, counts in per_company.items()
+        },
+        'generated_at': datetime.now().isoformat()
+    }
+
+def fresh_stats():
+    """Recount, refresh the stats cache and return the new stats"""
+    db = get_db()
+    etag = watermark_etag(current_watermark(db), 'stats')
+    stats = build_stats(db)
+    stats_cache.set('stats', (etag, stats))
+    return stats
+
+def data_changed():
+    """Receipts were added or removed: drop cached counts and push the new ones to open tabs"""
+    stats_cache.invalidate()
+    watermark_cache.invalidate()
+    broadcaster.publish_soon('stats-changed', fresh_stats)
 
 @app.route('/api/stats', methods=['GET'])
 @require_login
 def get_stats():
     """Get database statistics"""
     try:
-        db = get_supabase()
+        db = get_db()
         if not db:
             return jsonify({'error': 'Database not configured'}), 500
 
-        # Get receipts count
-        receipts_response = db.table('receipts').select('*', count='exact').execute()
-        receipts_count = receipts_response.count if receipts_response.count else 0
+        watermark = current_watermark(db)
+        etag = watermark_etag(watermark, 'stats')
+        cached = not_modified(etag, watermark)
+        if cached:
+            return cached
 
-        # Get items count
-        items_response = db.table('items').select('*', count='exact').execute()
-        items_count = items_response.count if items_response.count else 0
+        # Cached counts are only reused for the same receipts version
+        cached_stats = stats_cache.get('stats')
+        if cached_stats is not None and cached_stats[0] == etag:
+            stats = cached_stats[1]
+        else:
+            stats = build_stats(db)
+            stats_cache.set('stats', (etag, stats))
 
-        # Export threshold
-        export_threshold = app.config.get('EXPORT_THRESHOLD', 1000)
-        approaching_limit = receipts_count >= (export_threshold * 0.8)
+        return with_validators(jsonify(stats), etag, watermark)
 
-        return jsonify({
-            'receipts_count': receipts_count,
-            'items_count': items_count,
-            'export_threshold': export_threshold,
-            'approaching_limit': approaching_limit
-        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/events', methods=['GET'])
+@require_login
+def events_stream():
+    """Server-Sent Events: receipt-created, export-completed and stats-changed (with the new counts)"""
+    try:
+        subscription = broadcaster.subscribe(request.headers.get('Last-Event-ID'))
+    except TooManyClients:
+        response = jsonify({'error': 'Too many open event streams'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    def generate():
+        try:
+            # Reconnect after 3 s if the connection drops
+            yield 'retry: 3000\n\n'
+            yield from subscription
+        finally:
+            subscription.close()
+
+    response = app.response_class(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/reports/sales', methods=['GET'])
+@require_login
+def sales_report_api():
+    """Sales totals, PPN, counts and top item types per company and day/week/month (from the rollups)"""
+    try:
+        db = get_db()
+        if not db:
+            return jsonify({'error': 'Database not configured'}), 500
+
+        try:
+            top_items = int(request.args.get('top', 5))
+        except ValueError:
+            return jsonify({'error': 'top must be a number'}), 400
 
+        start = time.perf_counter()
+        report = build_sales_report(
+            db, app.config.get('COMPANIES', {}),
+            period=request.args.get('period', 'month'),
+            date_from=request.args.get('date_from'),
+            date_to=request.args.get('date_to'),
+            company=request.args.get('company'),
+            top_items=top_items
+        )
+        report['took_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        return jsonify(report)
+
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def rebuild_sales_job(job, params):
+    db = get_db()
+    if not db:
+        raise JobError('Database not configured')
+    return rebuild_rollups(db, get_archive())
+
+job_runner.register('sales-rebuild', profiler.sampled('job sales-rebuild')(rebuild_sales_job))
+
+@app.route('/api/reports/sales/rebuild', methods=['POST'])
+@require_login
+def rebuild_sales_rollups():
+    """Queue a recompute of the sales rollups from the live tables and the archive"""
+    try:
+        return job_accepted(job_runner.submit('sales-rebuild', owner=job_owner()))
+    except Exception as e:
+        print(f"Error queueing sales rollup rebuild: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/db/pool', methods=['GET'])
+@require_login
+def get_pool_stats():
+    """Get Supabase connection reuse counters for this worker"""
+    return jsonify(pool_stats())
+
+@app.route('/metrics', methods=['GET'])
+@require_admin
+def get_metrics():
+    """Prometheus metrics for this worker; scrapers send ``Authorization: Bearer <METRICS_TOKEN>``"""
+    return app.response_class(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route('/api/admin/profiler', methods=['GET', 'POST'])
+@require_admin
+def profiler_api():
+    """GET: profiler state and samples per route. POST: set ``enabled``, ``rate``, ``interval_ms`` or ``reset``"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            rate = float(data['rate']) if data.get('rate') is not None else None
+            interval_ms = float(data['interval_ms']) if data.get('interval_ms') is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'rate and interval_ms must be numbers'}), 400
+        if rate is not None and not 0 <= rate <= 1:
+            return jsonify({'error': 'rate must be between 0 and 1'}), 400
+        if interval_ms is not None and interval_ms < 1:
+            return jsonify({'error': 'interval_ms must be at least 1'}), 400
+        if data.get('reset'):
+            profiler.reset()
+        profiler.configure(
+            enabled=data.get('enabled'), rate=rate,
+            interval=interval_ms / 1000 if interval_ms is not None else None
+        )
+    return jsonify(profiler.stats())
+
+@app.route('/api/admin/profiler/stacks', methods=['GET'])
+@require_admin
+def profiler_stacks():
+    """Sampled stacks, all routes or ``?route=GET /api/stats``: collapsed text, or ``?format=svg`` for a flame graph"""
+    route = request.args.get('route') or None
+    output_format = request.args.get('format', 'collapsed')
+    if output_format not in ('collapsed', 'svg'):
+        return jsonify({'error': 'format must be collapsed or svg'}), 400
+
+    stacks = profiler.stacks(route)
+    if route and not stacks:
+        return jsonify({'error': 'No samples for this route'}), 404
+    if output_format == 'svg':
+        svg = flamegraph_svg(stacks, title=route or 'All routes')
+        return app.response_class(svg, mimetype='image/svg+xml')
+    return app.response_class(profiler.collapsed(route), mimetype='text/plain')
+
+def archive_job(job, params):
+    db = get_db()
+    if not db:
+        raise JobError('Database not configured')
+    result = get_archive().archive(db, date_before=params['before'])
+    data_changed()
+    return dict(result, before=params['before'])
+
+job_runner.register('archive', profiler.sampled('job archive')(archive_job))
+
+@app.route('/api/archive', methods=['GET', 'POST'])
+@require_login
+def archive_api():
+    """GET: archive summary. POST: queue moving receipts dated before ``before`` (or older than ``older_than_days``) to the archive"""
+    try:
+        archive = get_archive()
+        if archive is None:
+            return jsonify({'error': 'Archive not configured'}), 400
+
+        if request.method == 'GET':
+            return jsonify(archive.stats())
+
+        db = get_db()
+        if not db:
+            return jsonify({'error': 'Database not configured'}), 500
+
+        data = request.get_json(silent=True) or {}
+        before = data.get('before')
+        if before:
+            try:
+                before = date.fromisoformat(before).isoformat()
+            except (TypeError, ValueError):
+                return jsonify({'error': 'before must be a date (YYYY-MM-DD)'}), 400
+        else:
+            try:
+                days = int(data.get('older_than_days', app.config.get('ARCHIVE_AFTER_DAYS', 90)))
+            except (TypeError, ValueError):
+                return jsonify({'error': 'older_than_days must be a number'}), 400
+            before = (date.today() - timedelta(days=days)).isoformat()
+
+        return job_accepted(job_runner.submit('archive', {'before': before}, owner=job_owner()))
+
+    except Exception as e:
+        print(f"Error archiving receipts: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def export_job(job, params):
+    db = get_db()
+    if not db:
+        raise JobError('Database not configured')
+
+    # Only export (and later delete) what exists right now; receipts saved
+    # while the export runs stay in the database
+    max_receipt_id = db.latest_receipt_id()
+    if max_receipt_id is None:
+        raise JobError('No data to export')
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"nota_export_{timestamp}.xlsx"
+    path = job.output_path('.xlsx')
+
+    with open(path, 'wb') as workbook_file:
+        _, receipts_count, items_count = write_export(
+            db, max_receipt_id, app.config.get('EXPORT_CHUNK_SIZE', 1000), workbook_file,
+            on_progress=lambda sheet, rows: job.progress(stage=sheet.lower(), rows=rows)
+        )
+        # On disk for good before any exported row goes away
+        workbook_file.flush()
+        os.fsync(workbook_file.fileno())
+
+    # Last chance to cancel: the workbook is complete, now move the exported
+    # rows to the archive. Without an archive the workbook is the only copy,
+    # so the rows stay until the client confirms it saved the file (see
+    # confirm_export)
+    job.progress(stage='archive', receipts=receipts_count, items=items_count)
+    result = {'receipts_count': receipts_count, 'items_count': items_count, 'filename': filename}
+    archive = get_archive()
+    if archive is not None:
+        archive.archive(db, max_receipt_id=max_receipt_id)
+        data_changed()
+    else:
+        result['delete_on_confirm'] = max_receipt_id
+
+    job.attach(path, filename, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    broadcaster.publish('export-completed', dict(result, job_id=job.id))
+    return result
+
+job_runner.register('export', profiler.sampled('job export')(export_job))
+
 @app.route('/api/export', methods=['POST'])
 @require_login
 def export_data():
-    """Export data to Excel and reset database"""
+    """Queue an export to Excel; the finished job offers the workbook and the exported rows move to the archive"""
     try:
-        db = get_supabase()
+        db = get_db()
         if not db:
             return jsonify({'error': 'Database not configured'}), 500
 
-        # Get all receipts with items
-        receipts_response = db.table('receipts').select('*').execute()
-        receipts = receipts_response.data if receipts_response.data else []
+        if db.latest_receipt_id() is None:
+            return jsonify({'error': 'No data to export'}), 400
 
-        items_response = db.table('items').select('*').execute()
-        items = items_response.data if items_response.data else []
+        return job_accepted(job_runner.submit('export', owner=job_owner()))
 
-        if not receipts:
-            return jsonify({'error': 'No data to export'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Create Excel file
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"nota_export_{timestamp}.xlsx"
-        
-        # Create DataFrame
-        df_receipts = pd.DataFrame(receipts)
-        df_items = pd.DataFrame(items)
-        
-        # Save to Excel
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-            df_receipts.to_excel(writer, sheet_name='Receipts', index=False)
-            df_items.to_excel(writer, sheet_name='Items', index=False)
-
-        # Delete all data from database
-        if items:
-            db.table('items').delete().neq('id', 0).execute()
-        
-        if receipts:
-            db.table('receipts').delete().neq('id', 0).execute()
+def import_job(job, params):
+    db = get_db()
+    if not db:
+        raise JobError('Database not configured')
 
-        # Clean up file
-        os.remove(filename)
+    def imported(receipts):
+        data_changed()
+        for receipt in receipts:
+            recipient_index.add(receipt['recipient'], receipt['address'], receipt['company_code'], receipt['created_at'],
+                                receipt['receipt_number'])
 
-        return jsonify({
-            'message': f'Data berhasil diexport dan database direset! Total {len(receipts)} nota dan {len(items)} item.',
-            'filename': filename
-        })
+    inputs = params['inputs']
+    bulk = BulkImport(
+        db, app.config.get('COMPANIES', {}), app.config.get('IMPORT_CHUNK_SIZE', 1000), imported, get_archive()
+    )
+    progress = None
+    for progress in bulk.run(inputs[0], inputs[1] if len(inputs) > 1 else None):
+        job.progress(**progress)
+    return progress
+
+job_runner.register('import', profiler.sampled('job import')(import_job))
+
+@app.route('/api/import', methods=['POST'])
+@require_login
+def import_data():
+    """Queue an import of receipts from an uploaded workbook (``file``) or CSV pair (``file`` + ``items``).
+
+    Progress (rows read, imported, rejected, rows/second) is on the job.
+    """
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error': 'No file uploaded'}), 400
+    for part in request.files.values():
+        if not part.filename.lower().endswith(WORKBOOK_SUFFIXES + CSV_SUFFIXES):
+            return jsonify({'error': 'Import an .xlsx or .csv file'}), 400
+
+    # openpyxl needs a seekable file; the uploads move into the job's folder
+    paths = []
+    try:
+        for name in ('file', 'items'):
+            part = request.files.get(name)
+            if part and part.filename:
+                suffix = os.path.splitext(part.filename)[1].lower()
+                handle, path = tempfile.mkstemp(suffix=suffix, dir=job_runner.directory)
+                paths.append(path)
+                with os.fdopen(handle, 'wb') as f:
+                    part.save(f)
+        return job_accepted(job_runner.submit('import', owner=job_owner(), inputs=paths))
 
     except Exception as e:
+        print(f"Error queueing import: {e}")
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs', methods=['GET'])
+@require_login
+def list_jobs():
+    """Your most recent background jobs"""
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    return jsonify({'jobs': job_runner.list(job_owner(), limit)})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@require_login
+def get_job(job_id):
+    """Status, progress and result of a background job"""
+    job = job_runner.get(job_id, job_owner())
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/download', methods=['GET'])
+@require_login
+def download_job_file(job_id):
+    """The file produced by a finished job (the export workbook)"""
+    download = job_runner.download(job_id, job_owner())
+    if download is None:
+        return jsonify({'error': 'No file for this job'}), 404
+    path, download_name, mimetype = download
+    return send_file(path, as_attachment=True, download_name=download_name, mimetype=mimetype)
+
+@app.route('/api/jobs/<job_id>/confirm', methods=['POST'])
+@require_login
+def confirm_export(job_id):
+    """Confirm the export workbook was saved; without an archive this deletes the exported rows"""
+    job = job_runner.get(job_id, job_owner())
+    if job is None or job['kind'] != 'export':
+        return jsonify({'error': 'Export job not found'}), 404
+    if job['status'] != 'succeeded':
+        return jsonify({'error': f"Export is {job['status']}"}), 409
+
+    max_receipt_id = (job['result'] or {}).get('delete_on_confirm')
+    if max_receipt_id is None:
+        # Already moved to the archive by the job
+        return jsonify({'deleted': False})
+    if job_runner.download(job_id, job_owner()) is None:
+        # The workbook was pruned before anyone confirmed it; keep the rows
+        return jsonify({'error': 'The export file is no longer available; export again'}), 410
+
+    db = get_db()
+    if not db:
+        return jsonify({'error': 'Database not configured'}), 500
+    # Rows up to the exported id only, so confirming twice is a no-op
+    db.delete_up_to(max_receipt_id)
+    data_changed()
+    return jsonify({'deleted': True})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@require_login
+def cancel_job(job_id):
+    """Cancel a queued job, or stop a running one at its next progress report"""
+    try:
+        job = job_runner.cancel(job_id, job_owner())
+    except JobError as e:
+        return jsonify({'error': str(e)}), 409
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/retry', methods=['POST'])
+@require_login
+def retry_job(job_id):
+    """Run a failed or cancelled job again"""
+    try:
+        job = job_runner.retry(job_id, job_owner())
+    except JobError as e:
+        return jsonify({'error': str(e)}), 409
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return job_accepted(job)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port)
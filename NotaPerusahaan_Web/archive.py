@@ -0,0 +1,604 @@
+#!/usr/bin/env python3
+"""Tiered archive: old receipts move from the live tables into Parquet files.
+
+Layout under ``Config.ARCHIVE_DIR`` (a local path, or any URI pyarrow
+understands such as ``s3://bucket/prefix``)::
+
+    company_code=CH/month=2025-01/receipts-<version>.parquet
+    company_code=CH/month=2025-01/items-<version>.parquet
+    manifest.json
+
+Rows are written to the archive first and deleted from the live tables only
+once every partition is in place, so nothing is ever thrown away. A
+partition that gains rows is written under a new version and the manifest
+swapped to it; one writer at a time holds a lock file for the whole
+write, manifest and delete sequence.
+``ArchivedStorage`` reads through to the archive for receipt lookups,
+history listing/search, /api/search and PDF regeneration.
+
+    python archive.py --older-than-days 90
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from repository import (
+    ITEM_FIELDS, SEARCH_FIELDS, QueryError, encode_cursor, decode_cursor, parse_fields,
+    search_terms, matching_items
+)
+
+MANIFEST = 'manifest.json'
+LOCK_FILE = '.archive.lock'
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# How often the manifest is re-read to see partitions written by other workers
+MANIFEST_TTL = 5.0
+
+# Partition DataFrames kept in memory
+MAX_CACHED_FRAMES = 64
+
+# Replaced partition files are deleted this long after the manifest stopped
+# pointing at them, once other workers have re-read it
+RETIRED_GRACE = 10 * MANIFEST_TTL
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass  # LK_LOCK gives up after 10 seconds
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _file_name(entry, name):
+    """File of one partition; manifests written before versioned names use ``<name>.parquet``"""
+    return entry.get('files', {}).get(name, f'{name}.parquet')
+
+
+def _records(df):
+    """DataFrame rows as plain dicts with Python values (NaN -> None)"""
+    if df.empty:
+        return []
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+class ReceiptArchive:
+    """Parquet partitions of archived receipts and items, one pair per company and month"""
+
+    def __init__(self, uri):
+        self.uri = uri
+        self._fs = None
+        self._root = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._manifest = None
+        self._manifest_checked = 0.0
+        self._frames = OrderedDict()
+
+    # Files
+
+    def _filesystem(self):
+        if self._fs is None:
+            import pyarrow.fs
+            if '://' in self.uri:
+                fs, root = pyarrow.fs.FileSystem.from_uri(self.uri)
+            else:
+                fs, root = pyarrow.fs.LocalFileSystem(), os.path.abspath(self.uri)
+            self._fs, self._root = fs, root.rstrip('/')
+        return self._fs
+
+    def _path(self, *parts):
+        self._filesystem()
+        return '/'.join((self._root,) + parts)
+
+    def _write_bytes(self, path, data):
+        """Write via a temporary name and rename, so readers never see a partial file"""
+        fs = self._filesystem()
+        tmp = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+        with fs.open_output_stream(tmp) as f:
+            f.write(data)
+        fs.move(tmp, path)
+
+    def _manifest_exists(self):
+        if '://' not in self.uri:
+            return os.path.exists(os.path.join(self.uri, MANIFEST))
+        import pyarrow.fs
+        return self._filesystem().get_file_info(self._path(MANIFEST)).type != pyarrow.fs.FileType.NotFound
+
+    def manifest(self, force=False):
+        """``{'partitions': {'CH/2025-01': {...}}}``, re-read at most every MANIFEST_TTL seconds"""
+        with self._lock:
+            now = time.monotonic()
+            if force or self._manifest is None or now - self._manifest_checked > MANIFEST_TTL:
+                manifest = {'partitions': {}}
+                if self._manifest_exists():
+                    with self._filesystem().open_input_stream(self._path(MANIFEST)) as f:
+                        manifest = json.loads(f.read())
+                self._manifest = manifest
+                self._manifest_checked = now
+            return self._manifest
+
+    def has_data(self):
+        try:
+            return bool(self.manifest()['partitions'])
+        except Exception as e:
+            print(f"Error reading archive manifest: {e}")
+            return False
+
+    def _frame(self, key, entry, name):
+        """One partition file as a DataFrame, cached until the partition is rewritten"""
+        cache_key = (key, name, entry['updated_at'])
+        with self._lock:
+            df = self._frames.get(cache_key)
+            if df is not None:
+                self._frames.move_to_end(cache_key)
+                return df
+
+        import pyarrow.parquet as pq
+        path = self._path(f"company_code={entry['company_code']}", f"month={entry['month']}", _file_name(entry, name))
+        df = pq.read_table(path, filesystem=self._filesystem()).to_pandas()
+
+        with self._lock:
+            self._frames[cache_key] = df
+            while len(self._frames) > MAX_CACHED_FRAMES:
+                self._frames.popitem(last=False)
+        return df
+
+    # Writing
+
+    @contextmanager
+    def _writer(self):
+        """One archive writer at a time: across threads, and across processes sharing the lock file.
+
+        Local archives keep the lock file next to the manifest; for a remote
+        URI it is on local disk, so writers on several hosts must not archive
+        into the same URI at once.
+        """
+        if '://' in self.uri:
+            digest = hashlib.sha1(self.uri.encode()).hexdigest()[:16]
+            path = os.path.join(tempfile.gettempdir(), f'nota-archive-{digest}.lock')
+        else:
+            path = self._path(LOCK_FILE)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._write_lock, open(path, 'a+b') as f:
+            _lock_file(f)
+            try:
+                yield
+            finally:
+                _unlock_file(f)
+
+    def _stage_chunk(self, staging, groups, chunk, number):
+        """Spill one chunk, split by partition, to local Parquet files under ``staging``"""
+        import pandas as pd
+
+        parts = {}
+        for receipt in chunk:
+            receipt = dict(receipt)
+            items = receipt.pop('items', None) or []
+            key = (receipt['company_code'], str(receipt['date'])[:7])
+            receipts_part, items_part = parts.setdefault(key, ([], []))
+            receipts_part.append(receipt)
+            items_part.extend(items)
+        for key, (receipts, items) in parts.items():
+            paths = groups.setdefault(key, ([], []))
+            for rows, stage_paths, name in ((receipts, paths[0], 'receipts'), (items, paths[1], 'items')):
+                if rows:
+                    path = os.path.join(staging, f'{key[0]}_{key[1]}_{name}_{number}.parquet')
+                    pd.DataFrame(rows).to_parquet(path, index=False)
+                    stage_paths.append(path)
+
+    def _write_partition(self, manifest, company, month, receipt_paths, item_paths):
+        """Merge the staged rows of one partition with what is archived there into new files"""
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        key = f'{company}/{month}'
+        new_receipts = pd.concat([pd.read_parquet(path) for path in receipt_paths], ignore_index=True)
+        new_items = (pd.concat([pd.read_parquet(path) for path in item_paths], ignore_index=True)
+                     if item_paths else pd.DataFrame(columns=list(ITEM_FIELDS)))
+        old = manifest['partitions'].get(key)
+        if old:
+            # Re-archiving the same rows (e.g. after a failed delete) must not duplicate them
+            new_receipts = pd.concat([self._frame(key, old, 'receipts'), new_receipts], ignore_index=True)
+            new_items = pd.concat([self._frame(key, old, 'items'), new_items], ignore_index=True)
+        new_receipts = new_receipts.drop_duplicates('id', keep='last').sort_values('id')
+        new_items = new_items.drop_duplicates('id', keep='last').sort_values('id') if not new_items.empty else new_items
+
+        # New file names, so readers of the current manifest keep reading the old files
+        directory = self._path(f'company_code={company}', f'month={month}')
+        self._filesystem().create_dir(directory, recursive=True)
+        version = f'{datetime.now():%Y%m%dT%H%M%S%f}-{os.getpid()}'
+        files = {}
+        for name, df in (('receipts', new_receipts), ('items', new_items)):
+            sink = pa.BufferOutputStream()
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), sink, compression='zstd')
+            files[name] = f'{name}-{version}.parquet'
+            self._write_bytes(f'{directory}/{files[name]}', sink.getvalue().to_pybytes())
+
+        if old:
+            manifest.setdefault('retired', []).extend(
+                {'path': f'{directory}/{_file_name(old, name)}', 'retired_at': time.time()}
+                for name in ('receipts', 'items')
+            )
+        manifest['partitions'][key] = {
+            'company_code': company,
+            'month': month,
+            'receipts': len(new_receipts),
+            'items': len(new_items),
+            'min_id': int(new_receipts['id'].min()),
+            'max_id': int(new_receipts['id'].max()),
+            'files': files,
+            'updated_at': datetime.now().isoformat(),
+        }
+
+    def _remove_retired(self, manifest):
+        """Delete replaced partition files no reader can still be using"""
+        keep = []
+        for entry in manifest.get('retired', []):
+            if time.time() - entry['retired_at'] < RETIRED_GRACE:
+                keep.append(entry)
+                continue
+            try:
+                self._filesystem().delete_file(entry['path'])
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Error removing archived file {entry['path']}: {e}")
+                keep.append(entry)
+        manifest['retired'] = keep
+
+    def archive(self, store, max_receipt_id=None, date_before=None, chunk_size=500):
+        """Move receipts up to ``max_receipt_id`` and/or dated before ``date_before`` into the archive.
+
+        Rows are spilled to local files chunk by chunk and each partition is
+        rewritten under a new name, so readers only wait for the manifest
+        swap. Returns ``{'receipts', 'items', 'partitions'}``.
+        """
+        if max_receipt_id is None and not date_before:
+            raise ValueError('Provide max_receipt_id or date_before')
+
+        with self._writer(), tempfile.TemporaryDirectory(prefix='nota-archive-') as staging:
+            groups = {}  # (company, month) -> (staged receipt files, staged item files)
+            ids = []
+            items_count = 0
+            for number, chunk in enumerate(store.iter_receipts(chunk_size, max_receipt_id, date_before)):
+                self._stage_chunk(staging, groups, chunk, number)
+                ids.extend(receipt['id'] for receipt in chunk)
+                items_count += sum(len(receipt.get('items') or []) for receipt in chunk)
+
+            if not ids:
+                return {'receipts': 0, 'items': 0, 'partitions': []}
+
+            manifest = json.loads(json.dumps(self.manifest(force=True)))  # private copy
+            for (company, month), (receipt_paths, item_paths) in sorted(groups.items()):
+                self._write_partition(manifest, company, month, receipt_paths, item_paths)
+            self._remove_retired(manifest)
+            with self._lock:
+                self._write_bytes(self._path(MANIFEST), json.dumps(manifest, indent=2).encode())
+                self._manifest = manifest
+                self._manifest_checked = time.monotonic()
+
+            # Everything is archived; now the live rows can go
+            store.delete_receipts(ids)
+
+        return {
+            'receipts': len(ids),
+            'items': items_count,
+            'partitions': [f'{company}/{month}' for company, month in sorted(groups)],
+        }
+
+    # Reading
+
+    def _partitions(self, company=None, date_from=None, date_to=None):
+        month_from = date_from[:7] if date_from else None
+        month_to = date_to[:7] if date_to else None
+        for key, entry in sorted(self.manifest()['partitions'].items()):
+            if company and entry['company_code'] != company:
+                continue
+            if month_from and entry['month'] < month_from:
+                continue
+            if month_to and entry['month'] > month_to:
+                continue
+            yield key, entry
+
+    def _items_for(self, key, entry, receipt_ids):
+        items = self._frame(key, entry, 'items')
+        if items.empty:
+            return {}
+        selected = items[items['receipt_id'].isin(receipt_ids)].sort_values('id')
+        grouped = {}
+        for item in _records(selected):
+            grouped.setdefault(item['receipt_id'], []).append(item)
+        return grouped
+
+    def get(self, receipt_id):
+        """Archived receipt with ``receipt['items']``, or None"""
+        for key, entry in self.manifest()['partitions'].items():
+            if not entry['min_id'] <= receipt_id <= entry['max_id']:
+                continue
+            receipts = self._frame(key, entry, 'receipts')
+            match = receipts[receipts['id'] == receipt_id]
+            if not match.empty:
+                receipt = _records(match)[0]
+                receipt['items'] = self._items_for(key, entry, [receipt_id]).get(receipt_id, [])
+                return receipt
+        return None
+
+    def query(self, company=None, date_from=None, date_to=None, q=None, columns=None,
+              limit=50, cursor=None, with_items=False, order='created'):
+        """Filter archived receipts like list_receipts; returns ``(rows, total)``.
+
+        ``order='created'`` is newest first on (created_at, id) and honours
+        ``cursor``; ``order='date'`` is oldest first on (date, id), for printing.
+        """
+        import pandas as pd
+
+        parts = list(self._partitions(company, date_from, date_to))
+        if not parts:
+            return [], 0
+
+        frames = []
+        for key, entry in parts:
+            df = self._frame(key, entry, 'receipts')
+            mask = pd.Series(True, index=df.index)
+            if company:
+                mask &= df['company_code'] == company
+            if date_from:
+                mask &= df['date'].astype(str) >= date_from
+            if date_to:
+                mask &= df['date'].astype(str) <= date_to
+            if q:
+                text = pd.Series(False, index=df.index)
+                for field in SEARCH_FIELDS:
+                    text |= df[field].astype(str).str.contains(q, case=False, regex=False)
+                mask &= text
+            selected = df[mask]
+            if not selected.empty:
+                frames.append((key, entry, selected))
+        if not frames:
+            return [], 0
+
+        df = pd.concat([frame for _, _, frame in frames])
+        total = len(df)
+        if order == 'date':
+            df = df.assign(_date=df['date'].astype(str)).sort_values(['_date', 'id']).drop(columns='_date')
+        else:
+            if cursor:
+                created_at, receipt_id = cursor
+                created = df['created_at'].astype(str)
+                df = df[(created < created_at) | ((created == created_at) & (df['id'] < receipt_id))]
+            df = df.sort_values(['created_at', 'id'], ascending=False)
+        df = df.head(limit)
+        if columns:
+            df = df[[c for c in columns if c in df.columns]]
+        rows = _records(df)
+
+        if with_items and rows:
+            wanted = {row['id'] for row in rows}
+            items = {}
+            for key, entry, frame in frames:
+                ids = [i for i in frame['id'].tolist() if i in wanted]
+                if ids:
+                    items.update(self._items_for(key, entry, ids))
+            for row in rows:
+                row['items'] = items.get(row['id'], [])
+        return rows, total
+
+    def search(self, q, company=None, date_from=None, date_to=None, limit=20, offset=0):
+        """Archived receipts with every word of ``q`` as a word prefix in the receipt or its items.
+
+        Returns ``(rows, total)`` like ``Storage.search``, newest first and
+        unranked (``score`` None).
+        """
+        import pandas as pd
+
+        terms = search_terms(q)
+        found = []
+        for key, entry in self._partitions(company, date_from, date_to):
+            df = self._frame(key, entry, 'receipts')
+            mask = pd.Series(True, index=df.index)
+            if company:
+                mask &= df['company_code'] == company
+            if date_from:
+                mask &= df['date'].astype(str) >= date_from
+            if date_to:
+                mask &= df['date'].astype(str) <= date_to
+            if not mask.any():
+                continue
+            items = self._frame(key, entry, 'items')
+            item_text = pd.Series(dtype=object)
+            if not items.empty:
+                item_text = (items['item_type'].fillna('').astype(str) + ' ' + items['size'].fillna('').astype(str)
+                             + ' ' + items['color'].fillna('').astype(str)).groupby(items['receipt_id']).agg(' '.join)
+            text = (df['receipt_number'].astype(str) + ' ' + df['recipient'].fillna('').astype(str) + ' '
+                    + df['company_name'].fillna('').astype(str) + ' '
+                    + df['id'].map(item_text).fillna('')).str.casefold()
+            for term in terms:
+                mask &= text.str.contains(r'(?<!\w)' + re.escape(term), regex=True)
+            if mask.any():
+                found.append((key, entry, df[mask]))
+        if not found:
+            return [], 0
+
+        df = pd.concat([frame for _, _, frame in found]).sort_values(['created_at', 'id'], ascending=False)
+        total = len(df)
+        rows = _records(df.iloc[offset:offset + limit])
+        wanted = {row['id'] for row in rows}
+        items = {}
+        for key, entry, frame in found:
+            ids = [i for i in frame['id'].tolist() if i in wanted]
+            if ids:
+                items.update(self._items_for(key, entry, ids))
+        for row in rows:
+            row['score'] = None
+            row['matched_items'] = matching_items(items.get(row['id'], []), terms)
+        return rows, total
+
+    def iter_receipts(self, columns=None):
+        """Every archived receipt (without items), partition by partition"""
+        for key, entry in sorted(self.manifest()['partitions'].items()):
+            df = self._frame(key, entry, 'receipts')
+            if columns:
+                df = df[[c for c in columns if c in df.columns]]
+            yield from _records(df)
+
+    def receipt_numbers(self):
+        """Set of every archived receipt_number"""
+        numbers = set()
+        for key, entry in sorted(self.manifest()['partitions'].items()):
+            numbers.update(self._frame(key, entry, 'receipts')['receipt_number'].astype(str))
+        return numbers
+
+    def iter_frames(self):
+        """``(receipts, items)`` DataFrames of every partition; shared with the cache, do not modify"""
+        for key, entry in sorted(self.manifest()['partitions'].items()):
+            yield self._frame(key, entry, 'receipts'), self._frame(key, entry, 'items')
+
+    def stats(self):
+        partitions = self.manifest()['partitions']
+        return {
+            'partitions': len(partitions),
+            'receipts': sum(p['receipts'] for p in partitions.values()),
+            'items': sum(p['items'] for p in partitions.values()),
+            'companies': sorted({p['company_code'] for p in partitions.values()}),
+            'months': sorted({p['month'] for p in partitions.values()}),
+        }
+
+
+def _created_key(row):
+    return (str(row['created_at']), row['id'])
+
+
+class ArchivedStorage:
+    """Storage wrapper that falls back to the archive for rows no longer in the live tables"""
+
+    def __init__(self, backend, archive):
+        self.backend = backend
+        self.archive = archive
+        self.name = backend.name
+
+    def __getattr__(self, attr):
+        return getattr(self.backend, attr)
+
+    def list_receipts(self, company=None, date_from=None, date_to=None, q=None,
+                      fields=None, limit=50, cursor=None, with_items=False):
+        rows, next_cursor, total = self.backend.list_receipts(
+            company=company, date_from=date_from, date_to=date_to, q=q,
+            fields=fields, limit=limit, cursor=cursor, with_items=with_items
+        )
+        if not self.archive.has_data():
+            return rows, next_cursor, total
+
+        # Merge the live page with the archived rows that sort after the same cursor
+        archived, archived_total = self.archive.query(
+            company=company, date_from=date_from, date_to=date_to, q=q,
+            columns=parse_fields(fields), limit=limit + 1,
+            cursor=decode_cursor(cursor) if cursor else None, with_items=with_items
+        )
+        merged = sorted(rows + archived, key=_created_key, reverse=True)
+        page = merged[:limit]
+        more = next_cursor is not None or len(merged) > limit
+        return page, encode_cursor(page[-1]) if more and page else None, (total or 0) + archived_total
+
+    def search(self, q, company=None, date_from=None, date_to=None, limit=20, offset=0):
+        """Live matches first (ranked), then archived ones (newest first)"""
+        rows, total = self.backend.search(
+            q, company=company, date_from=date_from, date_to=date_to, limit=limit, offset=offset
+        )
+        if not self.archive.has_data():
+            return rows, total
+
+        # The archived matches continue the live result list after its last row
+        archived, archived_total = self.archive.search(
+            q, company=company, date_from=date_from, date_to=date_to,
+            limit=limit - len(rows), offset=max(0, offset - (total or 0))
+        )
+        return rows + archived, (total or 0) + archived_total
+
+    def get_receipt(self, receipt_id):
+        return self.backend.get_receipt(receipt_id) or self.archive.get(receipt_id)
+
+    def get_receipts(self, ids):
+        receipts = self.backend.get_receipts(ids)
+        found = {receipt['id'] for receipt in receipts}
+        for receipt_id in ids:
+            if receipt_id not in found:
+                receipt = self.archive.get(receipt_id)
+                if receipt:
+                    receipts.append(receipt)
+        position = {receipt_id: i for i, receipt_id in enumerate(ids)}
+        receipts.sort(key=lambda r: position.get(r['id'], len(position)))
+        return receipts
+
+    def fetch_receipts_for_batch(self, ids=None, company=None, date_from=None, date_to=None,
+                                 max_receipts=500):
+        if ids:
+            if len(ids) > max_receipts:
+                raise QueryError(f'Maximum {max_receipts} receipts per batch')
+            return self.get_receipts(ids)
+
+        receipts = self.backend.fetch_receipts_for_batch(
+            company=company, date_from=date_from, date_to=date_to, max_receipts=max_receipts
+        )
+        archived, _ = self.archive.query(
+            company=company, date_from=date_from, date_to=date_to,
+            limit=max_receipts + 1, with_items=True, order='date'
+        )
+        if len(receipts) + len(archived) > max_receipts:
+            raise QueryError(f'Maximum {max_receipts} receipts per batch; narrow the range')
+        return sorted(receipts + archived, key=lambda r: (str(r['date']), r['id']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move old receipts from the live tables into the archive')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--before', help='archive receipts dated before YYYY-MM-DD')
+    group.add_argument('--older-than-days', type=int)
+    args = parser.parse_args()
+
+    from config import Config
+    from storage import init_storage, get_archive
+
+    store = init_storage(vars(Config))
+    archive = get_archive()
+    if store is None:
+        parser.error('Database not configured')
+    if archive is None:
+        parser.error('ARCHIVE_DIR is not set')
+
+    before = args.before or (date.today() - timedelta(days=args.older_than_days)).isoformat()
+    start = time.perf_counter()
+    result = archive.archive(store, date_before=before)
+    print(f"Archived {result['receipts']} receipts and {result['items']} items dated before {before} "
+          f"into {len(result['partitions'])} partition(s) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Benchmark: mode sync vs ASYNC_IO dengan 50 client bersamaan.
+
+Serves the real Flask app (threaded, as ``python app.py`` does) twice, once
+per mode, against a local PostgREST stand-in that adds a fixed round-trip
+latency to every request, and drives each endpoint from ``--concurrency``
+logged-in clients, back to back or with ``--think`` seconds between the
+requests of a client. The stand-in has no receipt_stats() RPC, so /api/stats
+takes the per-company count fallback. Both servers and the stand-in run in
+their own processes so they do not share a GIL with the load generator.
+
+    python benchmarks/bench_async.py --concurrency 50 --latency 0.03 --output async_results.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, APP_DIR)
+
+from urllib.parse import urlsplit
+
+ENDPOINTS = ('receipt', 'stats', 'receipt_pdf', 'export')
+
+USERNAME = 'admin'
+PASSWORD = 'admin'
+
+# Runs in its own interpreter: prints its URL, serves until stdin closes
+FAKE_SERVER = r'''
+import hashlib, sys
+sys.path.insert(0, sys.argv[1])
+from fake_postgrest import FakePostgrest
+user = {'username': sys.argv[4], 'password': hashlib.sha256(sys.argv[5].encode()).hexdigest(),
+        'full_name': 'Benchmark', 'email': 'bench@example.com'}
+fake = FakePostgrest(latency=float(sys.argv[2])).seed(int(sys.argv[3]), users=[user]).start()
+print(fake.url, flush=True)
+sys.stdin.read()
+'''
+
+APP_SERVER = r'''
+import logging, sys
+sys.path.insert(0, sys.argv[1])
+from werkzeug.serving import make_server
+import app
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+httpd = make_server('127.0.0.1', 0, app.app, threaded=True)
+print(f'http://127.0.0.1:{httpd.server_port}', flush=True)
+import threading
+threading.Thread(target=httpd.serve_forever, daemon=True).start()
+sys.stdin.read()
+'''
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, errors, wall_time):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall_time, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def start(script, args, env=None):
+    """Child process running ``script``; returns ``(process, url)``"""
+    process = subprocess.Popen(
+        [sys.executable, '-c', script, *map(str, args)],
+        cwd=APP_DIR, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+    )
+    url = process.stdout.readline().strip()
+    if not url:
+        process.kill()
+        raise RuntimeError('server failed to start')
+    return process, url
+
+
+def stop(process):
+    process.stdin.close()
+    process.terminate()
+    process.wait()
+
+
+def make_request(endpoint, receipt_ids, rng):
+    """(method, path, json) for one request against ``endpoint``"""
+    if endpoint == 'receipt':
+        return 'GET', f'/api/receipts/{rng.choice(receipt_ids)}', None
+    if endpoint == 'stats':
+        return 'GET', '/api/stats', None
+    if endpoint == 'receipt_pdf':
+        return 'GET', f'/api/receipts/{rng.choice(receipt_ids)}/pdf', None
+    if endpoint == 'export':
+        return 'POST', '/api/export', None
+    raise ValueError(f'Unknown endpoint: {endpoint}')
+
+
+class Client:
+    """Logged-in keep-alive connection; http.client keeps the load generator's own CPU use low"""
+
+    def __init__(self, url):
+        address = urlsplit(url)
+        self.connection = http.client.HTTPConnection(address.hostname, address.port, timeout=300)
+        self.cookie = None
+        status = self.request('POST', '/login', {'username': USERNAME, 'password': PASSWORD})
+        if status != 200 or not self.cookie:
+            raise RuntimeError(f'login failed ({status})')
+
+    def request(self, method, path, body=None):
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method, path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+def run_endpoint(url, endpoint, receipt_ids, requests_count, concurrency, seed, think=0.0):
+    lock = threading.Lock()
+    latencies, state = [], {'errors': 0, 'next': 0}
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        client = Client(url)
+        try:
+            while True:
+                with lock:
+                    if state['next'] >= requests_count:
+                        return
+                    state['next'] += 1
+                method, path, body = make_request(endpoint, receipt_ids, rng)
+                start = time.perf_counter()
+                try:
+                    ok = client.request(method, path, body) < 400
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    state['errors'] += 0 if ok else 1
+                if think:
+                    time.sleep(rng.uniform(0, 2 * think))
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return summarize(latencies, state['errors'], time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--receipts', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.03, help='seconds per PostgREST request')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    parser.add_argument('--export-requests', type=int, default=20)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--think', type=float, default=0.0,
+                        help='mean pause between the requests of one client in seconds (0: back to back)')
+    parser.add_argument('--max-connections', type=int, default=20, help='SUPABASE_MAX_CONNECTIONS')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoint(s): {', '.join(sorted(unknown))}")
+
+    fake, fake_url = start(FAKE_SERVER, [BENCH_DIR, args.latency, args.receipts, USERNAME, PASSWORD])
+    receipt_ids = list(range(1, args.receipts + 1))
+    results = []
+    try:
+        print(f"{args.receipts} receipts, {args.latency * 1000:.0f} ms per query, {args.concurrency} clients, "
+              f"{args.think}s think time")
+        print(f"{'endpoint':>12} {'mode':>6} {'req':>5} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for mode in ('sync', 'async'):
+            env = dict(
+                os.environ, STORAGE_BACKEND='supabase', SUPABASE_URL=fake_url, SUPABASE_KEY='benchmark-key',
+                SUPABASE_MAX_CONNECTIONS=str(args.max_connections), ASYNC_IO=str(mode == 'async').lower(),
+                STATS_CACHE_TTL='0', WARM_UP_ON_START='false', ARCHIVE_DIR='', PDF_CACHE_DIR='',
+            )
+            server, url = start(APP_SERVER, [APP_DIR], env)
+            try:
+                for endpoint in endpoints:
+                    count = args.export_requests if endpoint == 'export' else args.requests
+                    summary = run_endpoint(url, endpoint, receipt_ids, count, args.concurrency, args.seed, args.think)
+                    results.append(dict(summary, endpoint=endpoint, mode=mode))
+                    print(f"{endpoint:>12} {mode:>6} {summary['requests']:>5} {summary['errors']:>4} "
+                          f"{summary['throughput_rps']:>8} {summary['p50_ms']:>8} "
+                          f"{summary['p95_ms']:>8} {summary['p99_ms']:>8}")
+            finally:
+                stop(server)
+    finally:
+        stop(fake)
+
+    print(f"\n{'endpoint':>12} {'rps async/sync':>15} {'p50 async/sync':>15}")
+    by_key = {(r['endpoint'], r['mode']): r for r in results}
+    for endpoint in endpoints:
+        sync, async_ = by_key[(endpoint, 'sync')], by_key[(endpoint, 'async')]
+        print(f"{endpoint:>12} {async_['throughput_rps'] / sync['throughput_rps']:>15.2f} "
+              f"{async_['p50_ms'] / sync['p50_ms']:>15.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'cpu_count': os.cpu_count(),
+                    'receipts': args.receipts,
+                    'latency': args.latency,
+                    'concurrency': args.concurrency,
+                    'think': args.think,
+                    'max_connections': args.max_connections,
+                },
+                'results': results,
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
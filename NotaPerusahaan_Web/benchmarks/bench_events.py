@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ratusan koneksi /api/events yang idle, dan kecepatan fan-out event.
+
+Serves the real Flask app (threaded, SQLite backend) and opens
+``--streams`` logged-in /api/events connections. It then measures, with the
+streams idle, the server's CPU use and the /api/stats latency (stats cache
+off) next to a run without streams. It creates ``--receipts`` nota and
+records how long each receipt-created event takes to reach every stream
+(fan-out latency).
+
+Each open stream holds one server thread, so the server's memory (RSS) and
+thread count are read before and after opening the streams; the cost per
+stream is projected to ``--target-streams`` (default: the EVENTS_MAX_CLIENTS
+default). After the streams are closed it times how long the server takes to
+notice, which is up to one keep-alive interval.
+
+    python benchmarks/bench_events.py --streams 300 --idle 10 --output events.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_async import APP_SERVER, Client, start, stop, summarize, percentile
+from seed_data import seed_sqlite
+from urllib.parse import urlsplit
+
+TOKEN = 'bench-events'
+
+
+def cpu_seconds(pid):
+    """User + system CPU time of a process (Linux /proc), or None"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_status(pid):
+    """``(RSS in KB, threads)`` of a process (Linux /proc), or ``(None, None)``"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['VmRSS'].split()[0]), int(fields['Threads'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def open_streams(url):
+    """The server's count of open /api/events streams, from /metrics"""
+    address = urlsplit(url)
+    connection = http.client.HTTPConnection(address.hostname, address.port, timeout=30)
+    try:
+        connection.request('GET', '/metrics', headers={'Authorization': f'Bearer {TOKEN}'})
+        for line in connection.getresponse().read().decode().splitlines():
+            if line.startswith('nota_events{stat="clients"}'):
+                return int(float(line.split()[-1]))
+    finally:
+        connection.close()
+    return None
+
+
+class Stream:
+    """An open /api/events connection read line by line on its own thread"""
+
+    def __init__(self, url, cookie, on_event):
+        address = urlsplit(url)
+        self.connection = http.client.HTTPConnection(address.hostname, address.port, timeout=300)
+        # Own the socket: http.client hands it over to the response and close() leaves it open
+        self.sock = self.connection.sock = socket.create_connection((address.hostname, address.port), timeout=300)
+        self.connection.request('GET', '/api/events', headers={'Cookie': cookie, 'Accept': 'text/event-stream'})
+        self.response = self.connection.getresponse()
+        if self.response.status != 200:
+            raise RuntimeError(f'/api/events returned {self.response.status}')
+        self.on_event = on_event
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        event = None
+        try:
+            for raw in self.response:
+                line = raw.decode().rstrip('\n')
+                if line.startswith('event: '):
+                    event = line[7:]
+                elif line.startswith('data: ') and event:
+                    self.on_event(event, json.loads(line[6:]))
+                    event = None
+        except (OSError, ValueError, http.client.HTTPException):
+            pass
+        finally:
+            self.response.close()
+
+    def close(self):
+        """Close the socket like a closed tab does"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.thread.join(5)
+        self.sock.close()
+
+
+def probe_stats(client, seconds):
+    latencies = []
+    stop_at = time.perf_counter() + seconds
+    while time.perf_counter() < stop_at:
+        start_time = time.perf_counter()
+        client.request('GET', '/api/stats')
+        latencies.append(time.perf_counter() - start_time)
+        time.sleep(0.02)
+    return summarize(latencies, 0, seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--streams', type=int, default=300)
+    parser.add_argument('--idle', type=float, default=10.0, help='seconds to measure with the streams idle')
+    parser.add_argument('--receipts', type=int, default=20, help='nota created to measure fan-out')
+    parser.add_argument('--target-streams', type=int, default=500, help='stream count the cost is projected to')
+    parser.add_argument('--keepalive', type=float, default=15.0, help='EVENTS_KEEPALIVE_SECONDS')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'nota.db')
+        seed_sqlite(db_path, 2000)
+        env = dict(os.environ, STORAGE_BACKEND='sqlite', SQLITE_PATH=db_path, ARCHIVE_DIR='',
+                   WARM_UP_ON_START='false', STATS_CACHE_TTL='0', JOBS_DIR=os.path.join(tmp, 'jobs'),
+                   EVENTS_MAX_CLIENTS=str(args.streams + 10), EVENTS_KEEPALIVE_SECONDS=str(args.keepalive),
+                   METRICS_TOKEN=TOKEN)
+        server, url = start(APP_SERVER, [APP_DIR], env=env)
+        try:
+            client = Client(url)
+            cpu_start = cpu_seconds(server.pid)
+            baseline = probe_stats(client, args.idle)
+            cpu_baseline = cpu_seconds(server.pid)
+
+            lock = threading.Lock()
+            arrivals = {}
+
+            def on_event(event, data):
+                if event == 'receipt-created':
+                    with lock:
+                        arrivals.setdefault(data['receipt_number'], []).append(time.perf_counter())
+
+            rss_before, threads_before = process_status(server.pid)
+            opened = time.perf_counter()
+            streams = [Stream(url, client.cookie, on_event) for _ in range(args.streams)]
+            open_seconds = time.perf_counter() - opened
+            time.sleep(1)
+            rss_streams, threads_streams = process_status(server.pid)
+
+            cpu_before = cpu_seconds(server.pid)
+            idle = probe_stats(client, args.idle)
+            cpu_after = cpu_seconds(server.pid)
+
+            fanout = []
+            for n in range(args.receipts):
+                number = f'EV{n:05d}'
+                sent = time.perf_counter()
+                client.request('POST', '/api/receipts', {
+                    'receipt_number': number, 'company_code': 'CH', 'company_name': 'PT. CHASTE GEMILANG MANDIRI',
+                    'date': date.today().isoformat(), 'recipient': 'Bench', 'address': 'Jl. Bench',
+                    'total_amount': 1000, 'items': []
+                })
+                deadline = time.perf_counter() + 10
+                while time.perf_counter() < deadline:
+                    with lock:
+                        if len(arrivals.get(number, ())) >= args.streams:
+                            break
+                    time.sleep(0.001)
+                with lock:
+                    times = sorted(t - sent for t in arrivals.get(number, ()))
+                if len(times) < args.streams:
+                    print(f'{number}: only {len(times)} of {args.streams} streams got the event')
+                if times:
+                    fanout.append(times[-1])
+
+            # A closed client is only noticed at the next write to it (a keep-alive)
+            for stream in streams:
+                stream.close()
+            closed = time.perf_counter()
+            left = open_streams(url)
+            while left and time.perf_counter() - closed < args.keepalive * 2 + 5:
+                time.sleep(0.1)
+                left = open_streams(url)
+            close_seconds = time.perf_counter() - closed
+            _, threads_closed = process_status(server.pid)
+        finally:
+            stop(server)
+
+    fanout.sort()
+    rss_per_stream = (rss_streams - rss_before) / args.streams if rss_before is not None else None
+    threads_per_stream = (threads_streams - threads_before) / args.streams if threads_before is not None else None
+    result = {
+        'streams': args.streams,
+        'open_seconds': round(open_seconds, 2),
+        'stats_without_streams': baseline,
+        'stats_with_idle_streams': idle,
+        # Both windows include the /api/stats probe
+        'server_cpu_percent_without_streams': round((cpu_baseline - cpu_start) / args.idle * 100, 1)
+        if cpu_start is not None else None,
+        'server_cpu_percent_idle_streams': round((cpu_after - cpu_before) / args.idle * 100, 1)
+        if cpu_before is not None else None,
+        'fanout_all_streams_p50_ms': round(percentile(fanout, 50) * 1000, 1) if fanout else None,
+        'fanout_all_streams_max_ms': round(fanout[-1] * 1000, 1) if fanout else None,
+        'server_rss_mb_without_streams': round(rss_before / 1024, 1) if rss_before is not None else None,
+        'server_rss_mb_with_streams': round(rss_streams / 1024, 1) if rss_streams is not None else None,
+        'server_threads_without_streams': threads_before,
+        'server_threads_with_streams': threads_streams,
+        'rss_kb_per_stream': round(rss_per_stream, 1) if rss_per_stream is not None else None,
+        'threads_per_stream': round(threads_per_stream, 2) if threads_per_stream is not None else None,
+        'target_streams': args.target_streams,
+        'target_rss_mb': round(rss_per_stream * args.target_streams / 1024, 1) if rss_per_stream is not None else None,
+        'target_threads': round(threads_per_stream * args.target_streams) if threads_per_stream is not None else None,
+        'keepalive_seconds': args.keepalive,
+        'close_noticed_seconds': round(close_seconds, 2) if not left else None,
+        'streams_left_open': left,
+        'server_threads_after_close': threads_closed,
+    }
+    print(f"{args.streams} streams opened in {result['open_seconds']} s; "
+          f"stats p50/p95 {baseline['p50_ms']}/{baseline['p95_ms']} ms without, "
+          f"{idle['p50_ms']}/{idle['p95_ms']} ms with idle streams; "
+          f"server CPU {result['server_cpu_percent_without_streams']}% without, "
+          f"{result['server_cpu_percent_idle_streams']}% with idle streams (both include the probe); "
+          f"event to all streams p50 {result['fanout_all_streams_p50_ms']} ms, "
+          f"max {result['fanout_all_streams_max_ms']} ms")
+    if rss_per_stream is not None:
+        print(f"per stream {result['rss_kb_per_stream']} KB RSS and {result['threads_per_stream']} server threads; "
+              f"{args.target_streams} streams = {result['target_rss_mb']} MB and {result['target_threads']} threads "
+              f"(server without streams: {result['server_rss_mb_without_streams']} MB, "
+              f"{threads_before} threads)")
+    print(f"closed streams noticed after {result['close_noticed_seconds']} s "
+          f"(keep-alive {args.keepalive} s), {left} still counted; "
+          f"server threads {threads_streams} -> {threads_closed}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(dict(result, python=platform.python_version(), cpus=os.cpu_count()), f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
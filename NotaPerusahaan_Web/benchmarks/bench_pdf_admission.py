@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latensi /login dan /api/stats saat banyak kasir mencetak PDF bersamaan.
+
+Serves the real Flask app (threaded, SQLite backend, PDF cache off so every
+print renders) once per configuration. ``--cashiers`` logged-in users click
+print back to back, honouring Retry-After on 503 like history.js does,
+while one probe client alternates /login and /api/stats (stats cache off)
+and records their latency. ``unbounded`` gives every cashier its own render
+thread, which is how renders behaved on the request threads before the
+render pool; ``bounded`` uses the PDF_RENDER_* defaults.
+
+    python benchmarks/bench_pdf_admission.py --cashiers 12 --duration 20 --output pdf_admission.json
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_async import APP_SERVER, start, stop, summarize
+from seed_data import seed_sqlite
+from sqlite_storage import SQLiteStorage
+from urllib.parse import urlsplit
+
+PASSWORD = 'kasir123'
+
+CONFIGS = {
+    # name -> (PDF_RENDER_WORKERS, PDF_RENDER_QUEUE, PDF_RENDER_PER_USER); None = config defaults
+    'unbounded': lambda cashiers: (cashiers, 1000, 1000),
+    'bounded': lambda cashiers: None,
+}
+
+
+class Client:
+    """Keep-alive connection logged in as ``username``"""
+
+    def __init__(self, url, username):
+        address = urlsplit(url)
+        self.connection = http.client.HTTPConnection(address.hostname, address.port, timeout=300)
+        self.username = username
+        self.cookie = None
+        status, _ = self.request('POST', '/login', {'username': username, 'password': PASSWORD})
+        if status != 200 or not self.cookie:
+            raise RuntimeError(f'login failed ({status})')
+
+    def request(self, method, path, body=None):
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method, path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status, response.getheader('Retry-After')
+
+    def close(self):
+        self.connection.close()
+
+
+def add_users(db_path, count):
+    store = SQLiteStorage(db_path)
+    usernames = [f'kasir{n}' for n in range(count + 1)]
+    for username in usernames:
+        store.create_user({
+            'full_name': username, 'username': username, 'email': f'{username}@example.com',
+            'password': hashlib.sha256(PASSWORD.encode()).hexdigest(),
+            'created_at': datetime.now().isoformat()
+        })
+    return usernames
+
+
+def run_config(db_path, usernames, receipts, limits, duration, seed):
+    env = dict(os.environ, STORAGE_BACKEND='sqlite', SQLITE_PATH=db_path, ARCHIVE_DIR='',
+               WARM_UP_ON_START='true', PDF_CACHE_MAX_BYTES='0', PDF_CACHE_DIR='', STATS_CACHE_TTL='0',
+               JOBS_DIR=os.path.join(os.path.dirname(db_path), 'jobs'))
+    if limits is not None:
+        env['PDF_RENDER_WORKERS'], env['PDF_RENDER_QUEUE'], env['PDF_RENDER_PER_USER'] = map(str, limits)
+    server, url = start(APP_SERVER, [APP_DIR], env=env)
+
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+    pdf = {'latencies': [], 'errors': 0, 'rejected': 0}
+    probes = {'login': [], 'stats': []}
+
+    def cashier(n):
+        rng = random.Random(seed + n)
+        client = Client(url, usernames[n + 1])
+        try:
+            while time.perf_counter() < stop_at:
+                start_time = time.perf_counter()
+                status, retry_after = client.request('GET', f'/api/receipts/{rng.randint(1, receipts)}/pdf')
+                with lock:
+                    if status == 503:
+                        pdf['rejected'] += 1
+                    else:
+                        pdf['latencies'].append(time.perf_counter() - start_time)
+                        pdf['errors'] += status >= 400
+                if status == 503:
+                    time.sleep(float(retry_after or 1))
+        finally:
+            client.close()
+
+    def probe():
+        client = Client(url, usernames[0])
+        try:
+            while time.perf_counter() < stop_at:
+                for name, method, path, body in (
+                    ('login', 'POST', '/login', {'username': usernames[0], 'password': PASSWORD}),
+                    ('stats', 'GET', '/api/stats', None),
+                ):
+                    start_time = time.perf_counter()
+                    client.request(method, path, body)
+                    probes[name].append(time.perf_counter() - start_time)
+                time.sleep(0.05)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=cashier, args=(n,)) for n in range(len(usernames) - 1)]
+    threads.append(threading.Thread(target=probe))
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        stop(server)
+    wall_time = time.perf_counter() - started
+
+    result = {'pdf': dict(summarize(pdf['latencies'], pdf['errors'], wall_time), rejected_503=pdf['rejected'])}
+    for name, latencies in probes.items():
+        result[name] = summarize(latencies, 0, wall_time)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--receipts', type=int, default=2000)
+    parser.add_argument('--cashiers', type=int, default=12)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds per configuration')
+    parser.add_argument('--configs', default=','.join(CONFIGS))
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'nota.db')
+        seed_sqlite(db_path, args.receipts)
+        usernames = add_users(db_path, args.cashiers)
+
+        results = []
+        for name in args.configs.split(','):
+            limits = CONFIGS[name](args.cashiers)
+            result = run_config(db_path, usernames, args.receipts, limits, args.duration, args.seed)
+            results.append(dict(result, config=name, limits=limits))
+            print(f"{name:<10} pdf {result['pdf']['throughput_rps']:>6} rps p95 {result['pdf']['p95_ms']:>8} ms "
+                  f"503s {result['pdf']['rejected_503']:>5} | login p50/p95 {result['login']['p50_ms']}/"
+                  f"{result['login']['p95_ms']} ms | stats p50/p95 {result['stats']['p50_ms']}/"
+                  f"{result['stats']['p95_ms']} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(), 'cpus': os.cpu_count(),
+                'cashiers': args.cashiers, 'duration_s': args.duration, 'results': results
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cetak banyak nota sekaligus dengan 1, 4 dan 8 worker.
+
+Renders the same set of receipts through pdf_batch.render_batch with
+different process pool sizes and merges them into one PDF, reporting
+pages per second. The pool is warmed up first so process start-up is not
+counted.
+
+    python benchmarks/bench_pdf_batch.py --receipts 200 --workers 1,4,8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pdf_batch
+from config import Config
+
+
+def make_receipts(count, items_per_receipt):
+    codes = list(Config.COMPANIES)
+    receipts = []
+    for i in range(count):
+        code = codes[i % len(codes)]
+        receipts.append({
+            'id': i + 1,
+            'receipt_number': f'{code}{i + 1:05d}',
+            'company_code': code,
+            'company_name': Config.COMPANIES[code],
+            'date': '2025-02-09',
+            'recipient': f'Pelanggan {i}',
+            'address': 'Jl. Contoh No. 1, Jakarta Barat',
+            'total_amount': 250000.0 * items_per_receipt,
+            'items': [{
+                'quantity': '2',
+                'item_type': 'Terpal A5',
+                'size': '4x6',
+                'color': 'Biru',
+                'unit_price': 125000.0,
+                'total_price': 250000.0
+            } for _ in range(items_per_receipt)]
+        })
+    return receipts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--receipts', type=int, default=200)
+    parser.add_argument('--items', type=int, default=5, help='items per receipt')
+    parser.add_argument('--workers', default='1,4,8')
+    args = parser.parse_args()
+
+    # Worker processes load the logo relative to the app directory
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+    receipts = make_receipts(args.receipts, args.items)
+    print(f"{args.receipts} receipts, {args.items} items each, {os.cpu_count()} CPU(s)")
+    print(f"{'workers':>8} {'seconds':>8} {'pages/s':>8} {'merged MB':>10}")
+
+    for workers in [int(w) for w in args.workers.split(',')]:
+        pdf_batch.render_batch(receipts[:workers * 2], 'bench', '01/01/2025 00:00', workers=workers)  # warm up
+
+        start = time.perf_counter()
+        pdfs = pdf_batch.render_batch(receipts, 'bench', '01/01/2025 00:00', workers=workers)
+        merged = pdf_batch.merge_pdfs(pdfs)
+        elapsed = time.perf_counter() - start
+
+        print(f"{workers:>8} {elapsed:>8.2f} {args.receipts / elapsed:>8.1f} {len(merged) / 1e6:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
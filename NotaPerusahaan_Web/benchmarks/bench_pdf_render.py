@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: berapa nota per detik yang bisa dirender satu proses.
+
+Renders a CH nota (with logo) and a CR nota (without logo) repeatedly
+through receipt_pdf.generate_receipt_pdf and reports renders per second.
+
+    python benchmarks/bench_pdf_render.py --seconds 3
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+from receipt_pdf import generate_receipt_pdf
+
+
+def make_receipt(code, n_items):
+    receipt = {
+        'id': 1,
+        'receipt_number': f'{code}00001',
+        'company_code': code,
+        'company_name': Config.COMPANIES[code],
+        'date': '2025-02-09',
+        'recipient': 'Pelanggan Contoh',
+        'address': 'Jl. Contoh No. 1, Kelurahan Contoh, Kecamatan Contoh, Jakarta Barat',
+        'total_amount': 250000.0 * n_items
+    }
+    items = [{
+        'quantity': '2',
+        'item_type': 'Terpal A5',
+        'size': '4x6',
+        'color': 'Biru',
+        'unit_price': 125000.0,
+        'total_price': 250000.0
+    } for _ in range(n_items)]
+    return receipt, items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3.0, help='time budget per company')
+    parser.add_argument('--items', type=int, default=5)
+    args = parser.parse_args()
+
+    # Run from the app directory, like the server does
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+    for code in ('CH', 'CR'):
+        receipt, items = make_receipt(code, args.items)
+        generate_receipt_pdf(receipt, items, 'bench', '01/01/2025 00:00')  # warm up
+
+        renders = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.seconds:
+            generate_receipt_pdf(receipt, items, 'bench', '01/01/2025 00:00')
+            renders += 1
+        elapsed = time.perf_counter() - start
+        print(f"{code}: {renders / elapsed:.1f} renders/s ({elapsed / renders * 1000:.2f} ms each)")
+
+
+if __name__ == '__main__':
+    main()
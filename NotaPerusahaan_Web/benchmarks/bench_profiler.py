@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark: biaya profiler sampling terhadap throughput dan latensi request.
+
+Serves the real Flask app (threaded, SQLite backend, PDF and stats caches
+off) once per configuration and drives a mix of /api/receipts/<id>/pdf,
+/api/stats and /api/receipts with ``--clients`` concurrent clients for
+``--duration`` seconds. ``off`` runs without the profiler; the others
+switch it on with PROFILER_SAMPLE_RATE set to the given fraction. Reports
+throughput and latency next to ``off`` and the sampler's own time as read
+from /api/admin/profiler.
+
+    python benchmarks/bench_profiler.py --clients 8 --duration 15 --output profiler.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from bench_async import APP_SERVER, Client, start, stop, summarize
+from seed_data import seed_sqlite
+from urllib.parse import urlsplit
+
+TOKEN = 'bench-profiler'
+
+CONFIGS = {
+    # name -> PROFILER_SAMPLE_RATE; None = profiler off
+    'off': None,
+    'rate-0.05': 0.05,
+    'rate-1.0': 1.0,
+}
+
+
+def profiler_stats(url):
+    address = urlsplit(url)
+    connection = http.client.HTTPConnection(address.hostname, address.port, timeout=30)
+    try:
+        connection.request('GET', '/api/admin/profiler', headers={'Authorization': f'Bearer {TOKEN}'})
+        response = connection.getresponse()
+        return json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def run_config(db_path, receipts, rate, clients, duration, interval_ms, seed):
+    env = dict(os.environ, STORAGE_BACKEND='sqlite', SQLITE_PATH=db_path, ARCHIVE_DIR='',
+               WARM_UP_ON_START='true', PDF_CACHE_MAX_BYTES='0', PDF_CACHE_DIR='', STATS_CACHE_TTL='0',
+               WATERMARK_TTL='0', JOBS_DIR=os.path.join(os.path.dirname(db_path), 'jobs'),
+               PDF_RENDER_PER_USER=str(clients), METRICS_TOKEN=TOKEN,
+               PROFILER_ENABLED='true' if rate is not None else 'false',
+               PROFILER_SAMPLE_RATE=str(rate or 0), PROFILER_INTERVAL_MS=str(interval_ms))
+    server, url = start(APP_SERVER, [APP_DIR], env=env)
+
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    stop_at = time.perf_counter() + duration
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        client = Client(url)
+        try:
+            while time.perf_counter() < stop_at:
+                choice = rng.random()
+                if choice < 0.3:
+                    path = f'/api/receipts/{rng.randint(1, receipts)}/pdf'
+                elif choice < 0.6:
+                    path = '/api/stats'
+                else:
+                    path = f'/api/receipts?page={rng.randint(1, 20)}&limit=50'
+                start_time = time.perf_counter()
+                status = client.request('GET', path)
+                with lock:
+                    latencies.append(time.perf_counter() - start_time)
+                    errors[0] += status >= 400
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = profiler_stats(url)
+    finally:
+        stop(server)
+    wall_time = time.perf_counter() - started
+
+    result = summarize(latencies, errors[0], wall_time)
+    result['profiler'] = {name: value for name, value in stats.items() if name != 'routes'}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--receipts', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds per configuration')
+    parser.add_argument('--interval-ms', type=float, default=5.0)
+    parser.add_argument('--configs', default=','.join(CONFIGS))
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'nota.db')
+        seed_sqlite(db_path, args.receipts)
+
+        results = []
+        baseline = None
+        for name in args.configs.split(','):
+            result = run_config(db_path, args.receipts, CONFIGS[name], args.clients, args.duration,
+                                args.interval_ms, args.seed)
+            if baseline is None:
+                baseline = result
+            slowdown = (1 - result['throughput_rps'] / baseline['throughput_rps']) * 100
+            results.append(dict(result, config=name, throughput_loss_percent=round(slowdown, 2)))
+            profile = result['profiler']
+            print(f"{name:<10} {result['throughput_rps']:>7} rps ({-slowdown:+.1f}% vs {args.configs.split(',')[0]}) "
+                  f"p50/p95 {result['p50_ms']}/{result['p95_ms']} ms | samples {profile['samples']:>6} "
+                  f"sampler {profile['overhead_ratio'] * 100:.2f}% of wall, "
+                  f"{profile['sampled_overhead_ratio'] * 100:.2f}% of sampled request time")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(), 'cpus': os.cpu_count(),
+                'clients': args.clients, 'duration_s': args.duration, 'interval_ms': args.interval_ms,
+                'results': results
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
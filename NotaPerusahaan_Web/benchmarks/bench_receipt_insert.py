@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: simpan nota dengan 1, 10 dan 100 item.
+
+Compares the old one-insert-per-item loop with the bulk insert fallback and
+the create_receipt_with_items() RPC against a local PostgREST stand-in that
+adds a fixed round-trip latency to every request.
+
+    python benchmarks/bench_receipt_insert.py --latency 0.03 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import database
+import repository
+from fake_postgrest import FakePostgrest
+
+
+def make_receipt(n_items, seq):
+    receipt = {
+        'receipt_number': f'CH{seq:05d}',
+        'company_code': 'CH',
+        'company_name': 'PT. CHASTE GEMILANG MANDIRI',
+        'date': '2025-02-09',
+        'recipient': 'Test Customer',
+        'address': 'Jl. Contoh No. 1',
+        'total_amount': 100000 * n_items,
+        'created_at': datetime.now().isoformat()
+    }
+    items = [{
+        'quantity': '1',
+        'item_type': 'Terpal A5',
+        'size': '4x6',
+        'color': 'Biru',
+        'unit_price': 100000,
+        'total_price': 100000,
+        'created_at': datetime.now().isoformat()
+    } for _ in range(n_items)]
+    return receipt, items
+
+
+def insert_per_item(db, receipt, items):
+    """The original receipts_api loop: one request per item"""
+    receipt_id = db.table('receipts').insert(receipt).execute().data[0]['id']
+    for item in items:
+        db.table('items').insert(dict(item, receipt_id=receipt_id)).execute()
+    return receipt_id
+
+
+def insert_bulk(db, receipt, items):
+    repository._receipt_rpc_available = False
+    return repository.create_receipt(db, receipt, items)
+
+
+def insert_rpc(db, receipt, items):
+    repository._receipt_rpc_available = True
+    return repository.create_receipt(db, receipt, items)
+
+
+STRATEGIES = [('per-item', insert_per_item), ('bulk', insert_bulk), ('rpc', insert_rpc)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.03, help='simulated round trip in seconds')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--items', default='1,10,100')
+    args = parser.parse_args()
+
+    server = FakePostgrest(latency=args.latency).start()
+    database.init_pool({'SUPABASE_URL': server.url, 'SUPABASE_KEY': 'benchmark-key'})
+    db = database.get_client()
+
+    print(f"Simulated round trip: {args.latency * 1000:.0f} ms, {args.repeat} runs each")
+    print(f"{'items':>6} {'strategy':>10} {'requests':>9} {'median ms':>10}")
+
+    seq = 0
+    for n_items in [int(n) for n in args.items.split(',')]:
+        for name, insert in STRATEGIES:
+            timings = []
+            requests_before = server.requests
+            for _ in range(args.repeat):
+                seq += 1
+                receipt, items = make_receipt(n_items, seq)
+                start = time.perf_counter()
+                insert(db, receipt, items)
+                timings.append((time.perf_counter() - start) * 1000)
+            per_call = (server.requests - requests_before) // args.repeat
+            print(f"{n_items:>6} {name:>10} {per_call:>9} {statistics.median(timings):>10.1f}")
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
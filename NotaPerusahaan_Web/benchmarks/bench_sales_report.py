@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: laporan penjualan setahun dari rollup harian vs scan seluruh nota.
+
+Seeds a local SQLite database with a year of receipts (seed_data.py; the
+rollup triggers fill sales_daily while seeding) and times the
+/api/reports/sales query per period from the rollups against the same
+report computed straight from the receipts and items tables, plus a full
+vectorized rebuild of the rollups (sales_report.rebuild_rollups).
+
+    python benchmarks/bench_sales_report.py --receipts 100000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import sales_report
+from seed_data import seed_sqlite
+from sqlite_storage import SQLiteStorage, SALES_PERIOD_START
+
+
+def raw_report(store, period, top_items=5):
+    """The report without rollups: grouped straight from receipts and items"""
+    start = SALES_PERIOD_START[period].replace('day', 'r.date')
+    rows = store._query(
+        f"SELECT r.company_code, {start} AS period_start, COUNT(*) AS receipts_count, "
+        f"SUM(i.items_count) AS items_count, SUM(r.total_amount) AS total_amount FROM receipts r "
+        f"LEFT JOIN (SELECT receipt_id, COUNT(*) AS items_count FROM items GROUP BY receipt_id) i "
+        f"ON i.receipt_id = r.id GROUP BY 1, 2 ORDER BY 1, 2"
+    )
+    top = store._query(
+        f"SELECT * FROM ("
+        f"  SELECT r.company_code, {start} AS period_start, i.item_type, COUNT(*) AS items_count, "
+        f"  SUM(i.total_price) AS total_amount, ROW_NUMBER() OVER ("
+        f"    PARTITION BY r.company_code, {start} ORDER BY SUM(i.total_price) DESC, i.item_type) AS rank "
+        f"  FROM items i JOIN receipts r ON r.id = i.receipt_id GROUP BY 1, 2, 3"
+        f") WHERE rank <= ?", (top_items,)
+    )
+    return rows, top
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--receipts', type=int, default=100000)
+    parser.add_argument('--items', type=int, default=3, help='items per receipt')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--path', default=None, help='SQLite file (default: a temporary file)')
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(), 'sales.db')
+    start = time.perf_counter()
+    items = seed_sqlite(path, args.receipts, args.items)
+    print(f"Seeded {args.receipts} receipts, {items} items in {time.perf_counter() - start:.1f}s")
+
+    store = SQLiteStorage(path)
+    print(f"{'period':>7} {'rollup ms':>10} {'raw scan ms':>12} {'speed-up':>9}")
+    for period in sales_report.PERIODS:
+        rollup = timed(lambda: store.sales_report(period), args.repeat)
+        raw = timed(lambda: raw_report(store, period), args.repeat)
+        print(f"{period:>7} {rollup:>10.1f} {raw:>12.1f} {raw / rollup:>8.0f}x")
+
+    result = sales_report.rebuild_rollups(store)
+    print(f"\nRebuild: {result['receipts']} receipts, {result['items']} items -> "
+          f"{result['days']} company days, {result['item_rows']} item rows in {result['seconds'] * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
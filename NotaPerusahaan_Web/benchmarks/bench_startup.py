@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark: waktu start dan memori tiap entry point (cold start).
+
+Imports every entry point in a fresh interpreter, the way a Vercel/Fly cold
+start or a new gunicorn worker does, and reports the median import time,
+the resident memory afterwards, the time of the first page view (GET
+/login) and which heavy libraries got loaded along the way.
+
+Runs with WARM_UP_ON_START=false, the serverless setting, unless --warm is
+given. Exits with status 1 when an entry point goes over its budget or
+imports one of HEAVY_MODULES before the PDF/export/Supabase paths need it,
+so CI can run it as a check:
+
+    python benchmarks/bench_startup.py --runs 5 --output startup_results.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+
+# name -> (file, path of the first page view)
+ENTRY_POINTS = {
+    'app': ('app.py', '/login'),
+    'wsgi': ('wsgi.py', '/login'),
+    'index': ('index.py', '/login'),
+    'api/index': (os.path.join('api', 'index.py'), '/'),
+}
+
+# Only the PDF, export, archive and Supabase code paths need these
+HEAVY_MODULES = ('reportlab', 'openpyxl', 'pandas', 'pyarrow', 'numpy', 'supabase', 'httpx')
+
+# Per entry point, serverless mode; generous enough for a shared 1-vCPU VM
+BUDGET_IMPORT_MS = 1000
+BUDGET_RSS_MB = 64
+
+# Runs inside the child interpreter; prints one JSON line
+CHILD = r'''
+import importlib.util, json, os, sys, time
+
+path, first_page, heavy = sys.argv[1], sys.argv[2], sys.argv[3].split(',')
+
+def rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def loaded():
+    return sorted(m for m in heavy if m in sys.modules)
+
+baseline_mb = rss_mb()
+sys.path.insert(0, os.path.dirname(path))
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('entry_point', path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+import_ms = (time.perf_counter() - start) * 1000
+import_mb = rss_mb()
+heavy_after_import = loaded()
+
+start = time.perf_counter()
+response = module.app.test_client().get(first_page)
+first_request_ms = (time.perf_counter() - start) * 1000
+
+print(json.dumps({
+    'import_ms': import_ms,
+    'rss_mb': import_mb,
+    'rss_delta_mb': import_mb - baseline_mb,
+    'heavy_after_import': heavy_after_import,
+    'first_request_ms': first_request_ms,
+    'first_request_status': response.status_code,
+    'rss_after_request_mb': rss_mb(),
+    'heavy_after_request': loaded(),
+}))
+'''
+
+
+def measure(entry, runs, env):
+    """Median numbers over ``runs`` fresh interpreters"""
+    path, first_page = ENTRY_POINTS[entry]
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', CHILD, os.path.join(APP_DIR, path), first_page, ','.join(HEAVY_MODULES)],
+            cwd=APP_DIR, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f'{entry} failed to start:\n{result.stderr}')
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    summary = {'entry_point': entry, 'runs': runs}
+    for key in ('import_ms', 'rss_mb', 'rss_delta_mb', 'first_request_ms', 'rss_after_request_mb'):
+        summary[key] = round(statistics.median(s[key] for s in samples), 1)
+    last = samples[-1]
+    summary['first_request_status'] = last['first_request_status']
+    summary['heavy_after_import'] = last['heavy_after_import']
+    summary['heavy_after_request'] = last['heavy_after_request']
+    return summary
+
+
+def violations(summary, budget_ms, budget_mb):
+    problems = []
+    if summary['import_ms'] > budget_ms:
+        problems.append(f"import {summary['import_ms']}ms > {budget_ms}ms")
+    if summary['rss_mb'] > budget_mb:
+        problems.append(f"RSS {summary['rss_mb']}MB > {budget_mb}MB")
+    if summary['heavy_after_import']:
+        problems.append(f"imports {', '.join(summary['heavy_after_import'])} at start-up")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entry-points', default=','.join(ENTRY_POINTS))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--warm', action='store_true', help='measure with WARM_UP_ON_START=true (no budget)')
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_IMPORT_MS)
+    parser.add_argument('--budget-mb', type=float, default=BUDGET_RSS_MB)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    entries = [e.strip() for e in args.entry_points.split(',') if e.strip()]
+    unknown = set(entries) - set(ENTRY_POINTS)
+    if unknown:
+        parser.error(f"unknown entry point(s): {', '.join(sorted(unknown))}")
+
+    env = dict(os.environ, WARM_UP_ON_START='true' if args.warm else 'false')
+    # Supabase configured but unreachable: start-up must not touch it
+    env.setdefault('SUPABASE_URL', 'http://127.0.0.1:9')
+    env.setdefault('SUPABASE_KEY', 'startup-benchmark')
+
+    print(f"{'entry point':>12} {'import ms':>10} {'RSS MB':>8} {'1st req ms':>11} heavy at import / after 1st request")
+    results, failed = [], False
+    for entry in entries:
+        summary = measure(entry, args.runs, env)
+        summary['violations'] = [] if args.warm else violations(summary, args.budget_ms, args.budget_mb)
+        failed = failed or bool(summary['violations'])
+        results.append(summary)
+        print(f"{entry:>12} {summary['import_ms']:>10} {summary['rss_mb']:>8} "
+              f"{summary['first_request_ms']:>11} "
+              f"{','.join(summary['heavy_after_import']) or '-'} / {','.join(summary['heavy_after_request']) or '-'}")
+        for problem in summary['violations']:
+            print(f"{'':>12} OVER BUDGET: {problem}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'warm_up_on_start': args.warm,
+                'budget_import_ms': args.budget_ms,
+                'budget_rss_mb': args.budget_mb,
+                'python': sys.version.split()[0],
+                'results': results,
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Minimal in-memory PostgREST stand-in for benchmarks.
+
+Only understands what the benchmarks need: inserts into ``receipts`` and
+``items``, deletes, the ``create_receipt_with_items`` RPC, and simple reads
+(``eq/gt/gte/lt/lte/in`` filters, ``order`` on one column, ``limit``,
+``items(*)`` embedding and ``count=exact`` counts). Other RPCs answer as not
+installed (PGRST202), so the app uses its fallback queries. Every request
+sleeps for ``latency`` seconds to model the round trip to Supabase.
+"""
+import itertools
+import json
+import operator
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+OPERATORS = {'eq': operator.eq, 'gt': operator.gt, 'gte': operator.ge, 'lt': operator.lt, 'lte': operator.le}
+RPC_NOT_FOUND = {'code': 'PGRST202', 'message': 'Could not find the function', 'details': None, 'hint': None}
+
+
+class FakePostgrest:
+    def __init__(self, latency=0.03):
+        self.latency = latency
+        self.requests = 0
+        self.tables = {'receipts': [], 'items': [], 'users': []}
+        self._ids = {table: itertools.count(1) for table in self.tables}
+        self._by_id = {table: {} for table in self.tables}
+        self._items_by_receipt = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def _insert(self, table, rows):
+        with self._lock:
+            for row in rows:
+                row['id'] = next(self._ids[table])
+                self.tables[table].append(row)
+                self._by_id[table][row['id']] = row
+                if table == 'items':
+                    self._items_by_receipt.setdefault(row['receipt_id'], []).append(row)
+        return rows
+
+    def seed(self, receipts, items_per_receipt=3, users=()):
+        """Add ``receipts`` generated receipts with their items, and the given user rows"""
+        companies = (('CH', 'PT. CHASTE GEMILANG MANDIRI'), ('CR', 'PT CREATIVE GLOBAL MULIA'), ('CP', 'CV. COMPAGRE'))
+        for n in range(1, receipts + 1):
+            code, name = companies[n % len(companies)]
+            receipt = self._insert('receipts', [{
+                'receipt_number': f'{code}{n:05d}', 'company_code': code, 'company_name': name,
+                'date': f'2025-{n % 12 + 1:02d}-{n % 28 + 1:02d}', 'recipient': f'Pelanggan {n % 500}',
+                'address': 'Jl. Contoh No. 1', 'total_amount': 150000 * items_per_receipt,
+                'created_at': f'2025-01-01T00:00:{n % 60:02d}',
+            }])[0]
+            self._insert('items', [{
+                'receipt_id': receipt['id'], 'quantity': '1', 'item_type': 'Terpal A5', 'size': '4x6',
+                'color': 'Biru', 'unit_price': 150000, 'total_price': 150000,
+            } for _ in range(items_per_receipt)])
+        self._insert('users', [dict(user) for user in users])
+        return self
+
+    @staticmethod
+    def _predicate(column, condition):
+        """``row -> bool`` for one ``column=op.value`` filter"""
+        op, _, arg = condition.partition('.')
+        if op == 'in':
+            options = set(arg.strip('()').split(','))
+            return lambda row: str(row.get(column)) in options
+        if op not in OPERATORS:
+            raise ValueError(f'Unsupported filter: {column}={condition}')
+        compare = OPERATORS[op]
+        try:
+            number = float(arg)
+        except ValueError:
+            number = None
+
+        def check(row):
+            value = row.get(column)
+            if value is None:
+                return False
+            return compare(value, arg if isinstance(value, str) else number)
+        return check
+
+    def _select(self, table, params):
+        filters = [(k, v) for k, v in params if k not in ('select', 'order', 'limit', 'offset') and '.' not in k]
+        with self._lock:
+            rows = self.tables.get(table, [])
+            # id=eq./id=in. look up by id instead of scanning
+            for column, condition in filters:
+                op, _, arg = condition.partition('.')
+                if column == 'id' and op in ('eq', 'in'):
+                    by_id = self._by_id[table]
+                    rows = [by_id[int(i)] for i in arg.strip('()').split(',') if int(i) in by_id]
+                    break
+            for column, condition in filters:
+                check = self._predicate(column, condition)
+                rows = [row for row in rows if check(row)]
+        options = dict(params)
+        if options.get('order'):
+            column, _, direction = options['order'].split(',')[0].partition('.')
+            rows.sort(key=lambda row: row.get(column), reverse=direction.startswith('desc'))
+        total = len(rows)
+        start = int(options.get('offset', 0))
+        rows = rows[start:start + int(options['limit'])] if 'limit' in options else rows[start:]
+        if table == 'receipts' and 'items(' in options.get('select', ''):
+            rows = [dict(row, items=list(self._items_by_receipt.get(row['id'], []))) for row in rows]
+        return rows, total
+
+    def handle(self, method, path, body, headers=None):
+        """``(status, payload, extra_headers)`` for one request"""
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+
+        url = urlsplit(path)
+        name = url.path.rsplit('/', 1)[-1]
+        if method == 'POST' and '/rpc/' in url.path:
+            if name != 'create_receipt_with_items':
+                return 404, RPC_NOT_FOUND, {}
+            receipt = self._insert('receipts', [body['p_receipt']])[0]
+            self._insert('items', [dict(item, receipt_id=receipt['id']) for item in body['p_items']])
+            return 200, receipt['id'], {}
+        if method == 'POST' and name in self.tables:
+            rows = body if isinstance(body, list) else [body]
+            return 201, self._insert(name, rows), {}
+        if method in ('GET', 'HEAD') and name in self.tables:
+            rows, total = self._select(name, parse_qsl(url.query))
+            extra = {}
+            if 'count=exact' in (headers or {}).get('Prefer', ''):
+                extra['Content-Range'] = f'0-{max(len(rows) - 1, 0)}/{total}'
+            return 200, rows if method == 'GET' else None, extra
+        return 200, [], {}
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, result, extra = fake.handle(self.command, self.path, body, self.headers)
+                payload = json.dumps(result).encode() if result is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for header, value in extra.items():
+                    self.send_header(header, value)
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(payload)
+
+            do_GET = do_HEAD = do_POST = do_DELETE = do_PATCH = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
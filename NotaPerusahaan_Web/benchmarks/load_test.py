@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Load test: semua endpoint API terhadap database lokal berisi 1k/10k/100k nota.
+
+Seeds a SQLite stand-in database (benchmarks/seed_data.py) for every
+volume, serves the real Flask app from a threaded HTTP server and drives
+each endpoint from ``--concurrency`` logged-in clients, each its own user
+(the PDF render queue limits renders per user). A 503 from the render
+queue is retried after its Retry-After, like history.js does: it is
+counted under ``rejected_503``, not as an error, and the latency runs
+until the final answer. Reports throughput and p50/p95/p99 latency per
+endpoint and writes everything as JSON, so runs from different commits can
+be compared.
+
+/api/export queues a background job that deletes what it exports, so
+exports run one at a time: each is timed from the POST until its job has
+finished and the workbook is downloaded, and the database is restored from
+the seeded snapshot before the next one (restore time is not counted).
+
+    python benchmarks/load_test.py --receipts 1000,10000,100000 --concurrency 8 \\
+        --output bench_results.json
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, APP_DIR)
+
+# The app reads its storage settings at import time
+os.environ['STORAGE_BACKEND'] = 'sqlite'
+os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'nota_bench.db'))
+# Exports delete their rows instead of archiving them, so a restore brings
+# every receipt back exactly once
+os.environ['ARCHIVE_DIR'] = ''
+os.environ.setdefault('JOBS_DIR', os.path.join(tempfile.gettempdir(), 'nota_bench_jobs'))
+
+import httpx
+from werkzeug.serving import make_server
+
+import app as nota_app
+from seed_data import seed_sqlite
+from sqlite_storage import SQLiteStorage
+from storage import init_storage
+
+ENDPOINTS = ('receipts', 'receipts_search', 'search', 'receipt', 'receipt_pdf', 'stats', 'export')
+
+# Seeded by setup_users_table.sql
+USERNAME = 'admin'
+PASSWORD = 'admin'
+
+# One user per client, added to the seeded database
+CLIENT_USER = 'bench{}'
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, errors, wall_time, response_bytes, rejected=0):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'rejected_503': rejected,
+        'throughput_rps': round(count / wall_time, 2) if wall_time else None,
+        'mean_ms': round(sum(latencies) / count * 1000, 3) if count else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if count else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3) if count else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if count else None,
+        'max_ms': round(latencies[-1] * 1000, 3) if count else None,
+        'mean_response_bytes': round(response_bytes / count) if count else None,
+    }
+
+
+class Server:
+    """The Flask app on a random local port, one thread per request"""
+
+    def __init__(self):
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request access log
+        self.httpd = make_server('127.0.0.1', 0, nota_app.app, threaded=True)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+
+
+def login(url, username=USERNAME):
+    client = httpx.Client(base_url=url, timeout=120)
+    response = client.post('/login', json={'username': username, 'password': PASSWORD})
+    response.raise_for_status()
+    return client
+
+
+def add_users(db_path, count):
+    """A user per client, with the admin password"""
+    store = SQLiteStorage(db_path)
+    for n in range(count):
+        username = CLIENT_USER.format(n)
+        store.create_user({
+            'full_name': username, 'username': username, 'email': f'{username}@example.com',
+            'password': hashlib.sha256(PASSWORD.encode()).hexdigest(),
+            'created_at': datetime.now().isoformat()
+        })
+
+
+def make_request(endpoint, receipt_ids, rng):
+    """(method, path, params) for one request against ``endpoint``"""
+    if endpoint == 'receipts':
+        return 'GET', '/api/receipts', {'limit': 50}
+    if endpoint == 'receipts_search':
+        return 'GET', '/api/receipts', {'limit': 50, 'q': rng.choice(('Budi', 'Siti', 'CH000', 'Joko 1'))}
+    if endpoint == 'search':
+        return 'GET', '/api/search', {'limit': 20, 'q': rng.choice(('Budi', 'kaos hitam', 'CH000', 'Joko 1'))}
+    if endpoint == 'receipt':
+        return 'GET', f'/api/receipts/{rng.choice(receipt_ids)}', None
+    if endpoint == 'receipt_pdf':
+        return 'GET', f'/api/receipts/{rng.choice(receipt_ids)}/pdf', None
+    if endpoint == 'stats':
+        return 'GET', '/api/stats', None
+    if endpoint == 'export':
+        return 'POST', '/api/export', None
+    raise ValueError(f'Unknown endpoint: {endpoint}')
+
+
+def run_endpoint(url, endpoint, receipt_ids, requests_count, concurrency, seed):
+    """Send ``requests_count`` requests from ``concurrency`` clients; returns the summary"""
+    lock = threading.Lock()
+    latencies, state = [], {'errors': 0, 'rejected': 0, 'bytes': 0, 'next': 0}
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        client = login(url, CLIENT_USER.format(worker_id))
+        try:
+            while True:
+                with lock:
+                    if state['next'] >= requests_count:
+                        return
+                    state['next'] += 1
+                method, path, params = make_request(endpoint, receipt_ids, rng)
+                start = time.perf_counter()
+                rejected = 0
+                try:
+                    response = client.request(method, path, params=params)
+                    # Render queue full: wait as long as the server asks, then retry
+                    while response.status_code == 503 and response.headers.get('Retry-After'):
+                        rejected += 1
+                        time.sleep(float(response.headers['Retry-After']))
+                        response = client.request(method, path, params=params)
+                    body = response.content
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    body, ok = b'', False
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    state['bytes'] += len(body)
+                    state['rejected'] += rejected
+                    if not ok:
+                        state['errors'] += 1
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    wall_time = time.perf_counter() - start
+    return summarize(latencies, state['errors'], wall_time, state['bytes'], state['rejected'])
+
+
+def wait_for_job(client, job_id, poll_interval=0.05):
+    """Poll /api/jobs/<id> until the job has finished; returns the job"""
+    while True:
+        job = client.get(f'/api/jobs/{job_id}').raise_for_status().json()
+        if job['status'] in ('succeeded', 'failed', 'cancelled'):
+            return job
+        time.sleep(poll_interval)
+
+
+def run_export(url, db_path, snapshot_path, runs):
+    """Exports one at a time, restoring the seeded data before each"""
+    client = login(url)
+    latencies, errors, total_bytes = [], 0, 0
+    wall_time = 0.0
+    try:
+        for _ in range(runs):
+            restore(snapshot_path, db_path)
+            start = time.perf_counter()
+            body, ok = b'', False
+            try:
+                response = client.post('/api/export')
+                if response.status_code == 202:
+                    job = wait_for_job(client, response.json()['id'])
+                    if job['status'] == 'succeeded':
+                        response = client.get(f"/api/jobs/{job['id']}/download")
+                        body, ok = response.content, response.status_code < 400
+                        if ok:
+                            # Saved; without an archive this is what resets the rows
+                            ok = client.post(f"/api/jobs/{job['id']}/confirm").status_code < 400
+                    else:
+                        print(f"export job {job['id']} {job['status']}: {job.get('error')}")
+            except httpx.HTTPError:
+                pass
+            elapsed = time.perf_counter() - start
+            wall_time += elapsed
+            latencies.append(elapsed)
+            total_bytes += len(body)
+            if not ok:
+                errors += 1
+    finally:
+        client.close()
+    return summarize(latencies, errors, wall_time, total_bytes)
+
+
+def restore(snapshot_path, db_path):
+    source = sqlite3.connect(snapshot_path)
+    target = sqlite3.connect(db_path, timeout=60)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    nota_app.data_changed()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--receipts', default='1000,10000,100000', help='comma separated volumes')
+    parser.add_argument('--items', type=int, default=3, help='items per receipt')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--export-runs', type=int, default=3)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--db-dir', default=tempfile.gettempdir())
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    # The PDF renderer loads the logo relative to the app directory
+    output = os.path.abspath(args.output)
+    os.chdir(APP_DIR)
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoint(s): {', '.join(sorted(unknown))}")
+
+    server = Server().start()
+    results = []
+    try:
+        for volume in [int(v) for v in args.receipts.split(',')]:
+            db_path = os.path.join(args.db_dir, f'nota_bench_{volume}.db')
+            snapshot_path = db_path + '.seed'
+
+            start = time.perf_counter()
+            seed_sqlite(snapshot_path, volume, args.items, seed=args.seed)
+            add_users(snapshot_path, args.concurrency)
+            seed_seconds = time.perf_counter() - start
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            restore(snapshot_path, db_path)
+
+            init_storage({'STORAGE_BACKEND': 'sqlite', 'SQLITE_PATH': db_path})
+            nota_app.data_changed()
+            receipt_ids = list(range(1, volume + 1))
+            print(f"\n{volume} receipts ({volume * args.items} items), seeded in {seed_seconds:.1f}s")
+            print(f"{'endpoint':>16} {'req':>5} {'err':>4} {'503':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+
+            for endpoint in endpoints:
+                if endpoint == 'export':
+                    summary = run_export(server.url, db_path, snapshot_path, args.export_runs)
+                    concurrency = 1
+                else:
+                    summary = run_endpoint(
+                        server.url, endpoint, receipt_ids, args.requests, args.concurrency, args.seed
+                    )
+                    concurrency = args.concurrency
+                results.append(dict(summary, receipts=volume, endpoint=endpoint, concurrency=concurrency))
+                print(f"{endpoint:>16} {summary['requests']:>5} {summary['errors']:>4} {summary['rejected_503']:>5} "
+                      f"{summary['throughput_rps']:>8} {summary['p50_ms']:>8} "
+                      f"{summary['p95_ms']:>8} {summary['p99_ms']:>8}")
+
+            for path in (snapshot_path, db_path, db_path + '-wal', db_path + '-shm'):
+                if os.path.exists(path):
+                    os.remove(path)
+    finally:
+        server.stop()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'items_per_receipt': args.items,
+            'requests_per_endpoint': args.requests,
+            'concurrency': args.concurrency,
+            'export_runs': args.export_runs,
+        },
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Data uji: isi database SQLite lokal dengan nota dan item palsu.
+
+Used by the load and startup benchmarks as a stand-in for Supabase. The
+schema comes from sqlite_storage (i.e. the setup_*.sql scripts), so the
+seeded file has the same tables and indexes the app uses.
+
+    python benchmarks/seed_data.py /tmp/nota_10k.db --receipts 10000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+from sqlite_storage import SQLiteStorage
+
+ITEM_TYPES = ('Terpal A5', 'Terpal A8', 'Terpal A12', 'Kaos Polos', 'Jaket', 'Karung')
+SIZES = ('2x3', '3x4', '4x6', '6x8', 'M', 'L', 'XL')
+COLORS = ('Biru', 'Oranye', 'Hitam', 'Putih', 'Silver')
+NAMES = ('Budi', 'Siti', 'Agus', 'Dewi', 'Rudi', 'Wati', 'Joko', 'Rina', 'Hendra', 'Lina')
+
+
+def seed_sqlite(path, receipts, items_per_receipt=3, seed=42, batch_size=5000):
+    """Create (or replace) a SQLite database at ``path`` with ``receipts`` nota.
+
+    Returns the number of items written.
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    SQLiteStorage(path)  # builds the schema
+
+    rng = random.Random(seed)
+    codes = list(Config.COMPANIES)
+    counters = dict.fromkeys(codes, 0)
+    start = datetime(2024, 1, 1)
+    step = timedelta(days=365) / max(receipts, 1)
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA synchronous=OFF')
+    items_count = 0
+    receipt_rows, item_rows = [], []
+
+    def flush():
+        conn.executemany(
+            'INSERT INTO receipts (id, receipt_number, company_code, company_name, date, recipient, '
+            'address, total_amount, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', receipt_rows
+        )
+        conn.executemany(
+            'INSERT INTO items (receipt_id, quantity, item_type, size, color, unit_price, '
+            'total_price, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', item_rows
+        )
+        receipt_rows.clear()
+        item_rows.clear()
+
+    for receipt_id in range(1, receipts + 1):
+        code = codes[receipt_id % len(codes)]
+        counters[code] += 1
+        created = start + step * receipt_id
+        created_at = created.isoformat()
+        total = 0.0
+        for _ in range(items_per_receipt):
+            quantity = rng.randint(1, 20)
+            unit_price = rng.choice((15000.0, 25000.0, 125000.0, 250000.0))
+            total += quantity * unit_price
+            item_rows.append((
+                receipt_id, str(quantity), rng.choice(ITEM_TYPES), rng.choice(SIZES),
+                rng.choice(COLORS), unit_price, quantity * unit_price, created_at
+            ))
+        receipt_rows.append((
+            receipt_id, f'{code}{counters[code]:05d}', code, Config.COMPANIES[code],
+            created.date().isoformat(), f'{rng.choice(NAMES)} {rng.randint(1, receipts)}',
+            f'Jl. Contoh No. {rng.randint(1, 200)}, Jakarta', total, created_at
+        ))
+        items_count += items_per_receipt
+        if len(receipt_rows) >= batch_size:
+            flush()
+
+    flush()
+    conn.executemany(
+        'INSERT INTO receipt_counters (company_code, last_value) VALUES (?, ?)', counters.items()
+    )
+    conn.commit()
+    conn.close()
+    return items_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--receipts', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=3, help='items per receipt')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    items = seed_sqlite(args.path, args.receipts, args.items)
+    print(f"{args.receipts} receipts, {items} items in {time.perf_counter() - start:.1f}s -> {args.path}")
+
+
+if __name__ == '__main__':
+    main()
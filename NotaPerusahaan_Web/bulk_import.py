@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""Bulk import of receipts and their items from Excel or CSV files.
+
+Two layouts are understood:
+
+* the workbook written by /api/export: a ``Receipts`` sheet and an
+  ``Items`` sheet whose ``receipt_id`` refers to the ``id`` column of
+  ``Receipts`` (or the two sheets saved as two CSV files);
+* one sheet or CSV with a row per item that also carries its nota's
+  columns, as in the old spreadsheets. The rows of one nota must be
+  next to each other. Headers may be the nota's own labels
+  (Nota, Tanggal, Kepada Yth, Jenis Barang, Harga Satuan, ...).
+
+Rows stream from the file (openpyxl read-only mode, the csv module) and are
+validated ``chunk_size`` at a time with pandas. Valid receipts are written
+in batches, with their items, by ``Storage.import_receipts``, where the
+items get the new receipt ids. Receipt numbers that already exist, live
+or in the archive, are skipped, so an interrupted import (or the import of
+an export whose rows have since been archived) can simply be run again. In the export
+layout, items may belong to any receipt in the file, so the Items sheet is
+read into one DataFrame before the receipts stream.
+
+    python bulk_import.py nota_export_20250101_120000.xlsx
+    python bulk_import.py receipts.csv --items items.csv
+"""
+import argparse
+import csv
+import os
+import re
+import time
+
+from repository import QueryError
+
+# Headers of the old spreadsheets and the nota layout -> column names
+COLUMN_ALIASES = {
+    'nota': 'receipt_number', 'no_nota': 'receipt_number', 'nomor_nota': 'receipt_number',
+    'perusahaan': 'company_code', 'kode_perusahaan': 'company_code', 'nama_perusahaan': 'company_name',
+    'tanggal': 'date',
+    'kepada': 'recipient', 'kepada_yth': 'recipient', 'penerima': 'recipient',
+    'alamat': 'address',
+    'jenis_barang': 'item_type', 'nama_barang': 'item_type', 'barang': 'item_type',
+    'ukuran': 'size',
+    'warna': 'color',
+    'qty': 'quantity', 'jumlah': 'quantity', 'banyaknya': 'quantity',
+    'harga': 'unit_price', 'harga_satuan': 'unit_price',
+    'total': 'total_price', 'total_harga': 'total_price',
+    'total_nota': 'total_amount',
+}
+
+RECEIPT_COLUMNS = ('receipt_number', 'company_code', 'company_name', 'date', 'recipient', 'address',
+                   'total_amount', 'created_at')
+ITEM_COLUMNS = ('quantity', 'item_type', 'size', 'color', 'unit_price', 'total_price', 'created_at')
+
+# Column sizes from setup_database.sql
+MAX_LENGTHS = {
+    'receipt_number': 20, 'company_name': 100, 'recipient': 100,
+    'quantity': 50, 'item_type': 100, 'size': 50, 'color': 50,
+}
+
+WORKBOOK_SUFFIXES = ('.xlsx', '.xlsm')
+CSV_SUFFIXES = ('.csv', '.txt')
+
+# Rejected rows listed in the result; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+def normalize_column(name):
+    key = re.sub(r'[^0-9a-z]+', '_', str(name if name is not None else '').strip().casefold()).strip('_')
+    return COLUMN_ALIASES.get(key, key)
+
+
+# Reading
+
+def _csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def _sheet_rows(sheet):
+    for row in sheet.iter_rows(values_only=True):
+        yield row
+
+
+def _frames(rows, chunk_size):
+    """DataFrames of up to ``chunk_size`` rows with normalized columns and ``_row`` (1-based, header = 1)"""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [normalize_column(name) for name in header]
+    # Unnamed and repeated columns are ignored
+    keep = ['_row'] + [c for i, c in enumerate(columns) if c and c not in columns[:i]]
+    line, chunk = 1, []
+    for row in rows:
+        line += 1
+        if not any(value not in (None, '') for value in row):
+            continue  # blank row
+        chunk.append((line,) + tuple(row[:len(columns)]) + (None,) * (len(columns) - len(row)))
+        if len(chunk) >= chunk_size:
+            yield _frame(chunk, columns, keep)
+            chunk = []
+    if chunk:
+        yield _frame(chunk, columns, keep)
+
+
+def _frame(chunk, columns, keep):
+    import pandas as pd
+
+    df = pd.DataFrame.from_records(chunk, columns=range(len(columns) + 1))
+    df.columns = ['_row'] + columns
+    return df.loc[:, ~df.columns.duplicated()][keep]
+
+
+class _Source:
+    """Row streams of the uploaded file(s): ``receipts`` and, for the export layout, ``items``"""
+
+    def __init__(self, path, items_path=None):
+        self.workbook = None
+        self.items = None
+        if path.lower().endswith(WORKBOOK_SUFFIXES):
+            from openpyxl import load_workbook
+            self.workbook = load_workbook(path, read_only=True, data_only=True)
+            names = {name.casefold(): name for name in self.workbook.sheetnames}
+            if 'receipts' in names and 'items' in names:
+                self.receipts = _sheet_rows(self.workbook[names['receipts']])
+                self.items = _sheet_rows(self.workbook[names['items']])
+            else:
+                self.receipts = _sheet_rows(self.workbook.worksheets[0])
+        elif path.lower().endswith(CSV_SUFFIXES):
+            self.receipts = _csv_rows(path)
+        else:
+            raise QueryError('Import an .xlsx or .csv file')
+        if items_path:
+            if self.items is not None:
+                raise QueryError('The workbook already has an Items sheet')
+            self.items = _csv_rows(items_path)
+
+    def close(self):
+        if self.workbook is not None:
+            self.workbook.close()
+
+
+# Validation
+
+def _text(df, column):
+    import pandas as pd
+
+    if column not in df:
+        return pd.Series('', index=df.index, dtype=object)
+    values = df[column]
+    return values.astype(str).str.strip().where(values.notna(), '')
+
+
+def _number(df, column):
+    import pandas as pd
+
+    if column not in df:
+        return pd.Series(float('nan'), index=df.index)
+    return pd.to_numeric(df[column], errors='coerce')
+
+
+def _dates(values):
+    """``values`` parsed as dates (ISO first, then day-first formats); NaT where unparseable"""
+    import pandas as pd
+
+    parsed = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    rest = parsed.isna() & values.notna() & (values.astype(str).str.strip() != '')
+    if rest.any():
+        parsed[rest] = pd.to_datetime(values[rest], errors='coerce', format='mixed', dayfirst=True)
+    return parsed
+
+
+def _first_problem(checks, index):
+    """Per row, the message of the first failed check (None when all pass)"""
+    import pandas as pd
+
+    problem = pd.Series(None, index=index, dtype=object)
+    for failed, message in checks:
+        problem = problem.mask(failed & problem.isna(), message)
+    return problem
+
+
+def _too_long(text, column):
+    return text.str.len() > MAX_LENGTHS[column], f'{column} longer than {MAX_LENGTHS[column]} characters'
+
+
+def validate_receipts(df, companies):
+    """``(receipts, problems)``: cleaned receipt columns and the first problem of each row (None = valid)"""
+    import pandas as pd
+
+    by_name = {name.casefold(): code for code, name in companies.items()}
+    code = _text(df, 'company_code')
+    code = code.str.upper().where(code.str.upper().isin(list(companies)), code.str.casefold().map(by_name))
+    name = _text(df, 'company_name')
+    day = _dates(df['date']) if 'date' in df else pd.Series(pd.NaT, index=df.index)
+    created = _text(df, 'created_at')
+    created_ok = created.ne('') & pd.to_datetime(created.where(created.ne('')), errors='coerce',
+                                                 format='ISO8601', utc=True).notna()
+
+    receipts = pd.DataFrame({
+        'receipt_number': _text(df, 'receipt_number'),
+        'company_code': code,
+        'company_name': name.where(name.ne(''), code.map(companies)),
+        'date': day.dt.strftime('%Y-%m-%d'),
+        'recipient': _text(df, 'recipient'),
+        'address': _text(df, 'address'),
+        'total_amount': _number(df, 'total_amount').round(2),
+        # Historical rows sort by their nota date in the history list
+        'created_at': created.where(created_ok, day.dt.strftime('%Y-%m-%dT00:00:00')),
+    }, index=df.index)
+    problems = _first_problem([
+        (receipts['receipt_number'].eq(''), 'receipt_number is empty'),
+        _too_long(receipts['receipt_number'], 'receipt_number'),
+        (receipts['company_code'].isna(), f"company must be one of {', '.join(companies)}"),
+        (receipts['date'].isna(), 'date is not a date'),
+        (receipts['recipient'].eq(''), 'recipient is empty'),
+        _too_long(receipts['recipient'], 'recipient'),
+        _too_long(receipts['company_name'].fillna(''), 'company_name'),
+    ], df.index)
+    return receipts, problems
+
+
+def validate_items(df):
+    """``(items, problems)`` like validate_receipts, for item columns"""
+    import pandas as pd
+
+    quantity = _text(df, 'quantity')
+    unit_price = _number(df, 'unit_price')
+    total_price = _number(df, 'total_price')
+    # A missing line total is quantity x unit price when the quantity is a plain number
+    total_price = total_price.fillna(pd.to_numeric(quantity, errors='coerce') * unit_price)
+    size, color = _text(df, 'size'), _text(df, 'color')
+    created = _text(df, 'created_at')
+
+    items = pd.DataFrame({
+        'quantity': quantity,
+        'item_type': _text(df, 'item_type'),
+        'size': size.where(size.ne(''), None),
+        'color': color.where(color.ne(''), None),
+        'unit_price': unit_price.round(2),
+        'total_price': total_price.round(2),
+        'created_at': created.where(created.ne(''), None),
+    }, index=df.index)
+    problems = _first_problem([
+        (items['quantity'].eq(''), 'quantity is empty'),
+        _too_long(items['quantity'], 'quantity'),
+        (items['item_type'].eq(''), 'item_type is empty'),
+        _too_long(items['item_type'], 'item_type'),
+        _too_long(size, 'size'),
+        _too_long(color, 'color'),
+        (unit_price.isna() | (unit_price < 0), 'unit_price is not a number'),
+        (items['total_price'].isna() | (items['total_price'] < 0), 'total_price is not a number'),
+    ], df.index)
+    return items, problems
+
+
+def _records(df):
+    """DataFrame rows as plain dicts (NaN -> None)"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+# Importing
+
+class BulkImport:
+    """One import run: reads, validates and writes, yielding progress after every batch"""
+
+    def __init__(self, store, companies, chunk_size=1000, on_imported=None, archive=None):
+        self.store = store
+        self.companies = companies
+        self.chunk_size = chunk_size
+        self.on_imported = on_imported  # called with the receipts of every written batch
+        self.archive = archive
+        self.archived = set()  # receipt numbers in the archive, read when the run starts
+        self.seen = set()  # receipt numbers met so far in the file
+        self.counts = dict.fromkeys((
+            'rows_read', 'receipts_imported', 'receipts_skipped', 'receipts_rejected',
+            'items_imported', 'items_rejected'
+        ), 0)
+        self.errors = []
+        self.layout = None
+        self.started = None
+
+    def progress(self, done=False):
+        elapsed = time.perf_counter() - self.started
+        return dict(
+            self.counts, layout=self.layout, done=done, errors=list(self.errors),
+            elapsed_s=round(elapsed, 3), rows_per_second=round(self.counts['rows_read'] / elapsed, 1) if elapsed else 0.0
+        )
+
+    def _reject(self, sheet, rows, messages, kind):
+        self.counts[f'{kind}_rejected'] += len(rows)
+        for row, message in zip(rows, messages):
+            if len(self.errors) >= MAX_REPORTED_ERRORS:
+                break
+            self.errors.append({'sheet': sheet, 'row': int(row), 'error': message})
+
+    def _write(self, receipts):
+        """Write one batch; returns the receipts that were new"""
+        # Archived receipts are not in the live tables' unique index; never
+        # insert them again (nor count them twice in the sales rollups)
+        live = [receipt for receipt in receipts if receipt['receipt_number'] not in self.archived]
+        for receipt in live:
+            for item in receipt['items']:
+                item['created_at'] = item['created_at'] or receipt['created_at']
+        inserted = set(self.store.import_receipts(live)) if live else set()
+        written = [receipt for receipt in live if receipt['receipt_number'] in inserted]
+        self.counts['receipts_imported'] += len(written)
+        self.counts['receipts_skipped'] += len(receipts) - len(written)
+        self.counts['items_imported'] += sum(len(receipt['items']) for receipt in written)
+        if written and self.on_imported:
+            self.on_imported(written)
+        return written
+
+    def _first_in_file(self, numbers):
+        """Mask of the receipt numbers (NaN = not a candidate) not met earlier in the file"""
+        first = numbers.notna() & ~numbers.duplicated() & ~numbers.isin(self.seen)
+        self.seen.update(numbers[first])
+        return first
+
+    def run(self, path, items_path=None):
+        """Import ``path`` (and ``items_path``); yields a progress dict after every batch, the last one with ``done``"""
+        self.started = time.perf_counter()
+        if self.archive is not None and self.archive.has_data():
+            self.archived = self.archive.receipt_numbers()
+        source = _Source(path, items_path)
+        try:
+            if source.items is not None:
+                self.layout = 'export'
+                yield from self._run_export(source)
+            else:
+                self.layout = 'rows'
+                yield from self._run_rows(source)
+        finally:
+            source.close()
+        yield self.progress(done=True)
+
+    def _run_export(self, source):
+        import numpy as np
+        import pandas as pd
+
+        # Items first: any of them may belong to any receipt
+        frames, bad_receipts = [], set()
+        for df in _frames(source.items, self.chunk_size * 4):
+            if 'receipt_id' not in df:
+                raise QueryError('The Items sheet has no receipt_id column')
+            self.counts['rows_read'] += len(df)
+            items, problems = validate_items(df)
+            receipt_ids = pd.to_numeric(df['receipt_id'], errors='coerce')
+            problems = problems.mask(receipt_ids.isna() & problems.isna(), 'receipt_id is empty')
+            bad = problems.notna()
+            self._reject('Items', df['_row'][bad], problems[bad], 'items')
+            bad_receipts.update(receipt_ids[bad].dropna().tolist())
+            frames.append(items[~bad].assign(receipt_id=receipt_ids[~bad]))
+        if frames:
+            items = pd.concat(frames, ignore_index=True)
+        else:
+            items = pd.DataFrame(columns=list(ITEM_COLUMNS) + ['receipt_id'])
+        positions = items.groupby('receipt_id').indices
+        item_columns = items.drop(columns='receipt_id')
+        used = 0
+
+        for df in _frames(source.receipts, self.chunk_size):
+            if 'id' not in df:
+                raise QueryError('The Receipts sheet has no id column')
+            self.counts['rows_read'] += len(df)
+            receipts, problems = validate_receipts(df, self.companies)
+            file_ids = pd.to_numeric(df['id'], errors='coerce')
+            totals = receipts['total_amount']
+            problems = _first_problem([
+                (problems.notna(), problems),
+                (file_ids.isna(), 'id is empty'),
+                (file_ids.isin(bad_receipts), 'has invalid items'),
+                (totals.isna() | (totals < 0), 'total_amount is not a number'),
+            ], df.index)
+            fresh = self._first_in_file(receipts['receipt_number'].where(problems.isna()))
+            problems = problems.mask(~fresh & problems.isna(), 'receipt_number repeated in the file')
+            bad = problems.notna()
+            self._reject('Receipts', df['_row'][bad], problems[bad], 'receipts')
+
+            # The items of the whole chunk in one take, then dealt out per receipt
+            found = [positions.get(file_id, ()) for file_id in file_ids[~bad]]
+            taken = np.concatenate(found).astype(int) if found else np.array([], dtype=int)
+            item_records = iter(_records(item_columns.iloc[taken]))
+            batch = []
+            for receipt, rows in zip(_records(receipts[~bad]), found):
+                receipt['items'] = [next(item_records) for _ in range(len(rows))]
+                batch.append(receipt)
+            used += len(taken)
+            if batch:
+                self._write(batch)
+            yield self.progress()
+
+        # Items whose receipt is not in the Receipts sheet or was rejected
+        orphans = len(items) - used
+        if orphans:
+            self.counts['items_rejected'] += orphans
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({'sheet': 'Items', 'row': None,
+                                    'error': f'{orphans} item(s) without a valid receipt in the Receipts sheet'})
+
+    def _run_rows(self, source):
+        import pandas as pd
+
+        frames = _frames(source.receipts, self.chunk_size)
+        df, carry = next(frames, None), None
+        while df is not None:
+            if 'receipt_number' not in df:
+                raise QueryError('No receipt_number (Nota) column')
+            self.counts['rows_read'] += len(df)
+            if carry is not None:
+                df = pd.concat([carry, df], ignore_index=True)
+            following = next(frames, None)
+
+            # Consecutive rows with the same receipt number are one nota; the
+            # last one may continue in the next chunk
+            numbers = _text(df, 'receipt_number')
+            group = numbers.ne(numbers.shift()).cumsum()
+            carry = None
+            if following is not None:
+                last = group.eq(group.iloc[-1])
+                carry, df, numbers, group = df[last], df[~last], numbers[~last], group[~last]
+            if not df.empty:
+                self._write_rows(df, numbers, group)
+                yield self.progress()
+            df = following
+
+    def _write_rows(self, df, numbers, group):
+        receipts, problems = validate_receipts(df, self.companies)
+        items, item_problems = validate_items(df)
+        problems = problems.fillna(item_problems)
+        # Without a nota total column the total is the sum of its lines
+        receipts['total_amount'] = receipts['total_amount'].fillna(
+            items['total_price'].groupby(group).transform('sum').round(2)
+        )
+        first = group.ne(group.shift())
+
+        # A nota is imported whole or not at all
+        nota_problem = problems.groupby(group).transform('first')
+        fresh = self._first_in_file(numbers.where(first & nota_problem.isna()))
+        repeated = (~fresh & first & nota_problem.isna()).groupby(group).transform('any')
+        nota_problem = nota_problem.mask(repeated, 'receipt_number repeated in the file')
+        bad = nota_problem.notna()
+        self._reject('Rows', df['_row'][bad & first], nota_problem[bad & first], 'receipts')
+        self.counts['items_rejected'] += int(bad.sum())
+
+        item_records = iter(_records(items[~bad]))
+        batch = []
+        for receipt, size in zip(_records(receipts[~bad & first]), group[~bad].groupby(group[~bad]).size()):
+            receipt['items'] = [next(item_records) for _ in range(size)]
+            batch.append(receipt)
+        if batch:
+            self._write(batch)
+
+
+def import_file(store, companies, path, items_path=None, chunk_size=1000, on_imported=None, archive=None):
+    """Run an import to the end; returns the final progress dict"""
+    result = None
+    for result in BulkImport(store, companies, chunk_size, on_imported, archive).run(path, items_path):
+        pass
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import receipts and items from an Excel workbook or CSV files')
+    parser.add_argument('path', help='.xlsx workbook (Receipts/Items sheets or one row per item) or .csv')
+    parser.add_argument('--items', help='Items CSV belonging to a Receipts CSV (export layout)')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='receipts per batch')
+    args = parser.parse_args()
+
+    from config import Config
+    from storage import init_storage, get_archive
+
+    store = init_storage(vars(Config))
+    if store is None:
+        parser.error('Database not configured')
+    if not os.path.exists(args.path):
+        parser.error(f'{args.path} not found')
+
+    try:
+        for progress in BulkImport(store, Config.COMPANIES, args.chunk_size, archive=get_archive()).run(args.path, args.items):
+            print(f"\r{progress['rows_read']} rows read, {progress['receipts_imported']} receipts imported, "
+                  f"{progress['receipts_skipped']} already there, {progress['receipts_rejected']} rejected "
+                  f"({progress['rows_per_second']:.0f} rows/s)", end='', flush=True)
+    except QueryError as e:
+        parser.error(str(e))
+    print()
+    for error in progress['errors']:
+        print(f"  {error['sheet']} row {error['row']}: {error['error']}")
+    print(f"Imported {progress['receipts_imported']} receipts and {progress['items_imported']} items "
+          f"in {progress['elapsed_s']:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
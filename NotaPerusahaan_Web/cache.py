@@ -0,0 +1,36 @@
+"""Small in-process caches shared by the API routes."""
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe key/value cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key=None):
+        """Drop one entry, or everything when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
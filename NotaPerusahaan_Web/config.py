@@ -4,10 +4,34 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv('.env.txt')  # Gunakan .env.txt agar tidak diblokir Windows
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def app_path(path):
+    """A relative local path resolved against the app directory (URIs and empty values as given)"""
+    if not path or '://' in path or os.path.isabs(path):
+        return path
+    return os.path.join(BASE_DIR, path)
+
+
 class Config:
     # Supabase Configuration
     SUPABASE_URL = os.getenv('SUPABASE_URL', '')
     SUPABASE_KEY = os.getenv('SUPABASE_KEY', '')
+    SUPABASE_MAX_CONNECTIONS = int(os.getenv('SUPABASE_MAX_CONNECTIONS', '20'))
+    SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY', '60'))  # seconds
+    SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '30'))  # seconds, per operation
+    # A client replaced after repeated failures is closed once idle and this old (seconds)
+    SUPABASE_RETIRE_AFTER = float(os.getenv('SUPABASE_RETIRE_AFTER', '120'))
+    # Async I/O (async_storage.py): independent queries of a request run
+    # concurrently; single PDFs render in the PDF process pool when
+    # PDF_BATCH_WORKERS > 1
+    ASYNC_IO = os.getenv('ASYNC_IO', 'false').lower() == 'true'
+    
+    # Storage backend: 'supabase' or 'sqlite' (local file, no network needed;
+    # a relative SQLITE_PATH is under the app directory)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase')
+    SQLITE_PATH = app_path(os.getenv('SQLITE_PATH', 'nota.db'))
     
     # Flask Configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
@@ -25,4 +49,65 @@ class Config:
     
     # Receipt Settings
     MAX_RECEIPTS_PER_PAGE = 50
+    RECEIPT_NUMBER_MAX_BLOCK = 100  # Max numbers one terminal may reserve at once
     EXPORT_THRESHOLD = 1000  # Export when database reaches this many records
+    EXPORT_CHUNK_SIZE = 1000  # Rows fetched per request while exporting
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '1000'))  # Receipts written per batch by /api/import
+    
+    # Archive: exported/old receipts move to Parquet here instead of being deleted.
+    # Local folder (relative = under the app directory) or an object-store URI
+    # (s3://bucket/prefix); empty = delete after export
+    ARCHIVE_DIR = app_path(os.getenv('ARCHIVE_DIR', 'archive'))
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '90'))
+    STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', '15'))  # seconds
+    # ETag/Last-Modified on /api/receipts and /api/stats come from the receipts
+    # version (receipt_version.sql), re-read at most this often (seconds) and
+    # after every write made by this process
+    WATERMARK_TTL = float(os.getenv('WATERMARK_TTL', '5'))
+    
+    # Background jobs (jobs.py): export, import, rollup rebuild and archive run
+    # outside the request. JOBS_DIR (relative = under the app directory) holds
+    # the job table and the job files; JOB_WORKERS=0 runs each job inside its
+    # request (serverless platforms)
+    JOBS_DIR = app_path(os.getenv('JOBS_DIR', 'jobs'))
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '0' if os.getenv('VERCEL') else '1'))
+    JOB_RETENTION_HOURS = int(os.getenv('JOB_RETENTION_HOURS', '24'))
+    
+    # PDF Cache
+    PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+    PDF_CACHE_DIR = app_path(os.getenv('PDF_CACHE_DIR', ''))  # Empty = memory only
+    
+    # Metrics: /metrics answers "Authorization: Bearer <token>" (scrapers) or an
+    # admin session; with no token set, only admins can read it
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    
+    # Operator routes (/api/admin/...): these usernames, or the METRICS_TOKEN bearer
+    ADMIN_USERNAMES = [name.strip() for name in os.getenv('ADMIN_USERNAMES', '').split(',') if name.strip()]
+    
+    # Sampling profiler (/api/admin/profiler): off until switched on; share of
+    # requests sampled, sampling interval (ms), distinct stacks kept
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() == 'true'
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0.05'))
+    PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', '5'))
+    PROFILER_MAX_STACKS = int(os.getenv('PROFILER_MAX_STACKS', '20000'))
+    
+    # Warm-up at start-up (PDF logos/fonts, recipient autocomplete index).
+    # Off on serverless platforms, where every cold start would pay for it;
+    # each piece is then loaded on first use instead
+    WARM_UP_ON_START = os.getenv('WARM_UP_ON_START', 'false' if os.getenv('VERCEL') else 'true').lower() == 'true'
+    
+    # Change feed (/api/events): open streams allowed per process, and how
+    # often an idle stream sends a keep-alive comment (seconds)
+    EVENTS_MAX_CLIENTS = int(os.getenv('EVENTS_MAX_CLIENTS', '500'))
+    EVENTS_KEEPALIVE_SECONDS = float(os.getenv('EVENTS_KEEPALIVE_SECONDS', '15'))
+    
+    # PDF render pool: renders run on PDF_RENDER_WORKERS threads with at most
+    # PDF_RENDER_QUEUE waiting; beyond that, or past PDF_RENDER_PER_USER
+    # renders in flight for one user, requests get 503 + Retry-After
+    PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', '1'))
+    PDF_RENDER_QUEUE = int(os.getenv('PDF_RENDER_QUEUE', '16'))
+    PDF_RENDER_PER_USER = int(os.getenv('PDF_RENDER_PER_USER', '2'))
+    
+    # Bulk PDF printing
+    PDF_BATCH_WORKERS = int(os.getenv('PDF_BATCH_WORKERS', str(os.cpu_count() or 1)))
+    PDF_BATCH_MAX_RECEIPTS = 500
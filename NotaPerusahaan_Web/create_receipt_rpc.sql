@@ -0,0 +1,29 @@
+-- Simpan nota + semua item dalam satu transaksi (satu round trip dari aplikasi)
+-- Jalankan script ini di Supabase SQL Editor
+
+CREATE OR REPLACE FUNCTION create_receipt_with_items(p_receipt JSONB, p_items JSONB DEFAULT '[]'::JSONB)
+RETURNS BIGINT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_receipt_id BIGINT;
+BEGIN
+    INSERT INTO receipts (receipt_number, company_code, company_name, date, recipient, address, total_amount, created_at)
+    SELECT r.receipt_number, r.company_code, r.company_name, r.date, r.recipient,
+           COALESCE(r.address, ''), r.total_amount, COALESCE(r.created_at, NOW())
+    FROM jsonb_populate_record(NULL::receipts, p_receipt) AS r
+    RETURNING id INTO v_receipt_id;
+
+    -- All items in one statement; any failure rolls back the receipt too
+    INSERT INTO items (receipt_id, quantity, item_type, size, color, unit_price, total_price, created_at)
+    SELECT v_receipt_id, i.quantity, i.item_type, i.size, i.color,
+           i.unit_price, i.total_price, COALESCE(i.created_at, NOW())
+    FROM jsonb_populate_recordset(NULL::items, COALESCE(p_items, '[]'::JSONB)) AS i;
+
+    RETURN v_receipt_id;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION create_receipt_with_items(JSONB, JSONB) TO anon, authenticated;
+
+SELECT 'create_receipt_with_items created successfully' as status;
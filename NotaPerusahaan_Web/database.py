@@ -0,0 +1,202 @@
+"""Shared Supabase client for the Nota Perusahaan web app.
+
+Every worker process keeps one long-lived client whose HTTP connections are
+kept alive between requests, instead of calling ``create_client`` per request.
+The Supabase SDK itself lives in supabase_client.py and is only imported
+when the first client is built, so processes that never query Supabase
+(SQLite backend, a cold start serving the login page) do not pay for it.
+"""
+import os
+import threading
+import time
+
+
+class SupabasePool:
+    """Process-wide, thread-safe holder of a single Supabase client.
+
+    The client is created lazily on first use, rebuilt after a fork (so
+    gunicorn workers never share sockets) and rebuilt after repeated
+    connection failures. A replaced client is closed once no request is in
+    flight on it and ``retire_after`` seconds have passed: callers may hold
+    the old client between requests (a paged scan fetches page after page
+    from one client), and the httpx ``timeout`` bounds each operation, not
+    a whole request.
+    """
+
+    def __init__(self, url, key, max_connections=20, keepalive_expiry=60.0, timeout=30.0, max_failures=3,
+                 retire_after=120.0):
+        self.url = url
+        self.key = key
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.retire_after = retire_after
+
+        self._lock = threading.Lock()
+        self._client = None
+        self._http = None
+        self._pid = None
+        self._consecutive_failures = 0
+        # (HTTP client, when it was detached) of clients replaced after failures
+        self._retired = []
+        self._in_flight = {}  # HTTP client -> requests being sent on it
+
+        self.counters = {
+            'client_hits': 0,
+            'client_misses': 0,
+            'requests': 0,
+            'connections_reused': 0,
+            'connections_opened': 0,
+            'tls_handshakes': 0,
+            'reconnects': 0,
+            'failures': 0,
+        }
+
+    def _bump(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def record_request(self, reused):
+        with self._lock:
+            self.counters['requests'] += 1
+            self.counters['connections_reused' if reused else 'connections_opened'] += 1
+            self._consecutive_failures = 0
+
+    def record_handshake(self):
+        self._bump('tls_handshakes')
+
+    def record_reconnect(self, error):
+        print(f"Supabase connection dropped, reconnecting: {error}")
+        self._bump('reconnects')
+
+    def record_failure(self, error):
+        print(f"Supabase connection error: {error}")
+        with self._lock:
+            self.counters['failures'] += 1
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self.max_failures:
+                # Detach the client so the next get() builds a fresh one; requests
+                # on other threads keep using the old one, which is closed by the
+                # last release() or get() after ``retire_after``
+                if self._http is not None:
+                    self._retired.append((self._http, time.monotonic()))
+                self._client = None
+                self._http = None
+                self._consecutive_failures = 0
+
+    def _build_client(self):
+        from supabase_client import build_client
+        return build_client(self)
+
+    @staticmethod
+    def _close_http(clients):
+        for http in clients:
+            try:
+                http.close()
+            except Exception:
+                pass
+
+    def acquire(self, http):
+        """Called by the HTTP client before it sends a request"""
+        with self._lock:
+            self._in_flight[http] = self._in_flight.get(http, 0) + 1
+
+    def release(self, http):
+        """Called by the HTTP client once the response has been read (or failed)"""
+        with self._lock:
+            count = self._in_flight.pop(http, 1) - 1
+            if count:
+                self._in_flight[http] = count
+            expired = self._take_retired_locked(time.monotonic() - self.retire_after) if self._retired else []
+        self._close_http(expired)
+
+    def _take_retired_locked(self, older_than=None):
+        """Remove and return the retired clients detached before ``older_than`` and idle (all when None)"""
+        def due(entry):
+            http, retired_at = entry
+            return older_than is None or (retired_at <= older_than and http not in self._in_flight)
+
+        taken = [http for http, _ in filter(due, self._retired)]
+        self._retired = [entry for entry in self._retired if not due(entry)]
+        return taken
+
+    def _close_locked(self):
+        self._close_http([self._http] if self._http is not None else [])
+        self._close_http(self._take_retired_locked())
+        self._client = None
+        self._http = None
+        self._consecutive_failures = 0
+
+    def get(self):
+        """Return the shared client, creating it on first use"""
+        pid = os.getpid()
+        with self._lock:
+            expired = self._take_retired_locked(time.monotonic() - self.retire_after) if self._retired else []
+            if self._client is not None and self._pid == pid:
+                self.counters['client_hits'] += 1
+                client = self._client
+            else:
+                if self._pid != pid:
+                    # Forked worker: never reuse (or close) the parent's sockets
+                    self._http = None
+                    self._client = None
+                    self._retired = []
+                    self._in_flight = {}
+                    expired = []
+
+                self.counters['client_misses'] += 1
+                self._http, self._client = self._build_client()
+                self._pid = pid
+                client = self._client
+        self._close_http(expired)
+        return client
+
+    def reset(self):
+        """Close the shared client (and any retired ones); the next get() reconnects"""
+        with self._lock:
+            self._close_locked()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        total = stats['connections_reused'] + stats['connections_opened']
+        stats['connection_reuse_ratio'] = round(stats['connections_reused'] / total, 4) if total else 0.0
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool(config):
+    """Create the process-wide pool from a Flask config mapping"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.reset()
+        _pool = None
+        if config.get('SUPABASE_URL') and config.get('SUPABASE_KEY'):
+            _pool = SupabasePool(
+                config['SUPABASE_URL'],
+                config['SUPABASE_KEY'],
+                max_connections=config.get('SUPABASE_MAX_CONNECTIONS', 20),
+                keepalive_expiry=config.get('SUPABASE_KEEPALIVE_EXPIRY', 60.0),
+                timeout=config.get('SUPABASE_TIMEOUT', 30.0),
+                retire_after=config.get('SUPABASE_RETIRE_AFTER', 120.0),
+            )
+    return _pool
+
+
+def get_client():
+    """Get the shared Supabase client, or None when Supabase is not configured"""
+    if _pool is None:
+        return None
+    return _pool.get()
+
+
+def pool_stats():
+    """Connection reuse counters for the current worker"""
+    if _pool is None:
+        return {}
+    return _pool.stats()
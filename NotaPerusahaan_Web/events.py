@@ -0,0 +1,138 @@
+"""Server-Sent Events change feed for /api/events.
+
+One broadcaster per process fans each event out to every open stream.
+An event is formatted once when it is published and kept in a short ring
+buffer. Streams block on a shared condition until there is something
+newer than what they last sent, so an idle connection costs no CPU (plus
+a keep-alive comment every few seconds). A client that reconnects with
+Last-Event-ID gets what it missed from the buffer, or a ``resync`` event
+when the buffer no longer reaches back that far.
+
+Limits:
+
+- Every open stream holds one server thread until it ends (about 37 KB of
+  RSS each on the threaded dev server, see benchmarks/bench_events.py), so
+  ``max_clients`` streams means that many threads. A closed tab is only
+  noticed when the next keep-alive write fails, so its thread and slot are
+  held for up to ``keepalive`` seconds after it goes away.
+- Events only reach the clients connected to the process that published
+  them. With more than one worker process a tab misses the events published
+  by the others; run a single worker (as ``python app.py`` does) or let
+  clients fall back to polling.
+"""
+import json
+import threading
+from collections import deque
+
+
+class TooManyClients(Exception):
+    """EVENTS_MAX_CLIENTS streams are already open"""
+
+
+def _frame(event_id, event, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n'
+
+
+class EventBroadcaster:
+    """Fan-out of published events to every subscribed stream"""
+
+    def __init__(self, max_clients=500, keepalive=15.0, buffer_size=256):
+        self.max_clients = max_clients
+        self.keepalive = keepalive
+        self._condition = threading.Condition()
+        self._buffer = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._clients = 0
+        self._published = 0
+        self._pending = {}
+
+    def publish(self, event, data):
+        """Send ``data`` (JSON-able) as ``event`` to every open stream"""
+        with self._condition:
+            self._last_id += 1
+            self._buffer.append((self._last_id, _frame(self._last_id, event, data)))
+            self._published += 1
+            self._condition.notify_all()
+
+    def publish_soon(self, event, build, delay=0.5):
+        """Publish ``build()`` as ``event`` after ``delay`` seconds.
+
+        Calls made while one is pending are folded into it, so a burst of
+        changes costs one ``build()``; skipped when nobody is listening.
+        """
+        with self._condition:
+            if event in self._pending or not self._clients:
+                return
+            timer = threading.Timer(delay, self._publish_pending, (event, build))
+            timer.daemon = True
+            self._pending[event] = timer
+        timer.start()
+
+    def _publish_pending(self, event, build):
+        with self._condition:
+            self._pending.pop(event, None)
+        try:
+            data = build()
+        except Exception as e:
+            print(f"Error building {event} event: {e}")
+            return
+        self.publish(event, data)
+
+    def subscribe(self, last_event_id=None):
+        """Open a stream; iterate it for SSE text and close it when the client goes away"""
+        with self._condition:
+            if self._clients >= self.max_clients:
+                raise TooManyClients()
+            self._clients += 1
+            last_id = self._last_id
+            resync = False
+            if last_event_id is not None and str(last_event_id).isdigit():
+                # An id from before a restart of this process: nothing to replay
+                resync = int(last_event_id) > self._last_id
+                last_id = min(int(last_event_id), self._last_id)
+        return Subscription(self, last_id, resync)
+
+    def _unsubscribe(self):
+        with self._condition:
+            self._clients -= 1
+
+    def _wait(self, last_id):
+        """Frames newer than ``last_id``, waiting up to ``keepalive`` seconds for one"""
+        with self._condition:
+            if self._last_id <= last_id:
+                self._condition.wait(self.keepalive)
+            if self._last_id <= last_id:
+                return [], last_id
+            if not self._buffer or self._buffer[0][0] > last_id + 1:
+                # Missed more than the buffer holds; the client reloads instead
+                return [_frame(self._last_id, 'resync', {})], self._last_id
+            return [frame for event_id, frame in self._buffer if event_id > last_id], self._last_id
+
+    def stats(self):
+        with self._condition:
+            return {'clients': self._clients, 'published': self._published, 'last_id': self._last_id}
+
+
+class Subscription:
+    """One open /api/events stream"""
+
+    def __init__(self, broadcaster, last_id, resync=False):
+        self.broadcaster = broadcaster
+        self.last_id = last_id
+        self.resync = resync
+        self.closed = False
+
+    def __iter__(self):
+        if self.resync:
+            yield _frame(self.last_id, 'resync', {})
+        while not self.closed:
+            frames, self.last_id = self.broadcaster._wait(self.last_id)
+            if not frames:
+                yield ': keepalive\n\n'
+            for frame in frames:
+                yield frame
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broadcaster._unsubscribe()
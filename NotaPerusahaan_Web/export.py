@@ -0,0 +1,65 @@
+"""Streaming Excel export of receipts and items.
+
+Rows are paged out of the database in chunks and appended to a write-only
+openpyxl workbook, which flushes each row to disk as it goes, so memory
+use does not grow with the number of receipts. openpyxl is imported by the
+first export rather than at start-up.
+"""
+import tempfile
+
+from metrics import EXPORT_SECONDS, EXPORT_ROWS, EXPORT_BYTES
+
+
+# Kept in memory up to this size, then spilled to a temp file on disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def _write_sheet(workbook, title, rows, on_progress=None, every=1000):
+    sheet = workbook.create_sheet(title)
+    columns = None
+    count = 0
+    for row in rows:
+        if columns is None:
+            columns = list(row.keys())
+            sheet.append(columns)
+        sheet.append([row.get(column) for column in columns])
+        count += 1
+        if on_progress is not None and count % every == 0:
+            on_progress(title, count)
+    if on_progress is not None:
+        on_progress(title, count)
+    return count
+
+
+def write_export(store, max_receipt_id, chunk_size=1000, output=None, on_progress=None):
+    """Write the Receipts and Items sheets from a storage backend into ``output``.
+
+    ``output`` defaults to a spooled temp file. ``on_progress(sheet, rows)``
+    is called after every ``chunk_size`` rows. Returns ``(fileobj,
+    receipts_count, items_count)`` with the file rewound and ready to send.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    with EXPORT_SECONDS.time(stage='receipts'):
+        receipts_count = _write_sheet(
+            workbook, 'Receipts', store.iter_rows('receipts', chunk_size, max_receipt_id), on_progress, chunk_size
+        )
+    with EXPORT_SECONDS.time(stage='items'):
+        items_count = _write_sheet(
+            workbook, 'Items', store.iter_rows('items', chunk_size, max_receipt_id), on_progress, chunk_size
+        )
+    EXPORT_ROWS.inc(receipts_count, sheet='Receipts')
+    EXPORT_ROWS.inc(items_count, sheet='Items')
+
+    if output is None:
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, suffix='.xlsx')
+    try:
+        with EXPORT_SECONDS.time(stage='save'):
+            workbook.save(output)
+    except Exception:
+        output.close()
+        raise
+    EXPORT_BYTES.observe(output.tell())
+    output.seek(0)
+    return output, receipts_count, items_count
@@ -0,0 +1,54 @@
+-- Impor nota lama secara massal (bulk_import.py, POST /api/import)
+-- Jalankan script ini di Supabase SQL Editor
+
+-- Insert a batch of receipts, each with its items under "items", in one
+-- transaction. Receipt numbers that already exist are skipped with their
+-- items, so re-running an import does not duplicate anything. The receipt
+-- counters move past the imported numbers. Returns the inserted receipts.
+CREATE OR REPLACE FUNCTION import_receipts(p_receipts JSONB)
+RETURNS TABLE (receipt_number VARCHAR, id BIGINT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_ids BIGINT[];
+    v_numbers VARCHAR[];
+BEGIN
+    WITH inserted AS (
+        INSERT INTO receipts (receipt_number, company_code, company_name, date, recipient, address, total_amount, created_at)
+        SELECT r.receipt_number, r.company_code, r.company_name, r.date, r.recipient,
+               COALESCE(r.address, ''), r.total_amount, COALESCE(r.created_at, NOW())
+        FROM jsonb_array_elements(p_receipts) WITH ORDINALITY AS x(receipt, n)
+        CROSS JOIN LATERAL jsonb_populate_record(NULL::receipts, x.receipt) AS r
+        ORDER BY x.n
+        ON CONFLICT ON CONSTRAINT receipts_receipt_number_key DO NOTHING
+        RETURNING receipts.id, receipts.receipt_number
+    )
+    SELECT array_agg(inserted.id), array_agg(inserted.receipt_number) INTO v_ids, v_numbers FROM inserted;
+
+    IF v_ids IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO items (receipt_id, quantity, item_type, size, color, unit_price, total_price, created_at)
+    SELECT ins.id, i.quantity, i.item_type, i.size, i.color, i.unit_price, i.total_price,
+           COALESCE(i.created_at, NOW())
+    FROM unnest(v_ids, v_numbers) AS ins(id, receipt_number)
+    JOIN jsonb_array_elements(p_receipts) AS x(receipt) ON x.receipt->>'receipt_number' = ins.receipt_number
+    CROSS JOIN LATERAL jsonb_populate_recordset(NULL::items, COALESCE(x.receipt->'items', '[]'::JSONB)) AS i;
+
+    INSERT INTO receipt_counters AS rc (company_code, last_value)
+    SELECT r.company_code, MAX(NULLIF(regexp_replace(r.receipt_number, '\D', '', 'g'), '')::BIGINT)
+    FROM receipts r
+    WHERE r.id = ANY(v_ids)
+    GROUP BY r.company_code
+    HAVING MAX(NULLIF(regexp_replace(r.receipt_number, '\D', '', 'g'), '')::BIGINT) IS NOT NULL
+    ON CONFLICT (company_code) DO UPDATE
+    SET last_value = GREATEST(rc.last_value, EXCLUDED.last_value), updated_at = NOW();
+
+    RETURN QUERY SELECT ins.receipt_number, ins.id FROM unnest(v_numbers, v_ids) AS ins(receipt_number, id);
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION import_receipts(JSONB) TO anon, authenticated;
+
+SELECT 'import_receipts created successfully' as status;
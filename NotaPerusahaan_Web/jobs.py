@@ -0,0 +1,355 @@
+"""Background jobs for slow operations (export, import, rollup rebuild, archive).
+
+Jobs are rows in a small SQLite table next to their input and output
+files (JOBS_DIR), so every worker process on the host sees the same queue
+and a job outlives the request that created it. Each process runs a few
+worker threads that claim queued jobs with one UPDATE, so a job runs
+exactly once. Handlers report progress through ``JobContext.progress``,
+which is also where a cancel request takes effect. Finished jobs and their
+files are removed after JOB_RETENTION_HOURS.
+
+With ``workers=0`` (serverless platforms, where nothing runs after the
+response) a job runs inside the request that submits it.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from metrics import JOB_SECONDS, JOB_WAIT_SECONDS
+
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        params TEXT NOT NULL DEFAULT '{}',
+        status TEXT NOT NULL DEFAULT 'queued',
+        progress TEXT,
+        result TEXT,
+        error TEXT,
+        file_path TEXT,
+        file_name TEXT,
+        mimetype TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        owner TEXT,
+        worker TEXT,
+        created_at TEXT NOT NULL,
+        started_at TEXT,
+        finished_at TEXT
+    )""",
+    'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs(owner, created_at)',
+)
+
+# Fields of a job shown to API clients
+PUBLIC_FIELDS = ('id', 'kind', 'status', 'progress', 'result', 'error', 'attempts',
+                 'created_at', 'started_at', 'finished_at')
+
+
+class JobError(Exception):
+    """A job cannot be created, cancelled or retried in its current state"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled"""
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobContext:
+    """What a handler gets to report progress and attach its output file"""
+
+    def __init__(self, runner, job):
+        self.runner = runner
+        self.id = job['id']
+        self.params = json.loads(job['params'])
+        self.file = None
+
+    def progress(self, **fields):
+        """Store progress; raises JobCancelled once the job has been cancelled"""
+        row = self.runner._execute(
+            'UPDATE jobs SET progress = ? WHERE id = ? RETURNING cancel_requested',
+            (json.dumps(fields, default=str), self.id)
+        )
+        if row and row[0]['cancel_requested']:
+            raise JobCancelled()
+
+    def output_path(self, suffix):
+        """Path in JOBS_DIR for the file this job produces"""
+        return os.path.join(self.runner.directory, f'{self.id}-output{suffix}')
+
+    def attach(self, path, download_name, mimetype):
+        """Offer ``path`` for download once the job has succeeded"""
+        self.file = (path, download_name, mimetype)
+
+
+class JobRunner:
+    """Persisted job queue plus the worker threads of this process"""
+
+    def __init__(self, directory, workers=1, retention_hours=24, poll_interval=2.0):
+        self.directory = directory
+        self.path = os.path.join(directory, 'jobs.db')
+        self.workers = workers
+        self.retention = timedelta(hours=retention_hours)
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._last_prune = 0.0
+        os.makedirs(directory, exist_ok=True)
+        for statement in SCHEMA:
+            self._execute(statement)
+        self._recover()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _execute(self, sql, params=()):
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    @property
+    def worker_name(self):
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def register(self, kind, handler):
+        """``handler(job, params)`` does the work and returns a JSON-able result"""
+        self._handlers[kind] = handler
+
+    # Workers
+
+    def start(self):
+        """Start this process's worker threads (again after a fork); no-op with workers=0"""
+        with self._lock:
+            if self.workers <= 0 or self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._recover()
+            self._threads = [
+                threading.Thread(target=self._work, name=f'job-worker-{n}', daemon=True)
+                for n in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _recover(self):
+        """Fail jobs left running by a process on this host that no longer exists"""
+        host = socket.gethostname()
+        for job in self._execute("SELECT id, worker FROM jobs WHERE status = 'running'"):
+            worker_host, _, pid = (job['worker'] or '').rpartition(':')
+            if worker_host == host and pid.isdigit() and not _process_alive(int(pid)):
+                self._execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ? AND status = 'running'",
+                    ('Interrupted: the worker process stopped', _now(), job['id'])
+                )
+
+    def _work(self):
+        while True:
+            try:
+                job = self._claim()
+                if job is None:
+                    self._prune_if_due()
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                self._run(job)
+            except Exception as e:
+                print(f"Error in job worker: {e}")
+                time.sleep(self.poll_interval)
+
+    def _claim(self, job_id=None):
+        """Atomically move the oldest queued job (or ``job_id``) to running"""
+        where = '?' if job_id else "(SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at, rowid LIMIT 1)"
+        params = (self.worker_name, _now()) + ((job_id,) if job_id else ())
+        rows = self._execute(
+            f"""UPDATE jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1
+                WHERE id = {where} AND status = 'queued' RETURNING *""",
+            params
+        )
+        return rows[0] if rows else None
+
+    def _run(self, job):
+        JOB_WAIT_SECONDS.observe(
+            (datetime.fromisoformat(job['started_at']) - datetime.fromisoformat(job['created_at'])).total_seconds(),
+            kind=job['kind']
+        )
+        context = JobContext(self, job)
+        start = time.perf_counter()
+        status, result, error = 'succeeded', None, None
+        try:
+            handler = self._handlers.get(job['kind'])
+            if handler is None:
+                raise JobError(f"Unknown job kind: {job['kind']}")
+            result = handler(context, context.params)
+        except JobCancelled:
+            status = 'cancelled'
+        except Exception as e:
+            print(f"Error in job {job['id']} ({job['kind']}): {e}")
+            status, error = 'failed', str(e)
+
+        path, name, mimetype = context.file if status == 'succeeded' and context.file else (None, None, None)
+        if status != 'succeeded':
+            self._remove_outputs(job['id'])
+        self._execute(
+            """UPDATE jobs SET status = ?, result = ?, error = ?, file_path = ?, file_name = ?, mimetype = ?,
+               finished_at = ? WHERE id = ?""",
+            (status, json.dumps(result, default=str) if result is not None else None, error,
+             path, name, mimetype, _now(), job['id'])
+        )
+        JOB_SECONDS.observe(time.perf_counter() - start, kind=job['kind'], status=status)
+
+    # Queue
+
+    def submit(self, kind, params=None, owner=None, inputs=()):
+        """Queue a job; ``inputs`` are files moved into JOBS_DIR and passed as ``params['inputs']``"""
+        if kind not in self._handlers:
+            raise JobError(f'Unknown job kind: {kind}')
+        job_id = uuid.uuid4().hex
+        params = dict(params or {})
+        if inputs:
+            params['inputs'] = []
+            for n, source in enumerate(inputs):
+                target = os.path.join(self.directory, f'{job_id}-input{n}{os.path.splitext(source)[1]}')
+                os.replace(source, target)
+                params['inputs'].append(target)
+        self._execute(
+            'INSERT INTO jobs (id, kind, params, owner, created_at) VALUES (?, ?, ?, ?, ?)',
+            (job_id, kind, json.dumps(params), owner, _now())
+        )
+        self._dispatch(job_id)
+        return self.get(job_id)
+
+    def _dispatch(self, job_id):
+        if self.workers > 0:
+            self.start()
+            self._wakeup.set()
+        else:
+            job = self._claim(job_id)
+            if job is not None:
+                self._run(job)
+
+    def get(self, job_id, owner=None):
+        """Public view of a job, or None (also for jobs of another owner)"""
+        rows = self._execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        if not rows or (owner is not None and rows[0]['owner'] != owner):
+            return None
+        return self._public(rows[0])
+
+    def list(self, owner=None, limit=20):
+        if owner is None:
+            rows = self._execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,))
+        else:
+            rows = self._execute(
+                'SELECT * FROM jobs WHERE owner = ? ORDER BY created_at DESC LIMIT ?', (owner, limit)
+            )
+        return [self._public(row) for row in rows]
+
+    def download(self, job_id, owner=None):
+        """``(path, download_name, mimetype)`` of a succeeded job's file, or None"""
+        rows = self._execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        if not rows or (owner is not None and rows[0]['owner'] != owner):
+            return None
+        job = rows[0]
+        if job['status'] != 'succeeded' or not job['file_path'] or not os.path.exists(job['file_path']):
+            return None
+        return job['file_path'], job['file_name'], job['mimetype']
+
+    def cancel(self, job_id, owner=None):
+        """Cancel a queued job now, or ask a running one to stop at its next progress report"""
+        job = self.get(job_id, owner)
+        if job is None:
+            return None
+        if job['status'] in FINISHED:
+            raise JobError(f"Job is already {job['status']}")
+        self._execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+            (_now(), job_id)
+        )
+        self._execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+        return self.get(job_id)
+
+    def retry(self, job_id, owner=None):
+        """Queue a failed or cancelled job again with the same parameters and inputs"""
+        job = self.get(job_id, owner)
+        if job is None:
+            return None
+        if job['status'] not in ('failed', 'cancelled'):
+            raise JobError(f"Only failed or cancelled jobs can be retried (job is {job['status']})")
+        params = json.loads(self._execute('SELECT params FROM jobs WHERE id = ?', (job_id,))[0]['params'])
+        if not all(os.path.exists(path) for path in params.get('inputs', ())):
+            raise JobError('The uploaded files of this job are gone; submit it again')
+        self._execute(
+            """UPDATE jobs SET status = 'queued', progress = NULL, result = NULL, error = NULL,
+               cancel_requested = 0, worker = NULL, started_at = NULL, finished_at = NULL, created_at = ?
+               WHERE id = ? AND status IN ('failed', 'cancelled')""",
+            (_now(), job_id)
+        )
+        self._dispatch(job_id)
+        return self.get(job_id)
+
+    def counts(self):
+        """Number of jobs per status, for /metrics"""
+        return {row['status']: row['n'] for row in self._execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')}
+
+    # Clean-up
+
+    def _remove_outputs(self, job_id):
+        for name in os.listdir(self.directory):
+            if name.startswith(f'{job_id}-output'):
+                os.remove(os.path.join(self.directory, name))
+
+    def _prune_if_due(self):
+        if time.monotonic() - self._last_prune > 600:
+            self._last_prune = time.monotonic()
+            self.prune()
+
+    def prune(self):
+        """Delete finished jobs older than the retention period, with their files"""
+        cutoff = (datetime.now() - self.retention).isoformat()
+        placeholders = ','.join('?' * len(FINISHED))
+        expired = self._execute(
+            f'SELECT id FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?', FINISHED + (cutoff,)
+        )
+        expired_ids = {job['id'] for job in expired}
+        for name in os.listdir(self.directory):
+            if name.split('-', 1)[0] in expired_ids:
+                os.remove(os.path.join(self.directory, name))
+        for job in expired:
+            self._execute('DELETE FROM jobs WHERE id = ?', (job['id'],))
+        return len(expired)
+
+    def _public(self, row):
+        job = {field: row[field] for field in PUBLIC_FIELDS}
+        for field in ('progress', 'result'):
+            job[field] = json.loads(job[field]) if job[field] else None
+        job['download_url'] = f"/api/jobs/{row['id']}/download" if row['status'] == 'succeeded' and row['file_path'] else None
+        return job
@@ -0,0 +1,231 @@
+"""Prometheus metrics for the web app, served as text from /metrics.
+
+A tiny in-process implementation of counters and histograms (no extra
+dependency): observing a value is one bisect and one locked increment, so
+the instrumentation stays on in production. Each worker process keeps its
+own numbers; scrape every worker or run a single one.
+"""
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# Seconds; request, query and render latencies all fall in this range
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Rows and bytes
+SIZE_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 1000000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        _register(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 3)
+            series[index] += 1  # index == len(buckets) is the +Inf bucket
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        """Context manager / decorator observing the elapsed seconds"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(float(values[-2]))}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, key)} {values[-1]}'
+
+
+class GaugeFunction:
+    """Gauge read from a callback at scrape time.
+
+    ``fn`` returns either a number or a dict mapping label-value tuples to numbers.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, fn, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        _register(self)
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {e}")
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in sorted(values.items()):
+            if value is not None:
+                yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            # A fresh timer per call, so the decorated function stays thread-safe
+            with _Timer(self.histogram, self.labels):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# HTTP
+REQUEST_SECONDS = Histogram(
+    'nota_http_request_duration_seconds', 'Time spent handling a request',
+    ('route', 'method', 'status')
+)
+RESPONSE_BYTES = Histogram(
+    'nota_http_response_bytes', 'Size of response bodies', ('route',), buckets=BYTE_BUCKETS
+)
+CONDITIONAL_REQUESTS = Counter(
+    'nota_http_conditional_total',
+    'GETs of ETag routes: hit = answered 304, miss = stale validator, none = no validator sent',
+    ('route', 'result')
+)
+
+# Database
+DB_SECONDS = Histogram(
+    'nota_db_query_duration_seconds', 'Time spent in storage calls', ('backend', 'table', 'operation')
+)
+DB_ROWS = Histogram(
+    'nota_db_rows', 'Rows returned or written per storage call', ('backend', 'table', 'operation'),
+    buckets=SIZE_BUCKETS
+)
+DB_ERRORS = Counter(
+    'nota_db_errors_total', 'Storage calls that raised', ('backend', 'table', 'operation')
+)
+
+# PDF and export
+PDF_RENDER_SECONDS = Histogram(
+    'nota_pdf_render_duration_seconds', 'Time spent rendering nota PDFs', ('kind',)
+)
+PDF_BYTES = Histogram('nota_pdf_bytes', 'Size of rendered nota PDFs', ('kind',), buckets=BYTE_BUCKETS)
+PDF_QUEUE_WAIT_SECONDS = Histogram(
+    'nota_pdf_queue_wait_seconds', 'Time PDF renders waited for a render thread', ('kind',)
+)
+PDF_REJECTED = Counter(
+    'nota_pdf_rejected_total', 'PDF requests turned away with 503 because the render queue was full', ('reason',)
+)
+EXPORT_SECONDS = Histogram(
+    'nota_export_duration_seconds', 'Time spent writing the Excel export', ('stage',)
+)
+EXPORT_ROWS = Counter('nota_export_rows_total', 'Rows written to Excel exports', ('sheet',))
+EXPORT_BYTES = Histogram('nota_export_bytes', 'Size of Excel exports', buckets=BYTE_BUCKETS)
+
+# Background jobs
+JOB_SECONDS = Histogram(
+    'nota_job_duration_seconds', 'Time spent running background jobs', ('kind', 'status')
+)
+JOB_WAIT_SECONDS = Histogram(
+    'nota_job_wait_seconds', 'Time background jobs spent queued before a worker took them', ('kind',)
+)
@@ -0,0 +1,103 @@
+"""Logo and font assets for the nota PDF, loaded once per process.
+
+The CH logo is read, scaled and decoded a single time; every render draws
+it from memory through ``canvas.drawImage``, so drawing a nota does no file
+system I/O and no image decoding.
+"""
+import math
+import os
+import threading
+from collections import namedtuple
+
+from reportlab import rl_config
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+
+from config import Config
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(BASE_DIR, 'static', 'images')
+
+# Company logos, relative to static/images
+LOGO_FILES = {
+    'CH': 'CHASTE GEMILANG MANDIRI.png'
+}
+
+FONTS = ('Helvetica', 'Helvetica-Bold')
+
+# Logo box at the top left of each copy
+LOGO_WIDTH = 50
+LOGO_HEIGHT = 40
+LOGO_TOP_OFFSET = 10  # logo_y = start_y - 10
+LOGO_NAME_GAP = 20  # company name sits 20pt below the logo
+LOGO_DPI = 300  # print resolution the logo is kept at
+
+# Image streams are written as binary rather than ASCII85 text: the encoder
+# is pure Python without ReportLab's C accelerator and took most of a render
+rl_config.useA85 = 0
+
+# logo: Logo or None; name_offset: distance from start_y down to the company name
+CompanyHeader = namedtuple('CompanyHeader', 'logo name_offset')
+
+
+class Logo:
+    """A decoded image, ready to be placed on any canvas.
+
+    The image is scaled down once to LOGO_DPI at the logo box size and kept
+    as an ``ImageReader``; ``canvas.drawImage`` compresses it per document
+    (once, however many copies are drawn), so a smaller image is a faster
+    render.
+    """
+
+    def __init__(self, code, path):
+        from PIL import Image
+
+        self.code = code
+        self.path = path
+        image = Image.open(path)
+        size = (math.ceil(LOGO_WIDTH / 72 * LOGO_DPI), math.ceil(LOGO_HEIGHT / 72 * LOGO_DPI))
+        if image.width > size[0] or image.height > size[1]:
+            image = image.resize(size, Image.LANCZOS)
+        self.reader = ImageReader(image)
+        self.reader.getRGBData()  # decode now rather than in the first render
+
+    def draw(self, c, x, y, width=LOGO_WIDTH, height=LOGO_HEIGHT):
+        """Same as c.drawImage(path, x, y, width, height), without reading the file again"""
+        c.drawImage(self.reader, x, y, width, height)
+
+
+class AssetRegistry:
+    """Logos, fonts and per-company header metrics"""
+
+    def __init__(self, images_dir=IMAGES_DIR):
+        for font in FONTS:
+            pdfmetrics.getFont(font)  # loads the font metrics once
+
+        self.headers = {}
+        for code in Config.COMPANIES:
+            logo = None
+            if code in LOGO_FILES:
+                path = os.path.join(images_dir, LOGO_FILES[code])
+                try:
+                    logo = Logo(code, path)
+                except Exception as e:
+                    print(f"Error loading logo for {code}: {e}")
+            name_offset = LOGO_TOP_OFFSET + LOGO_NAME_GAP if logo else 0
+            self.headers[code] = CompanyHeader(logo, name_offset)
+
+    def header(self, company_code):
+        return self.headers.get(company_code, CompanyHeader(None, 0))
+
+
+_assets = None
+_assets_lock = threading.Lock()
+
+
+def get_assets():
+    """The process-wide registry, loaded on first use"""
+    global _assets
+    if _assets is None:
+        with _assets_lock:
+            if _assets is None:
+                _assets = AssetRegistry()
+    return _assets
@@ -0,0 +1,161 @@
+"""Bulk nota printing: render many receipts in a process pool.
+
+Pages are rendered in worker processes with the normal receipt_pdf layout
+and returned either merged into one PDF or packed into a ZIP of one PDF per
+receipt.
+"""
+import io
+import multiprocessing
+import re
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_cache import read_xref
+from receipt_pdf import render_receipt_pdf
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(workers):
+    """Process pool shared by all batch requests in this worker"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn: never fork a process that holds Flask threads and open sockets
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _executor_workers = workers
+        return _executor
+
+
+def _render_one(job):
+    receipt, username, timestamp = job
+    buffer, _ = render_receipt_pdf(receipt, receipt.get('items', []), footer=(username, timestamp))
+    return buffer.getvalue()
+
+
+def render_batch(receipts, username, timestamp, workers=1):
+    """Render each receipt to its own PDF (bytes), in input order"""
+    jobs = [(receipt, username, timestamp) for receipt in receipts]
+    if workers <= 1 or len(jobs) <= 1:
+        return [_render_one(job) for job in jobs]
+    chunksize = max(1, len(jobs) // (workers * 4))
+    return list(get_executor(workers).map(_render_one, jobs, chunksize=chunksize))
+
+
+def write_zip(receipts, pdfs):
+    """ZIP with one nota_<number>.pdf per receipt, in a spooled temp file"""
+    output = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024, suffix='.zip')
+    # PDFs are already compressed; storing them avoids burning CPU for nothing
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for receipt, pdf in zip(receipts, pdfs):
+            archive.writestr(f"nota_{receipt['receipt_number']}.pdf", pdf)
+    output.seek(0)
+    return output
+
+
+_REF = re.compile(rb'(\d+) 0 R')
+
+
+def _objects(pdf, offsets):
+    """Yield (number, dict_bytes, stream_bytes_or_None) for a ReportLab PDF"""
+    for number, offset in sorted(offsets.items()):
+        start = pdf.index(b'obj', offset) + 3
+        stream_at = pdf.find(b'stream', start)
+        end_at = pdf.find(b'endobj', start)
+        if stream_at != -1 and stream_at < end_at:
+            head = pdf[start:stream_at]
+            length = int(re.search(rb'/Length\s+(\d+)', head).group(1))
+            data_start = stream_at + len(b'stream')
+            data_start += 2 if pdf[data_start:data_start + 2] == b'\r\n' else 1
+            yield number, head, pdf[data_start:data_start + length]
+        else:
+            yield number, pdf[start:end_at], None
+
+
+def merge_pdfs(pdfs):
+    """Concatenate the PDFs into one document.
+
+    ReportLab's single-xref PDFs are merged by hand: objects are renumbered
+    and objects without references (fonts, the logo image) that are
+    byte-identical across documents are written only once. If any input has
+    another layout (see pdf_cache.read_xref), pypdf merges them all.
+    """
+    try:
+        parsed = [(pdf,) + read_xref(pdf) for pdf in pdfs]
+    except ValueError as e:
+        print(f"Merging batch PDF with pypdf: {e}")
+        return _merge_with_pypdf(pdfs)
+
+    out = bytearray(b'%PDF-1.4\n%\x93\x8c\x8b\x9e\n')
+    offsets = {}
+    page_numbers = []
+    shared = {}
+    next_number = 3  # 1 = catalog, 2 = pages tree
+
+    def write(number, head, stream):
+        offsets[number] = len(out)
+        out.extend(f'{number} 0 obj'.encode())
+        out.extend(head)
+        if stream is not None:
+            out.extend(b'stream\n')
+            out.extend(stream)
+            out.extend(b'\nendstream\n')
+        out.extend(b'endobj\n')
+
+    for pdf, _, object_offsets, trailer in parsed:
+        objects = list(_objects(pdf, object_offsets))
+        skip = {int(n) for n in re.findall(rb'/(?:Root|Info)\s+(\d+)\s+0\s+R', trailer)}
+
+        mapping = {}
+        for number, head, stream in objects:
+            if number in skip or re.search(rb'/Type\s*/Pages\b', head):
+                continue
+            if not _REF.search(head):
+                key = (head, stream)
+                if key in shared:
+                    mapping[number] = shared[key]
+                    continue
+                shared[key] = next_number
+            mapping[number] = next_number
+            next_number += 1
+
+        for number, head, stream in objects:
+            new_number = mapping.get(number)
+            if new_number is None or new_number in offsets:
+                continue
+            head = _REF.sub(lambda m: f'{mapping.get(int(m.group(1)), 0)} 0 R'.encode(), head)
+            if re.search(rb'/Type\s*/Page\b', head):
+                head = re.sub(rb'/Parent\s+\d+\s+0\s+R', b'/Parent 2 0 R', head)
+                page_numbers.append(new_number)
+            write(new_number, head, stream)
+
+    kids = ' '.join(f'{n} 0 R' for n in page_numbers)
+    write(1, b'\n<< /Type /Catalog /Pages 2 0 R >>\n', None)
+    write(2, f'\n<< /Type /Pages /Count {len(page_numbers)} /Kids [ {kids} ] >>\n'.encode(), None)
+
+    size = next_number
+    xref_offset = len(out)
+    out.extend(f'xref\n0 {size}\n0000000000 65535 f \n'.encode())
+    for number in range(1, size):
+        out.extend(f'{offsets.get(number, 0):010d} 00000 {"n" if number in offsets else "f"} \n'.encode())
+    out.extend(f'trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode())
+    return bytes(out)
+
+
+def _merge_with_pypdf(pdfs):
+    """Slower merge for PDFs not in ReportLab's layout, with identical objects written once"""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for pdf in pdfs:
+        writer.append(PdfReader(io.BytesIO(pdf)))
+    writer.compress_identical_objects()
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
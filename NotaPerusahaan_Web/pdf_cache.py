@@ -0,0 +1,270 @@
+"""Cache of rendered nota PDFs keyed by a hash of the receipt and its items.
+
+A saved nota never changes, so its page is rendered once without the
+"Printed By" footer. The footer is added per download as a small PDF
+incremental update (a new content stream appended to the page), leaving the
+cached bytes untouched. The update is written by hand for the single xref
+table ReportLab produces; a cached page in any other layout is rendered in
+full instead.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+from receipt_pdf import (
+    render_receipt_pdf, footer_text,
+    FOOTER_FONT, FOOTER_FONT_SIZE, FOOTER_RIGHT_MARGIN
+)
+
+# Bump whenever the layout in receipt_pdf.py changes so old entries are ignored
+RENDER_VERSION = 1
+
+CachedPDF = namedtuple('CachedPDF', 'body footer_y')
+
+
+def content_hash(receipt, items):
+    """Stable hash of everything that ends up on the printed page"""
+    receipt = {k: v for k, v in receipt.items() if k != 'items'}
+    payload = json.dumps(
+        {'version': RENDER_VERSION, 'receipt': receipt, 'items': items},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PDFCache:
+    """LRU of rendered PDFs bounded by total bytes, with an optional disk tier"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.counters = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _disk_path(self, key, ext):
+        return os.path.join(self.disk_dir, f"{key}.{ext}")
+
+    def _remember(self, key, entry):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body)
+            if len(entry.body) > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+                self.counters['evictions'] += 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            self.counters['disk_hits' if entry else 'misses'] += 1
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key, 'json')) as f:
+                meta = json.load(f)
+            with open(self._disk_path(key, 'pdf'), 'rb') as f:
+                return CachedPDF(f.read(), meta['footer_y'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        try:
+            # Write the PDF first and the metadata last, each via rename, so a
+            # reader never sees a half written entry
+            for ext, data in (('pdf', entry.body), ('json', json.dumps({'footer_y': entry.footer_y}).encode())):
+                fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir)
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._disk_path(key, ext))
+        except OSError as e:
+            print(f"Error writing PDF cache entry: {e}")
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+def render_page(receipt, items):
+    """The nota page without footer as a CachedPDF"""
+    buffer, footer_y = render_receipt_pdf(receipt, items)
+    return CachedPDF(buffer.getvalue(), footer_y)
+
+
+def render_cached(cache, receipt, items, executor=None, run=None):
+    """Return ``(key, CachedPDF)`` for a receipt, rendering it on a cache miss.
+
+    With an ``executor`` the page is rendered there, off the request thread.
+    ``run(render)`` wraps the render of a miss (the app passes its render
+    pool, see render_pool.py); cache hits never wait for it.
+    """
+    key = content_hash(receipt, items)
+    entry = cache.get(key)
+    if entry is None:
+        def render():
+            if executor is None:
+                return render_page(receipt, items)
+            return executor.submit(render_page, receipt, items).result()
+
+        entry = render() if run is None else run(render)
+        cache.put(key, entry)
+    return key, entry
+
+
+_STARTXREF = re.compile(rb'startxref\s+(\d+)\s+%%EOF\s*$')
+_TRAILER = re.compile(rb'trailer\s*<<(.*?)>>\s*startxref', re.S)
+
+
+def _ref(pattern, data):
+    match = re.search(pattern + rb'\s+(\d+)\s+0\s+R', data)
+    if not match:
+        raise ValueError(f"PDF entry {pattern!r} not found")
+    return int(match.group(1))
+
+
+def read_xref(pdf):
+    """``(xref_offset, {object number: offset}, trailer)`` of a PDF with one classic xref table.
+
+    That is the layout ReportLab writes, and the only one the hand-written
+    updates here understand. Anything else (an incremental update, xref or
+    object streams, offsets that do not point at their objects) raises
+    ValueError, so the caller can take a path that does not parse the file.
+    """
+    match = _STARTXREF.search(pdf)
+    if not pdf.startswith(b'%PDF-') or match is None:
+        raise ValueError('Not a PDF')
+    xref_offset = int(match.group(1))
+    if pdf.count(b'startxref') != 1 or not pdf.startswith(b'xref', xref_offset):
+        raise ValueError('PDF has more than one revision or no xref table')
+    trailer = _TRAILER.search(pdf, xref_offset)
+    if trailer is None or re.search(rb'/(?:Prev|XRefStm)\b', trailer.group(1)):
+        raise ValueError('PDF has more than one revision')
+    if re.search(rb'/Type\s*/(?:ObjStm|XRef)\b', pdf):
+        raise ValueError('PDF uses object or xref streams')
+
+    lines = pdf[xref_offset:].split(b'\n', 2)
+    first, count = (int(n) for n in lines[1].split())
+    size = re.search(rb'/Size\s+(\d+)', trailer.group(1))
+    if first != 0 or size is None or int(size.group(1)) != count or len(lines[2]) < count * 20:
+        raise ValueError('PDF xref table has more than one section')
+    offsets = {}
+    for i in range(count):
+        entry = lines[2][i * 20:(i + 1) * 20]
+        if entry[17:18] == b'n':
+            offset = int(entry[:10])
+            if not pdf.startswith(f'{i} 0 obj'.encode(), offset):
+                raise ValueError(f'PDF xref entry {i} does not point at its object')
+            offsets[i] = offset
+    return xref_offset, offsets, trailer.group(1)
+
+
+def _object(body, offsets, number):
+    start = offsets[number]
+    end = body.index(b'endobj', start)
+    return body[start:end]
+
+
+def _pdf_string(text):
+    raw = text.encode('cp1252', 'replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def add_footer(entry, username, timestamp):
+    """Return the cached page with the "Printed By" line appended as an incremental update.
+
+    Raises ValueError for a page it cannot update (see ``read_xref``); the
+    caller renders the whole page instead.
+    """
+    body = entry.body
+    xref_offset, offsets, trailer = read_xref(body)
+
+    size = int(re.search(rb'/Size\s+(\d+)', trailer).group(1))
+    root = _ref(rb'/Root', trailer)
+    pages = _ref(rb'/Pages', _object(body, offsets, root))
+    page_number = _ref(rb'/Kids\s*\[', _object(body, offsets, pages))
+    page = _object(body, offsets, page_number)
+    if not re.search(rb'/Type\s*/Page\b', page):
+        raise ValueError('First /Kids entry is not a page')
+    contents = _ref(rb'/Contents', page)
+
+    # Find the resource name ReportLab gave the footer font on this page
+    font_dict = _object(body, offsets, _ref(rb'/Font', page))
+    font_name = None
+    for name, number in re.findall(rb'/(\w+)\s+(\d+)\s+0\s+R', font_dict):
+        if re.search(rb'/BaseFont\s*/' + FOOTER_FONT.encode() + rb'\s', _object(body, offsets, int(number))):
+            font_name = name
+            break
+    if font_name is None:
+        raise ValueError(f"Font {FOOTER_FONT} not used on the cached page")
+
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    text = footer_text(username, timestamp)
+    width, _ = A4
+    x = width - stringWidth(text, FOOTER_FONT, FOOTER_FONT_SIZE) - FOOTER_RIGHT_MARGIN
+    stream = (
+        b'q 0.501961 0.501961 0.501961 rg BT /' + font_name +
+        f' {FOOTER_FONT_SIZE} Tf {x:.4f} {entry.footer_y:.4f} Td ('.encode() +
+        _pdf_string(text) + b') Tj ET Q\n'
+    )
+
+    stream_number = size
+    new_page = page.split(b'obj', 1)[1].replace(
+        f'/Contents {contents} 0 R'.encode(),
+        f'/Contents [ {contents} 0 R {stream_number} 0 R ]'.encode(), 1
+    )
+
+    update = bytearray(body)
+    if not update.endswith(b'\n'):
+        update += b'\n'
+    new_offsets = {}
+    new_offsets[page_number] = len(update)
+    update += f'{page_number} 0 obj'.encode() + new_page + b'endobj\n'
+    new_offsets[stream_number] = len(update)
+    update += f'{stream_number} 0 obj\n<< /Length {len(stream)} >>\nstream\n'.encode() + stream + b'endstream\nendobj\n'
+
+    new_xref = len(update)
+    update += b'xref\n0 1\n0000000000 65535 f \n'
+    for number in sorted(new_offsets):
+        update += f'{number} 1\n{new_offsets[number]:010d} 00000 n \n'.encode()
+
+    id_match = re.search(rb'/ID\s*(\[[^\]]*\])', trailer)
+    info_match = re.search(rb'/Info\s+\d+\s+0\s+R', trailer)
+    update += f'trailer\n<< /Size {stream_number + 1} /Root {root} 0 R /Prev {xref_offset}'.encode()
+    if info_match:
+        update += b' ' + info_match.group(0)
+    if id_match:
+        update += b' /ID ' + id_match.group(1)
+    update += f' >>\nstartxref\n{new_xref}\n%%EOF\n'.encode()
+    return bytes(update)
@@ -0,0 +1,262 @@
+"""On-demand sampling profiler: where a slow route spends its Python time.
+
+Off until switched on (PROFILER_ENABLED or POST /api/admin/profiler).
+When on, a ``rate`` fraction of requests and background jobs is picked at
+random. While a picked request runs, one sampler thread reads its stack
+with ``sys._current_frames()`` every ``interval`` seconds and counts it
+under the route; render threads working for a picked request are counted
+under the same route (``bind``). A request that is not picked costs one
+``random()`` call, and with nothing picked in flight the sampler thread
+sleeps on an event.
+
+Stacks are kept collapsed ("route;frame;frame count", the input format of
+flamegraph.pl and speedscope) and can be drawn as an SVG flame graph. The
+sampler times its own work, so the share of wall time it took while the
+profiler was on is reported next to the stacks. Like /metrics, each
+worker process profiles only the requests it serves.
+"""
+import html
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from functools import wraps
+
+# Stacks past PROFILER_MAX_STACKS distinct ones are counted here
+OTHER_STACKS = '[other stacks]'
+
+
+class Profiler:
+    """Stack sampler for a random ``rate`` fraction of requests"""
+
+    def __init__(self, rate=0.05, interval=0.005, max_stacks=20000, enabled=False):
+        self.rate = rate
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._active = {}  # thread ident -> label
+        self._names = {}  # code object -> frame name
+        self._thread = None
+        self._pid = None
+        self._enabled_at = 0.0
+        self.reset()
+        if enabled:
+            self.configure(enabled=True)
+
+    def configure(self, enabled=None, rate=None, interval=None):
+        """Switch sampling on or off and change the sampled fraction or interval (seconds)"""
+        with self._lock:
+            if rate is not None:
+                self.rate = min(1.0, max(0.0, float(rate)))
+            if interval is not None:
+                self.interval = max(0.001, float(interval))
+            if enabled is not None and bool(enabled) != self.enabled:
+                now = time.perf_counter()
+                if enabled:
+                    self._enabled_at = now
+                else:
+                    self._enabled_seconds += now - self._enabled_at
+                self.enabled = bool(enabled)
+
+    def reset(self):
+        """Drop the collected stacks and counters"""
+        with self._lock:
+            self._stacks = {}  # label -> {collapsed stack: samples}
+            self._requests = {}  # label -> sampled requests
+            self._distinct = 0
+            self._samples = 0
+            self._sampled_seconds = 0.0
+            self._sampler_seconds = 0.0
+            self._enabled_seconds = 0.0
+            self._enabled_at = time.perf_counter()
+
+    def begin(self, label):
+        """Sample the current thread as ``label`` if this request is picked; pass the result to ``end``"""
+        if not self.enabled or random.random() >= self.rate:
+            return None
+        return self._track(label, count=True)
+
+    def end(self, token):
+        if token is None:
+            return
+        ident, started, count = token
+        with self._lock:
+            self._active.pop(ident, None)
+            if count:
+                self._sampled_seconds += time.perf_counter() - started
+            if not self._active:
+                self._wake.clear()
+
+    def sampled(self, label):
+        """Decorator sampling a ``rate`` fraction of the calls as ``label`` (background jobs)"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                token = self.begin(label)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.end(token)
+            return wrapper
+        return decorator
+
+    def bind(self, fn):
+        """``fn``, sampled under this thread's label wherever it runs when this thread is being sampled"""
+        label = self._active.get(threading.get_ident())
+        if label is None:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = self._track(label, count=False)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.end(token)
+        return wrapper
+
+    def _track(self, label, count):
+        ident = threading.get_ident()
+        with self._lock:
+            if ident in self._active:
+                return None
+            self._active[ident] = label
+            if count:
+                self._requests[label] = self._requests.get(label, 0) + 1
+            # A forked worker inherits the object but not the thread
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+                self._thread.start()
+            self._wake.set()
+        return ident, time.perf_counter(), count
+
+    def _sample_loop(self):
+        while True:
+            self._wake.wait()
+            started = time.perf_counter()
+            with self._lock:
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            stacks = [(label, self._collapse(frames[ident])) for ident, label in active if ident in frames]
+            del frames
+            with self._lock:
+                for label, stack in stacks:
+                    counts = self._stacks.setdefault(label, {})
+                    if stack not in counts:
+                        if self._distinct >= self.max_stacks:
+                            stack = OTHER_STACKS
+                        else:
+                            self._distinct += 1
+                    counts[stack] = counts.get(stack, 0) + 1
+                    self._samples += 1
+                self._sampler_seconds += time.perf_counter() - started
+            time.sleep(self.interval)
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            name = self._names.get(code)
+            if name is None:
+                qualname = getattr(code, 'co_qualname', code.co_name)
+                name = f"{os.path.basename(code.co_filename)}:{qualname}".replace(';', ':')
+                self._names[code] = name
+            names.append(name)
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names)
+
+    def stacks(self, label=None):
+        """{collapsed stack: samples}, rooted at the route label; only ``label``'s when given"""
+        with self._lock:
+            return {
+                f'{route};{stack}': count
+                for route, counts in self._stacks.items() if label is None or route == label
+                for stack, count in counts.items()
+            }
+
+    def collapsed(self, label=None):
+        """Collapsed stacks as text, one ``stack samples`` line each (flamegraph.pl, speedscope)"""
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.stacks(label).items()))
+
+    def stats(self):
+        with self._lock:
+            enabled_seconds = self._enabled_seconds
+            if self.enabled:
+                enabled_seconds += time.perf_counter() - self._enabled_at
+            return {
+                'enabled': self.enabled,
+                'rate': self.rate,
+                'interval_ms': round(self.interval * 1000, 3),
+                'in_flight': len(self._active),
+                'samples': self._samples,
+                'stacks': self._distinct,
+                'sampled_requests': sum(self._requests.values()),
+                'sampled_seconds': round(self._sampled_seconds, 3),
+                'sampler_seconds': round(self._sampler_seconds, 4),
+                # Sampler time as a share of the wall time the profiler was on,
+                # and of the time the sampled requests took (their worst case)
+                'overhead_ratio': round(self._sampler_seconds / enabled_seconds, 5) if enabled_seconds else 0.0,
+                'sampled_overhead_ratio': round(self._sampler_seconds / self._sampled_seconds, 5)
+                if self._sampled_seconds else 0.0,
+                'routes': {
+                    label: {'requests': self._requests.get(label, 0), 'samples': sum(self._stacks.get(label, {}).values())}
+                    for label in sorted(set(self._requests) | set(self._stacks))
+                },
+            }
+
+
+def flamegraph_svg(stacks, title='Flame graph', width=1200, row_height=16):
+    """SVG flame graph of ``{collapsed stack: samples}``; hover a frame for its share of samples"""
+    root = [0, {}]  # samples, children by name
+    depth = 0
+    for stack, count in stacks.items():
+        node = root
+        node[0] += count
+        frames = stack.split(';')
+        depth = max(depth, len(frames))
+        for name in frames:
+            node = node[1].setdefault(name, [0, {}])
+            node[0] += count
+
+    total = root[0] or 1
+    top = 2 * row_height
+    height = top + (depth + 1) * row_height
+    scale = (width - 20) / total
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">',
+        f'<rect width="100%" height="100%" fill="#fdfdf5"/>',
+        f'<text x="10" y="{row_height}" font-size="13">{html.escape(title)} ({root[0]} samples)</text>',
+    ]
+    # Root at the bottom, callees stacked above their callers
+    pending = [(name, node, 10.0, 0) for name, node in sorted(root[1].items())]
+    while pending:
+        name, node, x, level = pending.pop()
+        w = node[0] * scale
+        if w < 0.5:
+            continue
+        y = height - (level + 1) * row_height
+        hue = zlib.crc32(name.split(':', 1)[0].encode()) % 60
+        label = html.escape(name)
+        text = ''
+        chars = int((w - 4) / 7)
+        if chars >= 3:
+            shown = name if len(name) <= chars else name[:chars - 2] + '..'
+            text = f'<text x="{x + 2:.1f}" y="{y + row_height - 4}">{html.escape(shown)}</text>'
+        parts.append(
+            f'<g><title>{label} ({node[0]} samples, {node[0] * 100 / total:.2f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" '
+            f'fill="hsl({hue},85%,{55 + level % 3 * 5}%)"/>{text}</g>'
+        )
+        child_x = x
+        for child_name, child in sorted(node[1].items()):
+            pending.append((child_name, child, child_x, level + 1))
+            child_x += child[0] * scale
+    parts.append('</svg>')
+    return '\n'.join(parts)
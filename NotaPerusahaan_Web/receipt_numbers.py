@@ -0,0 +1,54 @@
+"""Receipt number allocation backed by the per-company counter in Supabase.
+
+Numbers are reserved with one atomic upsert on ``receipt_counters`` (see
+setup_receipt_counters.sql), so two cashiers can never receive the same
+number and the cost does not grow with the number of saved receipts.
+"""
+from config import Config
+
+
+class ReceiptNumberError(ValueError):
+    """Raised for an invalid company code or block size"""
+
+
+def format_receipt_number(company_code, value):
+    """Format: CH00001, CR00001, CP00001"""
+    return f"{company_code}{value:05d}"
+
+
+def parse_receipt_number(company_code, receipt_number):
+    """Inverse of format_receipt_number; returns None when the number does not belong to the company"""
+    if not receipt_number or not receipt_number.startswith(company_code):
+        return None
+    digits = receipt_number[len(company_code):]
+    return int(digits) if digits.isdigit() else None
+
+
+def validate_reservation(company_code, count):
+    if company_code not in Config.COMPANIES:
+        raise ReceiptNumberError(f'Unknown company code: {company_code}')
+    if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+        raise ReceiptNumberError('count must be a positive integer')
+    if count > Config.RECEIPT_NUMBER_MAX_BLOCK:
+        raise ReceiptNumberError(f'count must not exceed {Config.RECEIPT_NUMBER_MAX_BLOCK}')
+
+
+def reserve_receipt_numbers(db, company_code, count=1):
+    """Reserve ``count`` consecutive receipt numbers for a company.
+
+    Returns the formatted numbers in order. Unused numbers from a reserved
+    block are simply skipped; they are never handed out twice.
+    """
+    validate_reservation(company_code, count)
+
+    response = db.rpc('reserve_receipt_numbers', {
+        'p_company_code': company_code,
+        'p_count': count
+    }).execute()
+    if not response.data:
+        raise RuntimeError('Failed to reserve receipt numbers')
+
+    block = response.data[0] if isinstance(response.data, list) else response.data
+    first_value = int(block['first_value'])
+    last_value = int(block['last_value'])
+    return [format_receipt_number(company_code, value) for value in range(first_value, last_value + 1)]
@@ -0,0 +1,197 @@
+"""PDF layout for a nota: two copies (original + copy) on one A4 page.
+
+ReportLab (and the logo assets built on it) is imported on the first
+render, not with this module, so starting the app does not load it.
+"""
+import io
+
+from metrics import PDF_RENDER_SECONDS
+
+# "Printed By" footer on the COPY receipt
+FOOTER_FONT = "Helvetica"
+FOOTER_FONT_SIZE = 7
+FOOTER_RIGHT_MARGIN = 50
+
+
+# Companies whose totals include PPN (VAT), and its rate
+PPN_COMPANIES = ('CH',)
+PPN_RATE = 0.11
+
+
+def footer_text(username, timestamp):
+    return f"Printed By: {username} | {timestamp}"
+
+
+def ppn_breakdown(company_code, total_amount):
+    """``(total before PPN, PPN)`` of a total that includes PPN, or None when the company has none"""
+    if company_code not in PPN_COMPANIES:
+        return None
+    subtotal = total_amount / (1 + PPN_RATE)
+    return subtotal, total_amount - subtotal
+
+
+def generate_receipt_pdf(receipt, items, username, timestamp):
+    """Generate PDF content for a receipt with 2 copies on 1 A4 page (like Excel template)"""
+    buffer, _ = render_receipt_pdf(receipt, items, footer=(username, timestamp))
+    return buffer
+
+
+@PDF_RENDER_SECONDS.time(kind='page')
+def render_receipt_pdf(receipt, items, footer=None):
+    """Draw the receipt page and return ``(buffer, footer_y)``.
+
+    ``footer`` is a ``(username, timestamp)`` pair for the "Printed By" line.
+    When it is None the line is left out and ``footer_y`` says where it
+    belongs, so it can be added afterwards (see pdf_cache.add_footer).
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.pdfgen import canvas
+    from pdf_assets import get_assets, LOGO_TOP_OFFSET
+
+    buffer = io.BytesIO()
+    layout = {'footer_y': None}
+    
+    # Create canvas for single A4 page
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    
+    # Company-specific styling
+    company_code = receipt['company_code']
+    ppn_totals = ppn_breakdown(company_code, receipt['total_amount'])
+    company_name = receipt['company_name']
+    total_amount = receipt['total_amount']
+    header = get_assets().header(company_code)
+    
+    # Function to add receipt content at specific Y position
+    def add_receipt_content(start_y, page_type=""):
+        # Add logo (CHASTE only) at top left, company name below it (rata kiri)
+        company_y = start_y - header.name_offset
+        if header.logo:
+            try:
+                header.logo.draw(c, 50, start_y - LOGO_TOP_OFFSET)
+            except Exception as e:
+                print(f"Error adding {company_code} logo: {e}")
+                company_y = start_y
+        
+        # Add company header (rata kiri dengan logo)
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(50, company_y, company_name)
+        c.setFont("Helvetica", 10)
+        c.drawString(50, company_y - 20, f"NOTA: {receipt['receipt_number']}")
+        c.drawString(50, company_y - 40, f"Tanggal: {receipt['date']}")
+        c.drawString(50, company_y - 60, f"Kepada Yth: {receipt['recipient']}")
+        
+        # Add address (with word wrapping and better spacing)
+        address = receipt.get('address', '')
+        address_lines = []
+        if address:
+            # Split address into lines if too long
+            words = address.split()
+            current_line = ""
+            
+            for word in words:
+                if len(current_line + word) < 60:  # Max characters per line
+                    current_line += word + " "
+                else:
+                    if current_line:
+                        address_lines.append(current_line.strip())
+                    current_line = word + " "
+            
+            if current_line:
+                address_lines.append(current_line.strip())
+            
+            # Draw address lines with better spacing
+            y_pos = start_y - 80
+            for line in address_lines:
+                c.drawString(50, y_pos, f"Alamat: {line}")
+                y_pos -= 18  # Better space between address lines
+        
+        # Add items table (better spacing) - adjust for address
+        y_position = start_y - 100 - (len(address_lines) * 18)
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(50, y_position, "No")
+        c.drawString(80, y_position, "Jenis Barang")
+        c.drawString(180, y_position, "Ukuran")
+        c.drawString(250, y_position, "Warna")
+        c.drawString(300, y_position, "Qty")
+        c.drawString(350, y_position, "Harga Satuan")
+        c.drawString(450, y_position, "Total")
+        
+        y_position -= 25  # Better space before items
+        c.setFont("Helvetica", 8)
+        if items:
+            for i, item in enumerate(items, 1):
+                c.drawString(50, y_position, str(i))
+                c.drawString(80, y_position, str(item['item_type'])[:20])  # Allow longer names
+                c.drawString(180, y_position, str(item['size'])[:15])
+                c.drawString(250, y_position, str(item['color'])[:15])
+                c.drawString(300, y_position, str(item['quantity']))
+                c.drawString(350, y_position, f"Rp {item['unit_price']:,.0f}")
+                c.drawString(450, y_position, f"Rp {item['total_price']:,.0f}")
+                y_position -= 20  # Better space between items
+        
+        # Add totals (better formatting with more space)
+        y_position -= 30  # Better space before totals
+        c.setFont("Helvetica-Bold", 10)
+        if ppn_totals:
+            subtotal, ppn = ppn_totals
+            c.drawString(350, y_position, f"Total Sebelum PPN: Rp {subtotal:,.0f}")
+            y_position -= 25  # Better space between total lines
+            c.drawString(350, y_position, f"PPN (11%): Rp {ppn:,.0f}")
+            y_position -= 25  # Better space between total lines
+            c.drawString(350, y_position, f"Total + PPN: Rp {total_amount:,.0f}")
+        else:
+            c.drawString(350, y_position, f"Total: Rp {total_amount:,.0f}")
+        
+        # Add signature (controlled space to not exceed separator line)
+        y_position -= 40  # Controlled space before signature
+        c.setFont("Helvetica", 10)
+        c.drawString(50, y_position, "Hormat Kami,")
+        y_position -= 30  # Controlled space for signature line (enough room but not too much)
+        c.drawString(50, y_position, "_________________")
+        
+        
+        # Add "Printed By" only to the COPY receipt (bottom right corner)
+        if page_type == "COPY":
+            # Position at the very bottom right corner of copy receipt
+            printed_by_y = y_position - 20  # Below signature line
+            layout['footer_y'] = printed_by_y
+            if footer:
+                c.setFont(FOOTER_FONT, FOOTER_FONT_SIZE)
+                c.setFillColor(colors.grey)
+                # Right align the text
+                printed_by_text = footer_text(*footer)
+                text_width = c.stringWidth(printed_by_text, FOOTER_FONT, FOOTER_FONT_SIZE)
+                printed_by_x = width - text_width - FOOTER_RIGHT_MARGIN  # Right margin
+                c.drawString(printed_by_x, printed_by_y, printed_by_text)
+        
+        # Reset color back to black for next receipt
+        c.setFillColor(colors.black)
+    
+    # Calculate positions for 2 receipts on 1 A4 page (like Excel template)
+    receipt_height = 300  # Height needed for each receipt (controlled to avoid collision)
+    margin_top = 50  # More margin from top
+    spacing = 60  # Perbesar jarak antara nota 1 dan 2
+    
+    # Receipt 1: Original (top half) - with controlled margin to avoid collision
+    original_y = height - margin_top - 20  # Controlled extra margin for top receipt
+    add_receipt_content(original_y, "ORIGINAL")
+    
+    # No separator line between receipts
+    
+    # Receipt 2: Copy (bottom half) - with red watermark and proper spacing
+    copy_y = original_y - receipt_height - spacing - 10  # Controlled spacing to avoid collision
+    # Add red watermark
+    c.setFont("Helvetica-Bold", 60)
+    c.setFillColor(colors.red)
+    c.setFillAlpha(0.1)  # Slightly more visible
+    c.drawCentredString(width/2, copy_y - 120, "COPY")
+    c.setFillAlpha(1.0)  # Reset transparency
+    c.setFillColor(colors.black)
+    add_receipt_content(copy_y, "COPY")
+    
+    c.save()
+    buffer.seek(0)
+    
+    return buffer, layout['footer_y']
@@ -0,0 +1,24 @@
+-- Statistik database tanpa download semua baris
+-- Jalankan script ini di Supabase SQL Editor
+
+-- Per-company receipt/item counts and totals, computed inside Postgres so
+-- /api/stats gets a few small rows back instead of whole tables
+CREATE OR REPLACE FUNCTION receipt_stats()
+RETURNS TABLE (company_code VARCHAR, receipts_count BIGINT, items_count BIGINT, total_amount NUMERIC)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT r.company_code,
+           COUNT(*) AS receipts_count,
+           COALESCE(SUM(i.items_count), 0) AS items_count,
+           COALESCE(SUM(r.total_amount), 0) AS total_amount
+    FROM receipts r
+    LEFT JOIN (
+        SELECT receipt_id, COUNT(*) AS items_count FROM items GROUP BY receipt_id
+    ) i ON i.receipt_id = r.id
+    GROUP BY r.company_code;
+$$;
+
+GRANT EXECUTE ON FUNCTION receipt_stats() TO anon, authenticated;
+
+SELECT * FROM receipt_stats();
@@ -0,0 +1,49 @@
+-- Versi data nota untuk ETag/Last-Modified di /api/receipts dan /api/stats
+-- Jalankan script ini di Supabase SQL Editor
+
+-- One row per watched table. version goes up with every statement that
+-- writes to the table; updated_at is when that last happened. Items are
+-- only written together with their receipt (and deleted by the cascade),
+-- so the receipts row covers them too.
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+INSERT INTO table_versions (table_name, version) VALUES ('receipts', 0) ON CONFLICT (table_name) DO NOTHING;
+
+ALTER TABLE table_versions ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Allow public access to table_versions" ON table_versions;
+CREATE POLICY "Allow public access to table_versions" ON table_versions FOR ALL USING (true);
+
+-- Statement-level, so a bulk import or the delete of an export bumps the version once
+CREATE OR REPLACE FUNCTION bump_table_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE table_versions SET version = version + 1, updated_at = NOW() WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS receipts_version ON receipts;
+CREATE TRIGGER receipts_version
+AFTER INSERT OR UPDATE OR DELETE ON receipts
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+-- The write counter plus the newest created_at, in one round trip
+CREATE OR REPLACE FUNCTION receipts_watermark()
+RETURNS TABLE (version BIGINT, updated_at TIMESTAMP WITH TIME ZONE, last_created_at TIMESTAMP WITH TIME ZONE)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT v.version, v.updated_at, (SELECT MAX(r.created_at) FROM receipts r)
+    FROM table_versions v
+    WHERE v.table_name = 'receipts';
+$$;
+
+GRANT EXECUTE ON FUNCTION receipts_watermark() TO anon, authenticated;
+
+SELECT * FROM receipts_watermark();
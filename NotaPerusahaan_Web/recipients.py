@@ -0,0 +1,221 @@
+"""In-memory prefix index of recipients for the "Kepada Yth" autocomplete.
+
+Distinct recipients are kept in sorted arrays (one overall, one per
+company), so a prefix is a bisect range. Each recipient remembers how often
+it was used and the address on its latest nota. A prefix matching fewer
+than HEAVY_PREFIX recipients is answered by ranking its range; every
+broader prefix keeps its own top MAX_SUGGESTIONS, built with the index and
+updated in place by each insert, so no lookup ranks more than HEAVY_PREFIX
+recipients however long the history.
+"""
+import heapq
+import threading
+from bisect import bisect_left, insort
+
+MAX_SUGGESTIONS = 20
+
+# Prefixes matching at least this many recipients keep a maintained top list
+HEAVY_PREFIX = 256
+
+# Past the last key starting with a prefix
+_END = '\U0010ffff'
+
+
+def normalize(name):
+    """Lookup key: trimmed, single-spaced, case-folded"""
+    return ' '.join(str(name).split()).casefold()
+
+
+class _Usage:
+    __slots__ = ('name', 'address', 'count', 'last_used')
+
+    def __init__(self, name):
+        self.name = name
+        self.address = ''
+        self.count = 0
+        self.last_used = ''
+
+    def add(self, name, address, used_at):
+        self.count += 1
+        if used_at >= self.last_used:
+            self.last_used = used_at
+            self.name = name  # latest spelling wins
+            if address:
+                self.address = address
+
+    def rank(self):
+        return self.count, self.last_used
+
+    def public(self):
+        return {'recipient': self.name, 'address': self.address, 'count': self.count, 'last_used': self.last_used}
+
+
+def _promote(top, usage):
+    """Keep ``top`` the best MAX_SUGGESTIONS after ``usage`` ranked higher (ranks only grow)"""
+    if usage not in top:
+        if len(top) >= MAX_SUGGESTIONS:
+            if usage.rank() <= top[-1].rank():
+                return
+            top.pop()
+        top.append(usage)
+    top.sort(key=_Usage.rank, reverse=True)
+
+
+class RecipientIndex:
+    """Distinct recipients with usage counts and latest address, searchable by prefix"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._usage = {}  # (company or '', key) -> _Usage
+        self._keys = {}  # company or '' -> sorted list of keys
+        self._top = {}  # (company or '', prefix) -> top usages, for prefixes of HEAVY_PREFIX+ keys
+        self._pending = None  # inserts seen while a build is running
+
+    @staticmethod
+    def _record(usage_map, keys_map, recipient, address, company_code, used_at, keep_sorted):
+        """Count one nota; returns the key and the usages it touched, by scope"""
+        key = normalize(recipient or '')
+        if not key:
+            return None, {}
+        touched = {}
+        for scope in ('', company_code) if company_code else ('',):
+            usage = usage_map.get((scope, key))
+            if usage is None:
+                usage = usage_map[(scope, key)] = _Usage(recipient)
+                keys = keys_map.setdefault(scope, [])
+                if keep_sorted:
+                    insort(keys, key)
+                else:
+                    keys.append(key)
+            usage.add(recipient, address or '', used_at)
+            touched[scope] = usage
+        return key, touched
+
+    @staticmethod
+    def _build_top(usage_map, top_map, scope, keys, prefix, lo, hi):
+        """Top list of ``prefix`` (keys[lo:hi]), filling in its broad sub-prefixes on the way.
+
+        A sub-prefix's list stands in for all of its keys, so every key is
+        ranked once, under its narrowest broad prefix.
+        """
+        candidates = []
+        depth = len(prefix)
+        i = lo
+        if i < hi and keys[i] == prefix:
+            candidates.append(usage_map[(scope, keys[i])])
+            i += 1
+        while i < hi:
+            child = keys[i][:depth + 1]
+            end = bisect_left(keys, child + _END, i, hi)
+            if end - i >= HEAVY_PREFIX:
+                candidates.extend(RecipientIndex._build_top(usage_map, top_map, scope, keys, child, i, end))
+            else:
+                candidates.extend(usage_map[(scope, keys[j])] for j in range(i, end))
+            i = end
+        top = heapq.nlargest(MAX_SUGGESTIONS, candidates, key=_Usage.rank)
+        top_map[(scope, prefix)] = top
+        return top
+
+    def build(self, rows):
+        """Replace the index with ``rows`` (dicts with receipt_number, recipient, address, company_code, created_at).
+
+        The new index is built without holding the lock, so lookups and
+        inserts keep working meanwhile; inserts made during the build are
+        replayed on top of it unless the scan already counted their receipt.
+        """
+        with self._lock:
+            self._pending = []
+        usage_map, keys_map, top_map = {}, {}, {}
+        scanned = set()
+        try:
+            for row in rows:
+                scanned.add(row.get('receipt_number'))
+                self._record(
+                    usage_map, keys_map, row.get('recipient'), row.get('address'),
+                    row.get('company_code'), str(row.get('created_at') or ''), keep_sorted=False
+                )
+            for scope, keys in keys_map.items():
+                keys.sort()
+                if len(keys) >= HEAVY_PREFIX:
+                    self._build_top(usage_map, top_map, scope, keys, '', 0, len(keys))
+        finally:
+            with self._lock:
+                pending, self._pending = self._pending, None
+                if not self._ready.is_set() or usage_map:
+                    self._usage, self._keys, self._top = usage_map, keys_map, top_map
+                    for receipt_number, args in pending:
+                        if receipt_number is None or receipt_number not in scanned:
+                            self._add_locked(*args)
+                self._ready.set()
+
+    def add(self, recipient, address, company_code, used_at, receipt_number=None):
+        """Record one more nota for ``recipient`` (called after each insert)"""
+        args = (recipient, address, company_code, str(used_at or ''))
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((receipt_number, args))
+            self._add_locked(*args)
+
+    def _add_locked(self, *args):
+        key, touched = self._record(self._usage, self._keys, *args, keep_sorted=True)
+        for scope, usage in touched.items():
+            keys = self._keys[scope]
+            for end in range(len(key) + 1):
+                prefix = key[:end]
+                top = self._top.get((scope, prefix))
+                if top is not None:
+                    _promote(top, usage)
+                    continue
+                lo = bisect_left(keys, prefix)
+                hi = bisect_left(keys, prefix + _END, lo)
+                if hi - lo < HEAVY_PREFIX:
+                    break  # longer prefixes match fewer still
+                # Just became broad: rank it once, then keep it up to date
+                self._top[(scope, prefix)] = heapq.nlargest(
+                    MAX_SUGGESTIONS, (self._usage[(scope, keys[i])] for i in range(lo, hi)), key=_Usage.rank
+                )
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def suggest(self, prefix, company=None, limit=10):
+        """Top ``limit`` recipients starting with ``prefix``: most used first, then most recent"""
+        scope = company or ''
+        prefix = normalize(prefix)
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        with self._lock:
+            best = self._top.get((scope, prefix))
+            if best is None:
+                keys = self._keys.get(scope, [])
+                lo = bisect_left(keys, prefix)
+                hi = bisect_left(keys, prefix + _END, lo)
+                best = heapq.nlargest(limit, (self._usage[(scope, keys[i])] for i in range(lo, hi)), key=_Usage.rank)
+            return [usage.public() for usage in best[:limit]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready.is_set(),
+                'recipients': len(self._keys.get('', [])),
+                'broad_prefixes': len(self._top),
+            }
+
+
+def load_recipients(index, store, archive=None):
+    """Build ``index`` from every receipt in ``store`` (and the archive, if any)"""
+    columns = ('id', 'receipt_number', 'recipient', 'address', 'company_code', 'created_at')
+
+    def rows():
+        yield from store.iter_rows('receipts', columns=columns)
+        if archive is not None and archive.has_data():
+            yield from archive.iter_receipts(columns)
+
+    try:
+        index.build(rows())
+    except Exception as e:
+        print(f"Error building recipient index: {e}")
@@ -0,0 +1,96 @@
+"""Admission control for PDF rendering.
+
+ReportLab work is CPU-bound; rendered on the request threads, a burst of
+print clicks occupies every thread and slows cheap routes like /login and
+/api/stats. Renders instead go through a small dedicated thread pool with
+a bounded queue in front of it. A request is turned away at once (503 with
+Retry-After) when the queue is full or its user already has
+``per_user`` renders in flight, rather than waiting behind everyone else.
+"""
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import PDF_QUEUE_WAIT_SECONDS, PDF_REJECTED
+
+
+class PoolFull(Exception):
+    """The render queue (or the user's share of it) is full"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f'PDF render queue is full ({reason})')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RenderPool:
+    """``workers`` render threads, at most ``max_queue`` renders waiting for them"""
+
+    def __init__(self, workers=1, max_queue=16, per_user=2):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.per_user = max(1, per_user)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pdf-render')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._by_user = {}
+        self._rejected = 0
+        # Moving average of render time, for Retry-After
+        self._average_seconds = 0.2
+
+    def _admit(self, user):
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                reason = 'queue_full'
+            elif self._by_user.get(user, 0) >= self.per_user:
+                reason = 'user_limit'
+            else:
+                self._in_flight += 1
+                self._by_user[user] = self._by_user.get(user, 0) + 1
+                return
+            self._rejected += 1
+            retry_after = max(1, math.ceil(self._average_seconds * (self._in_flight - self.workers + 1) / self.workers))
+        PDF_REJECTED.inc(reason=reason)
+        raise PoolFull(reason, retry_after)
+
+    def _release(self, user):
+        with self._lock:
+            self._in_flight -= 1
+            self._by_user[user] -= 1
+            if not self._by_user[user]:
+                del self._by_user[user]
+
+    def run(self, user, kind, fn, *args):
+        """Run ``fn(*args)`` on a render thread and return its result; raises PoolFull"""
+        self._admit(user)
+        queued_at = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            PDF_QUEUE_WAIT_SECONDS.observe(started - queued_at, kind=kind)
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                seconds = time.perf_counter() - started
+                with self._lock:
+                    self._running -= 1
+                    self._average_seconds = 0.8 * self._average_seconds + 0.2 * seconds
+
+        try:
+            return self._executor.submit(task).result()
+        finally:
+            self._release(user)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'running': self._running,
+                'queued': self._in_flight - self._running,
+                'capacity': self.workers + self.max_queue,
+                'rejected': self._rejected,
+            }
@@ -0,0 +1,659 @@
+"""Receipt queries shared by the API routes.
+
+Listing uses keyset pagination on (created_at, id) so every page costs the
+same no matter how deep the caller has paged, and only the requested
+columns travel over the wire.
+"""
+import base64
+import json
+import re
+from datetime import date, timedelta
+
+RECEIPT_FIELDS = (
+    'id', 'receipt_number', 'company_code', 'company_name', 'date',
+    'recipient', 'address', 'total_amount', 'created_at'
+)
+
+ITEM_FIELDS = (
+    'id', 'receipt_id', 'quantity', 'item_type', 'size', 'color',
+    'unit_price', 'total_price', 'created_at'
+)
+
+# PostgREST embedded resource: a receipt's items come back inside the receipt row
+EMBED_ITEMS = 'items(*)'
+
+# Columns matched by the free-text ``q`` filter
+SEARCH_FIELDS = ('receipt_number', 'recipient', 'company_name')
+
+# Most words accepted in one /api/search query
+MAX_SEARCH_TERMS = 8
+
+# Searches matching more receipts than this come back newest first instead of
+# by relevance: their words occur nearly everywhere, so scoring every match
+# costs the most and separates them the least
+SEARCH_RANK_LIMIT = 2000
+
+
+class QueryError(ValueError):
+    """Raised for invalid list parameters (bad cursor, unknown field, ...)"""
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing just after ``row`` in (created_at desc, id desc) order"""
+    raw = json.dumps([row['created_at'], row['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, receipt_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(created_at), int(receipt_id)
+    except Exception:
+        raise QueryError('Invalid cursor')
+
+
+def parse_fields(fields):
+    """Validate a comma separated ``fields=`` projection; id and created_at are always included"""
+    if not fields:
+        return list(RECEIPT_FIELDS)
+
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in RECEIPT_FIELDS]
+    if unknown:
+        raise QueryError(f"Unknown field(s): {', '.join(unknown)}")
+
+    columns = ['id', 'created_at']
+    columns += [f for f in requested if f not in columns]
+    return columns
+
+
+def _quote(value):
+    """Quote a value for use inside a PostgREST or=(...) filter"""
+    escaped = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def list_receipts(db, company=None, date_from=None, date_to=None, q=None,
+                  fields=None, limit=50, cursor=None, with_items=False):
+    """Return one page of receipts, newest first.
+
+    Returns ``(rows, next_cursor, total)``; ``next_cursor`` is None on the
+    last page and ``total`` is PostgREST's estimated count of matching rows.
+    With ``with_items`` each row carries its items, fetched in the same request.
+    """
+    columns = parse_fields(fields)
+    if with_items:
+        columns.append(EMBED_ITEMS)
+
+    query = db.table('receipts').select(','.join(columns), count='estimated')
+
+    if company:
+        query = query.eq('company_code', company)
+    if date_from:
+        query = query.gte('date', date_from)
+    if date_to:
+        query = query.lte('date', date_to)
+    if q:
+        pattern = _quote(f'*{q}*')
+        query = query.or_(','.join(f'{field}.ilike.{pattern}' for field in SEARCH_FIELDS))
+    if cursor:
+        created_at, receipt_id = decode_cursor(cursor)
+        query = query.or_(
+            f'created_at.lt.{_quote(created_at)},'
+            f'and(created_at.eq.{_quote(created_at)},id.lt.{receipt_id})'
+        )
+
+    if with_items:
+        query = query.order('id', foreign_table='items')
+
+    # Fetch one extra row to know whether another page exists
+    response = (
+        query.order('created_at', desc=True)
+        .order('id', desc=True)
+        .limit(limit + 1)
+        .execute()
+    )
+    rows = response.data if response.data else []
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1])
+
+    return rows, next_cursor, response.count
+
+
+# Whether create_receipt_with_items() is installed (create_receipt_rpc.sql).
+# Flipped to False the first time PostgREST reports the function missing.
+_receipt_rpc_available = True
+
+
+def create_receipt(db, receipt_data, items):
+    """Insert a receipt and all of its items; returns the new receipt id (or None).
+
+    Uses the create_receipt_with_items() RPC so receipt and items are written
+    in one round trip and one transaction. Without the RPC it falls back to
+    one receipt insert plus one bulk items insert, deleting the receipt again
+    if the items cannot be written.
+    """
+    global _receipt_rpc_available
+
+    if _receipt_rpc_available:
+        try:
+            response = db.rpc('create_receipt_with_items', {
+                'p_receipt': receipt_data,
+                'p_items': items
+            }).execute()
+            return response.data
+        except Exception as e:
+            # PGRST202: function not found in the schema cache
+            if getattr(e, 'code', None) != 'PGRST202':
+                raise
+            print("create_receipt_with_items() not found, falling back to bulk insert")
+            _receipt_rpc_available = False
+
+    receipt_response = db.table('receipts').insert(receipt_data).execute()
+    if not receipt_response.data:
+        return None
+
+    receipt_id = receipt_response.data[0]['id']
+
+    if items:
+        try:
+            db.table('items').insert([dict(item, receipt_id=receipt_id) for item in items]).execute()
+        except Exception:
+            # Do not leave a receipt without its items behind
+            db.table('receipts').delete().eq('id', receipt_id).execute()
+            raise
+
+    return receipt_id
+
+
+# Whether import_receipts() is installed (import_receipts_rpc.sql)
+_import_rpc_available = True
+
+
+def import_receipts(db, receipts):
+    """Insert a batch of receipts with their ``receipt['items']``, skipping existing receipt numbers.
+
+    Returns the receipt numbers that were inserted. The import_receipts()
+    RPC writes the batch in one transaction and moves the receipt counters
+    past the imported numbers. Without it the batch is one bulk insert of
+    receipts and one of items, deleting the receipts again if the items
+    cannot be written; the counters are then left alone.
+    """
+    global _import_rpc_available
+
+    if _import_rpc_available:
+        try:
+            response = db.rpc('import_receipts', {'p_receipts': receipts}).execute()
+            return [row['receipt_number'] for row in response.data or []]
+        except Exception as e:
+            if getattr(e, 'code', None) != 'PGRST202':
+                raise
+            print("import_receipts() not found, falling back to bulk inserts; "
+                  "run import_receipts_rpc.sql to keep the receipt counters in step")
+            _import_rpc_available = False
+
+    numbers = [receipt['receipt_number'] for receipt in receipts]
+    existing = set()
+    for chunk in _chunks(numbers, 200):
+        response = db.table('receipts').select('receipt_number').in_('receipt_number', chunk).execute()
+        existing.update(row['receipt_number'] for row in response.data or [])
+    new = [receipt for receipt in receipts if receipt['receipt_number'] not in existing]
+    if not new:
+        return []
+
+    response = db.table('receipts').insert([
+        {key: value for key, value in receipt.items() if key != 'items'} for receipt in new
+    ]).execute()
+    ids = {row['receipt_number']: row['id'] for row in response.data or []}
+    items = [
+        dict(item, receipt_id=ids[receipt['receipt_number']])
+        for receipt in new for item in receipt.get('items') or []
+    ]
+    if items:
+        try:
+            db.table('items').insert(items).execute()
+        except Exception:
+            # Do not leave receipts without their items behind
+            delete_receipts(db, list(ids.values()))
+            raise
+    return list(ids)
+
+
+# Whether receipt_stats() is installed (receipt_stats.sql)
+_stats_rpc_available = True
+
+
+def stats_rpc_available():
+    """False once fetch_stats has found that receipt_stats() is not installed"""
+    return _stats_rpc_available
+
+
+def fetch_stats(db, companies):
+    """Per-company receipt/item counts and totals without downloading rows.
+
+    Returns ``{company_code: {'receipts_count', 'items_count', 'total_amount'}}``.
+    Without the receipt_stats() RPC it falls back to count-only (HEAD)
+    requests; totals and per-company item counts are then None.
+    """
+    global _stats_rpc_available
+
+    stats = {code: {'receipts_count': 0, 'items_count': 0, 'total_amount': 0.0} for code in companies}
+
+    if _stats_rpc_available:
+        try:
+            response = db.rpc('receipt_stats', {}).execute()
+            for row in response.data or []:
+                stats[row['company_code']] = {
+                    'receipts_count': int(row['receipts_count']),
+                    'items_count': int(row['items_count']),
+                    'total_amount': float(row['total_amount'] or 0)
+                }
+            return stats
+        except Exception as e:
+            if getattr(e, 'code', None) != 'PGRST202':
+                raise
+            print("receipt_stats() not found, falling back to count-only queries")
+            _stats_rpc_available = False
+
+    for code in stats:
+        stats[code] = company_count(company_count_query(db, code).execute())
+    return stats
+
+
+def company_count_query(db, company_code):
+    """Count-only (HEAD) request for the receipts of one company"""
+    return db.table('receipts').select('id', count='exact', head=True).eq('company_code', company_code)
+
+
+def company_count(response):
+    """fetch_stats() entry for a company_count_query() response"""
+    return {'receipts_count': response.count or 0, 'items_count': None, 'total_amount': None}
+
+
+def search_terms(q):
+    """Lower-cased words of a search query; each one is matched as a prefix"""
+    terms = re.findall(r'\w+', (q or '').casefold())
+    if not terms:
+        raise QueryError('Search query is empty')
+    if len(terms) > MAX_SEARCH_TERMS:
+        raise QueryError(f'Search query has more than {MAX_SEARCH_TERMS} words')
+    return terms
+
+
+def matching_items(items, terms):
+    """The items with a word starting with one of ``terms``"""
+    matched = []
+    for item in items:
+        text = ' '.join(str(item.get(field) or '') for field in ('item_type', 'size', 'color'))
+        words = re.findall(r'\w+', text.casefold())
+        if any(word.startswith(term) for term in terms for word in words):
+            matched.append(item)
+    return matched
+
+
+# Whether search_receipts() is installed (search_index.sql)
+_search_rpc_available = True
+
+
+def search_receipts(db, q, company=None, date_from=None, date_to=None, limit=20, offset=0):
+    """Ranked full-text search over receipts and their items.
+
+    Returns ``(rows, total)``; every row carries a ``score`` (None when the
+    search was too broad to rank) and the ``matched_items`` that matched.
+    Without the search_receipts() RPC it falls back to an unranked ILIKE
+    over the receipt columns.
+    """
+    global _search_rpc_available
+
+    terms = search_terms(q)
+    if _search_rpc_available:
+        try:
+            response = db.rpc('search_receipts', {
+                'search_terms': terms,
+                'company_filter': company,
+                'date_from': date_from,
+                'date_to': date_to,
+                'max_rows': limit,
+                'skip': offset,
+                'rank_limit': SEARCH_RANK_LIMIT
+            }).execute()
+            rows = response.data or []
+            total = rows[0]['total_count'] if rows else 0
+            for row in rows:
+                row.pop('total_count', None)
+                row['matched_items'] = row.get('matched_items') or []
+            return rows, total
+        except Exception as e:
+            if getattr(e, 'code', None) != 'PGRST202':
+                raise
+            print("search_receipts() not found, falling back to ILIKE search")
+            _search_rpc_available = False
+
+    query = db.table('receipts').select('*', count='estimated')
+    if company:
+        query = query.eq('company_code', company)
+    if date_from:
+        query = query.gte('date', date_from)
+    if date_to:
+        query = query.lte('date', date_to)
+    pattern = _quote(f"*{' '.join(terms)}*")
+    query = query.or_(','.join(f'{field}.ilike.{pattern}' for field in SEARCH_FIELDS))
+    response = (
+        query.order('created_at', desc=True)
+        .order('id', desc=True)
+        .range(offset, offset + limit - 1)
+        .execute()
+    )
+    rows = response.data or []
+    for row in rows:
+        row['score'] = None
+        row['matched_items'] = []
+    return rows, response.count or 0
+
+
+def period_start(day, period):
+    """First day (``YYYY-MM-DD``) of the day/week/month containing ``day``; weeks start on Monday"""
+    day = date.fromisoformat(str(day)[:10])
+    if period == 'week':
+        day -= timedelta(days=day.weekday())
+    elif period == 'month':
+        day = day.replace(day=1)
+    return day.isoformat()
+
+
+def summarize_rollups(daily, daily_items, period, top_items=5):
+    """sales_report() rows from sales_daily and sales_daily_items rows"""
+    totals = {}
+    for row in daily:
+        key = (row['company_code'], period_start(row['day'], period))
+        entry = totals.setdefault(key, {'receipts_count': 0, 'items_count': 0, 'total_amount': 0.0})
+        entry['receipts_count'] += int(row['receipts_count'])
+        entry['items_count'] += int(row['items_count'])
+        entry['total_amount'] += float(row['total_amount'])
+
+    by_type = {}
+    for row in daily_items:
+        key = (row['company_code'], period_start(row['day'], period))
+        entry = by_type.setdefault(key, {}).setdefault(row['item_type'], {'items_count': 0, 'total_amount': 0.0})
+        entry['items_count'] += int(row['items_count'])
+        entry['total_amount'] += float(row['total_amount'])
+
+    rows = []
+    for (company_code, start), entry in sorted(totals.items()):
+        types = sorted(by_type.get((company_code, start), {}).items(), key=lambda t: (-t[1]['total_amount'], t[0]))
+        rows.append(dict(
+            entry, company_code=company_code, period_start=start,
+            top_item_types=[dict(counts, item_type=item_type) for item_type, counts in types[:top_items]]
+        ))
+    return rows
+
+
+# Whether sales_report() and replace_sales_rollups() are installed (sales_rollups.sql)
+_sales_rpc_available = True
+
+
+def sales_report(db, period='month', date_from=None, date_to=None, company=None, top_items=5):
+    """Per company and day/week/month: receipt and item counts, total and top item types.
+
+    Read from the sales_daily rollups (sales_rollups.sql). Without the
+    sales_report() RPC the daily rollup rows are downloaded and added up
+    here instead.
+    """
+    global _sales_rpc_available
+
+    if _sales_rpc_available:
+        try:
+            response = db.rpc('sales_report', {
+                'period': period,
+                'date_from': date_from,
+                'date_to': date_to,
+                'company_filter': company,
+                'top_items': top_items
+            }).execute()
+            rows = response.data or []
+            for row in rows:
+                row['receipts_count'] = int(row['receipts_count'])
+                row['items_count'] = int(row['items_count'])
+                row['total_amount'] = float(row['total_amount'] or 0)
+                row['top_item_types'] = [
+                    dict(entry, items_count=int(entry['items_count']), total_amount=float(entry['total_amount']))
+                    for entry in row.get('top_item_types') or []
+                ]
+            return rows
+        except Exception as e:
+            if getattr(e, 'code', None) != 'PGRST202':
+                raise
+            print("sales_report() not found, adding up the daily rollups here")
+            _sales_rpc_available = False
+
+    daily = _rollup_rows(db, 'sales_daily', date_from, date_to, company)
+    daily_items = _rollup_rows(db, 'sales_daily_items', date_from, date_to, company)
+    return summarize_rollups(daily, daily_items, period, top_items)
+
+
+def _rollup_rows(db, table, date_from=None, date_to=None, company=None, page_size=1000):
+    """Every row of a rollup table in the date range, one request per ``page_size`` rows"""
+    rows, offset = [], 0
+    while True:
+        query = db.table(table).select('*')
+        if company:
+            query = query.eq('company_code', company)
+        if date_from:
+            query = query.gte('day', date_from)
+        if date_to:
+            query = query.lte('day', date_to)
+        page = query.order('day').order('company_code').range(offset, offset + page_size - 1).execute().data or []
+        rows += page
+        if len(page) < page_size:
+            return rows
+        offset += page_size
+
+
+def replace_sales_rollups(db, daily, daily_items, max_receipt_id):
+    """Replace the sales rollups with rebuilt ones covering receipts up to ``max_receipt_id``"""
+    if not _sales_rpc_available:
+        raise QueryError('Run sales_rollups.sql in Supabase to rebuild the sales rollups')
+    db.rpc('replace_sales_rollups', {
+        'daily': daily,
+        'daily_items': daily_items,
+        'max_receipt_id': max_receipt_id or 0
+    }).execute()
+
+
+def count_items(db):
+    """Total number of items, using a count-only (HEAD) request"""
+    response = db.table('items').select('id', count='exact', head=True).execute()
+    return response.count or 0
+
+
+def latest_receipt_id(db):
+    """Highest receipt id currently stored, or None when the table is empty"""
+    response = db.table('receipts').select('id').order('id', desc=True).limit(1).execute()
+    return response.data[0]['id'] if response.data else None
+
+
+_watermark_rpc_available = True
+
+
+def receipts_watermark(db):
+    """Write counter and newest created_at of receipts (receipt_version.sql).
+
+    Without the RPC the version is made of the row count and the highest
+    id, which also changes on every insert and delete; ``updated_at`` is
+    then unknown.
+    """
+    global _watermark_rpc_available
+
+    if _watermark_rpc_available:
+        try:
+            response = db.rpc('receipts_watermark', {}).execute()
+            row = response.data[0] if response.data else {}
+            return {
+                'version': row.get('version') or 0,
+                'updated_at': row.get('updated_at'),
+                'last_created_at': row.get('last_created_at')
+            }
+        except Exception as e:
+            if getattr(e, 'code', None) != 'PGRST202':
+                raise
+            print("receipts_watermark() not found, falling back to count and latest id")
+            _watermark_rpc_available = False
+
+    response = db.table('receipts').select('id, created_at', count='exact').order('id', desc=True).limit(1).execute()
+    latest = response.data[0] if response.data else {}
+    return {
+        'version': f"{response.count or 0}.{latest.get('id', 0)}",
+        'updated_at': None,
+        'last_created_at': latest.get('created_at')
+    }
+
+
+def iter_rows(db, table, chunk_size=1000, max_receipt_id=None, columns=None):
+    """Yield every row of ``table`` in id order, ``chunk_size`` rows per request.
+
+    ``max_receipt_id`` limits the rows to receipts up to that id (for
+    ``receipts``) or items belonging to them (for ``items``), so rows written
+    while the iteration runs are left out. ``columns`` (which must include
+    ``id``) narrows the selected columns.
+    """
+    last_id = 0
+    while True:
+        response = rows_page_query(db, table, last_id, chunk_size, max_receipt_id, columns).execute()
+        rows = response.data or []
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def rows_page_query(db, table, last_id, chunk_size, max_receipt_id=None, columns=None):
+    """Request for the ``chunk_size`` rows of ``table`` after ``last_id`` (see iter_rows)"""
+    key = 'id' if table == 'receipts' else 'receipt_id'
+    query = db.table(table).select(','.join(columns) if columns else '*').gt('id', last_id)
+    if max_receipt_id is not None:
+        query = query.lte(key, max_receipt_id)
+    return query.order('id').limit(chunk_size)
+
+
+def delete_up_to(db, max_receipt_id):
+    """Delete receipts up to ``max_receipt_id`` and their items"""
+    db.table('items').delete().lte('receipt_id', max_receipt_id).execute()
+    db.table('receipts').delete().lte('id', max_receipt_id).execute()
+
+
+def iter_receipts(db, chunk_size=500, max_receipt_id=None, date_before=None):
+    """Yield receipts with their items in id order, as lists of up to ``chunk_size``.
+
+    ``max_receipt_id`` and ``date_before`` (exclusive, ``YYYY-MM-DD``) narrow
+    the selection; used by the archiver.
+    """
+    last_id = 0
+    while True:
+        response = receipts_page_query(db, last_id, chunk_size, max_receipt_id, date_before).execute()
+        rows = response.data or []
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def receipts_page_query(db, last_id, chunk_size, max_receipt_id=None, date_before=None):
+    """Request for the ``chunk_size`` receipts with items after ``last_id`` (see iter_receipts)"""
+    query = db.table('receipts').select(f'*,{EMBED_ITEMS}').gt('id', last_id)
+    if max_receipt_id is not None:
+        query = query.lte('id', max_receipt_id)
+    if date_before:
+        query = query.lt('date', date_before)
+    return query.order('id', foreign_table='items').order('id').limit(chunk_size)
+
+
+def delete_receipts(db, ids, id_chunk_size=200):
+    """Delete the given receipts and their items"""
+    for chunk in _chunks(list(ids), id_chunk_size):
+        db.table('items').delete().in_('receipt_id', chunk).execute()
+        db.table('receipts').delete().in_('id', chunk).execute()
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def get_receipt_with_items(db, receipt_id):
+    """One receipt with its items as ``receipt['items']``, in a single request (None if missing)"""
+    response = (
+        db.table('receipts')
+        .select(f'*,{EMBED_ITEMS}')
+        .eq('id', receipt_id)
+        .order('id', foreign_table='items')
+        .execute()
+    )
+    return response.data[0] if response.data else None
+
+
+def get_receipts_with_items(db, ids, id_chunk_size=200):
+    """Receipts with their items, one request per ``id_chunk_size`` ids, in the order of ``ids``"""
+    receipts = []
+    for chunk in id_chunks(ids, id_chunk_size):
+        receipts.extend(receipts_by_id_query(db, chunk).execute().data or [])
+    return in_id_order(receipts, ids)
+
+
+def id_chunks(ids, size=200):
+    """``ids`` split into lists of up to ``size``, small enough for one ``in.()`` filter"""
+    return list(_chunks(list(ids), size))
+
+
+def receipts_by_id_query(db, ids):
+    """Request for the given receipts with their items"""
+    return db.table('receipts').select(f'*,{EMBED_ITEMS}').in_('id', ids).order('id', foreign_table='items')
+
+
+def in_id_order(receipts, ids):
+    """Sort ``receipts`` into the order of ``ids``"""
+    position = {receipt_id: i for i, receipt_id in enumerate(ids)}
+    receipts.sort(key=lambda r: position.get(r['id'], len(position)))
+    return receipts
+
+
+def check_batch_size(ids, max_receipts):
+    if len(ids) > max_receipts:
+        raise QueryError(f'Maximum {max_receipts} receipts per batch')
+
+
+def fetch_receipts_for_batch(db, ids=None, company=None, date_from=None, date_to=None,
+                             max_receipts=500):
+    """Receipts (with ``receipt['items']``) selected by id list or company/date range.
+
+    Raises QueryError when neither ids nor a range is given, or when the
+    selection exceeds ``max_receipts``.
+    """
+    if ids:
+        check_batch_size(ids, max_receipts)
+        return get_receipts_with_items(db, ids)
+
+    if not (company or date_from or date_to):
+        raise QueryError('Provide ids or a company/date range')
+    query = db.table('receipts').select(f'*,{EMBED_ITEMS}')
+    if company:
+        query = query.eq('company_code', company)
+    if date_from:
+        query = query.gte('date', date_from)
+    if date_to:
+        query = query.lte('date', date_to)
+    response = (
+        query.order('id', foreign_table='items')
+        .order('date')
+        .order('id')
+        .limit(max_receipts + 1)
+        .execute()
+    )
+    receipts = response.data or []
+    if len(receipts) > max_receipts:
+        raise QueryError(f'Maximum {max_receipts} receipts per batch; narrow the range')
+    return receipts
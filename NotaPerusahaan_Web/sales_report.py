@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Sales per company and day, week or month for /api/reports/sales.
+
+Reports are read from the sales_daily rollups (sales_rollups.sql), which the
+database updates on every receipt and item insert, so a year of sales is at
+most 366 rows per company instead of a scan over every receipt and item.
+``rebuild_rollups`` recomputes them from scratch out of the live tables and
+the archive with pandas, one chunk of rows at a time, e.g. after rows were
+edited by hand. Without an archive, receipts removed by an export are gone
+from both, so a rebuild then forgets their sales.
+
+    python sales_report.py --period week --from 2025-01-01 --to 2025-12-31
+    python sales_report.py --rebuild
+"""
+import argparse
+import itertools
+import json
+import time
+from datetime import date
+
+from receipt_pdf import PPN_RATE, ppn_breakdown
+from repository import QueryError
+
+PERIODS = ('day', 'week', 'month')
+
+MAX_TOP_ITEMS = 20
+
+# Columns read while rebuilding the rollups
+RECEIPT_COLUMNS = ['id', 'company_code', 'date', 'total_amount']
+ITEM_COLUMNS = ['id', 'receipt_id', 'item_type', 'total_price']
+
+DAY_KEYS = ['company_code', 'day']
+ITEM_KEYS = ['company_code', 'day', 'item_type']
+
+
+def _money(value):
+    return round(float(value), 2)
+
+
+def _with_ppn(entry, company_code):
+    """``entry`` with its total split into total before PPN and PPN (0 for companies without PPN)"""
+    total = entry['total_amount']
+    subtotal, ppn = ppn_breakdown(company_code, total) or (total, 0.0)
+    entry.update(total_amount=_money(total), total_before_ppn=_money(subtotal), ppn=_money(ppn))
+    return entry
+
+
+def _check_date(value, name):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise QueryError(f'{name} must be a date (YYYY-MM-DD)')
+
+
+def build_report(store, companies, period='month', date_from=None, date_to=None, company=None, top_items=5):
+    """Sales report from the rollups: totals, PPN, counts and top item types per company and period.
+
+    ``companies`` maps company codes to names. Raises QueryError for invalid parameters.
+    """
+    if period not in PERIODS:
+        raise QueryError(f"period must be one of: {', '.join(PERIODS)}")
+    if not 0 <= top_items <= MAX_TOP_ITEMS:
+        raise QueryError(f'top must be between 0 and {MAX_TOP_ITEMS}')
+    if company and company not in companies:
+        raise QueryError(f'Unknown company: {company}')
+    date_from = _check_date(date_from, 'date_from')
+    date_to = _check_date(date_to, 'date_to')
+
+    report = {}
+    for code in ([company] if company else companies):
+        report[code] = {
+            'name': companies.get(code, code), 'receipts_count': 0, 'items_count': 0, 'total_amount': 0.0,
+            'periods': []
+        }
+    for row in store.sales_report(
+        period=period, date_from=date_from, date_to=date_to, company=company, top_items=top_items
+    ):
+        code = row['company_code']
+        entry = report.setdefault(code, {
+            'name': code, 'receipts_count': 0, 'items_count': 0, 'total_amount': 0.0, 'periods': []
+        })
+        entry['receipts_count'] += row['receipts_count']
+        entry['items_count'] += row['items_count']
+        entry['total_amount'] += row['total_amount']
+        entry['periods'].append(_with_ppn({
+            'period_start': str(row['period_start'])[:10],
+            'receipts_count': row['receipts_count'],
+            'items_count': row['items_count'],
+            'total_amount': row['total_amount'],
+            'top_item_types': [
+                dict(item, total_amount=_money(item['total_amount'])) for item in row['top_item_types']
+            ],
+        }, code))
+
+    for code, entry in report.items():
+        _with_ppn(entry, code)
+    return {
+        'period': period,
+        'date_from': date_from,
+        'date_to': date_to,
+        'ppn_rate': PPN_RATE,
+        'receipts_count': sum(entry['receipts_count'] for entry in report.values()),
+        'total_amount': _money(sum(entry['total_amount'] for entry in report.values())),
+        'companies': report,
+    }
+
+
+# Rebuilding
+
+def _frames(rows, columns, chunk_size):
+    """DataFrames of up to ``chunk_size`` of ``rows`` each"""
+    import pandas as pd
+
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield pd.DataFrame.from_records(chunk, columns=columns)
+
+
+def _receipt_days(receipts):
+    """Receipt keys with the day they count for"""
+    return receipts[RECEIPT_COLUMNS].assign(
+        day=receipts['date'].astype(str).str[:10],
+        total_amount=receipts['total_amount'].astype(float)
+    )
+
+
+def _daily(receipts):
+    return receipts.groupby(DAY_KEYS).agg(receipts_count=('id', 'size'), total_amount=('total_amount', 'sum'))
+
+
+def _daily_items(items, receipts):
+    """Item rollup of ``items``; items whose receipt is not in ``receipts`` are left out"""
+    items = items[ITEM_COLUMNS].merge(
+        receipts[['id', 'company_code', 'day']].rename(columns={'id': 'receipt_id'}), on='receipt_id'
+    )
+    return items.assign(total_price=items['total_price'].astype(float)).groupby(ITEM_KEYS).agg(
+        items_count=('id', 'size'), total_amount=('total_price', 'sum')
+    )
+
+
+def compute_rollups(store, archive=None, chunk_size=5000):
+    """Daily rollup rows recomputed from the live tables and the archive.
+
+    Returns ``(daily, daily_items, max_receipt_id)``: the rows cover live
+    receipts up to ``max_receipt_id`` and every archived receipt.
+    """
+    import pandas as pd
+
+    max_receipt_id = store.latest_receipt_id() or 0
+    chunks = list(_frames(store.iter_rows('receipts', chunk_size, max_receipt_id, RECEIPT_COLUMNS),
+                          RECEIPT_COLUMNS, chunk_size))
+    receipts = _receipt_days(pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=RECEIPT_COLUMNS))
+
+    daily, daily_items = [_daily(receipts)], []
+    for items in _frames(store.iter_rows('items', chunk_size, max_receipt_id, ITEM_COLUMNS), ITEM_COLUMNS, chunk_size):
+        daily_items.append(_daily_items(items, receipts))
+
+    if archive is not None:
+        for archived, archived_items in archive.iter_frames():
+            # Rows still live too (a failed delete after archiving) count once
+            archived = _receipt_days(archived[~archived['id'].isin(receipts['id'])])
+            daily.append(_daily(archived))
+            if not archived_items.empty:
+                daily_items.append(_daily_items(archived_items, archived))
+
+    daily = pd.concat(daily).groupby(level=DAY_KEYS).sum()
+    if daily_items:
+        daily_items = pd.concat(daily_items).groupby(level=ITEM_KEYS).sum()
+        items_count = daily_items.groupby(level=DAY_KEYS)['items_count'].sum()
+    else:
+        daily_items = pd.DataFrame(columns=['items_count', 'total_amount'])
+        items_count = pd.Series(dtype='int64')
+    daily['items_count'] = items_count.reindex(daily.index, fill_value=0).astype('int64')
+
+    daily['total_amount'] = daily['total_amount'].round(2)
+    daily_items['total_amount'] = daily_items['total_amount'].round(2)
+    return daily.reset_index().to_dict('records'), daily_items.reset_index().to_dict('records'), max_receipt_id
+
+
+def rebuild_rollups(store, archive=None, chunk_size=5000):
+    """Recompute the sales rollups and swap them in; returns a summary"""
+    start = time.perf_counter()
+    daily, daily_items, max_receipt_id = compute_rollups(store, archive, chunk_size)
+    store.replace_sales_rollups(daily, daily_items, max_receipt_id)
+    return {
+        'days': len(daily),
+        'item_rows': len(daily_items),
+        'receipts': sum(row['receipts_count'] for row in daily),
+        'items': sum(row['items_count'] for row in daily),
+        'max_receipt_id': max_receipt_id,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sales report per company, or rebuild the sales rollups')
+    parser.add_argument('--rebuild', action='store_true', help='recompute the rollups from all receipts')
+    parser.add_argument('--period', choices=PERIODS, default='month')
+    parser.add_argument('--from', dest='date_from')
+    parser.add_argument('--to', dest='date_to')
+    parser.add_argument('--company')
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    from config import Config
+    from storage import init_storage, get_archive
+
+    store = init_storage(vars(Config))
+    if store is None:
+        parser.error('Database not configured')
+
+    if args.rebuild:
+        result = rebuild_rollups(store, get_archive())
+        print(f"Rolled up {result['receipts']} receipts and {result['items']} items into "
+              f"{result['days']} company days in {result['seconds']:.1f}s")
+        return
+
+    try:
+        report = build_report(store, Config.COMPANIES, args.period, args.date_from, args.date_to,
+                              args.company, args.top)
+    except QueryError as e:
+        parser.error(str(e))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
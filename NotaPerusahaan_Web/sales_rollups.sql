@@ -0,0 +1,199 @@
+-- Rekap penjualan harian untuk /api/reports/sales
+-- Jalankan script ini di Supabase SQL Editor
+
+-- One row per company and day, and per company, day and item type. Kept up
+-- to date by the triggers below on every insert; week and month reports
+-- add up the daily rows, so a year is at most 366 rows per company.
+-- Export and archive delete receipts from the live tables, but the sales
+-- happened: the rollups keep them.
+CREATE TABLE IF NOT EXISTS sales_daily (
+    company_code VARCHAR(10) NOT NULL,
+    day DATE NOT NULL,
+    receipts_count BIGINT NOT NULL DEFAULT 0,
+    items_count BIGINT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(15,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (company_code, day)
+);
+
+CREATE TABLE IF NOT EXISTS sales_daily_items (
+    company_code VARCHAR(10) NOT NULL,
+    day DATE NOT NULL,
+    item_type VARCHAR(100) NOT NULL,
+    items_count BIGINT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(15,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (company_code, day, item_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sales_daily_day ON sales_daily(day);
+CREATE INDEX IF NOT EXISTS idx_sales_daily_items_day ON sales_daily_items(day);
+
+ALTER TABLE sales_daily ENABLE ROW LEVEL SECURITY;
+ALTER TABLE sales_daily_items ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Allow public access to sales_daily" ON sales_daily;
+CREATE POLICY "Allow public access to sales_daily" ON sales_daily FOR ALL USING (true);
+DROP POLICY IF EXISTS "Allow public access to sales_daily_items" ON sales_daily_items;
+CREATE POLICY "Allow public access to sales_daily_items" ON sales_daily_items FOR ALL USING (true);
+
+CREATE OR REPLACE FUNCTION sales_rollup_receipt()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO sales_daily (company_code, day, receipts_count, total_amount)
+    VALUES (NEW.company_code, NEW.date, 1, NEW.total_amount)
+    ON CONFLICT (company_code, day) DO UPDATE
+    SET receipts_count = sales_daily.receipts_count + 1,
+        total_amount = sales_daily.total_amount + excluded.total_amount;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION sales_rollup_item()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    receipt_company VARCHAR;
+    receipt_day DATE;
+BEGIN
+    SELECT company_code, date INTO receipt_company, receipt_day FROM receipts WHERE id = NEW.receipt_id;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO sales_daily (company_code, day, items_count)
+    VALUES (receipt_company, receipt_day, 1)
+    ON CONFLICT (company_code, day) DO UPDATE
+    SET items_count = sales_daily.items_count + 1;
+
+    INSERT INTO sales_daily_items (company_code, day, item_type, items_count, total_amount)
+    VALUES (receipt_company, receipt_day, NEW.item_type, 1, NEW.total_price)
+    ON CONFLICT (company_code, day, item_type) DO UPDATE
+    SET items_count = sales_daily_items.items_count + 1,
+        total_amount = sales_daily_items.total_amount + excluded.total_amount;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS receipts_sales_rollup ON receipts;
+CREATE TRIGGER receipts_sales_rollup
+    AFTER INSERT ON receipts
+    FOR EACH ROW EXECUTE FUNCTION sales_rollup_receipt();
+
+DROP TRIGGER IF EXISTS items_sales_rollup ON items;
+CREATE TRIGGER items_sales_rollup
+    AFTER INSERT ON items
+    FOR EACH ROW EXECUTE FUNCTION sales_rollup_item();
+
+-- Totals per company and day/week/month (weeks start on Monday) with the
+-- top_items best selling item types by amount
+CREATE OR REPLACE FUNCTION sales_report(
+    period TEXT DEFAULT 'month',
+    date_from DATE DEFAULT NULL,
+    date_to DATE DEFAULT NULL,
+    company_filter TEXT DEFAULT NULL,
+    top_items INT DEFAULT 5
+)
+RETURNS TABLE (
+    company_code VARCHAR, period_start DATE, receipts_count BIGINT, items_count BIGINT,
+    total_amount NUMERIC, top_item_types JSONB
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH totals AS (
+        SELECT d.company_code, date_trunc(period, d.day)::date AS period_start,
+               SUM(d.receipts_count)::bigint AS receipts_count,
+               SUM(d.items_count)::bigint AS items_count,
+               SUM(d.total_amount) AS total_amount
+        FROM sales_daily d
+        WHERE (sales_report.date_from IS NULL OR d.day >= sales_report.date_from)
+          AND (sales_report.date_to IS NULL OR d.day <= sales_report.date_to)
+          AND (company_filter IS NULL OR d.company_code = company_filter)
+        GROUP BY 1, 2
+    ),
+    item_totals AS (
+        SELECT i.company_code, date_trunc(period, i.day)::date AS period_start, i.item_type,
+               SUM(i.items_count)::bigint AS items_count, SUM(i.total_amount) AS total_amount,
+               ROW_NUMBER() OVER (
+                   PARTITION BY i.company_code, date_trunc(period, i.day)
+                   ORDER BY SUM(i.total_amount) DESC, i.item_type
+               ) AS rank
+        FROM sales_daily_items i
+        WHERE (sales_report.date_from IS NULL OR i.day >= sales_report.date_from)
+          AND (sales_report.date_to IS NULL OR i.day <= sales_report.date_to)
+          AND (company_filter IS NULL OR i.company_code = company_filter)
+        GROUP BY 1, 2, 3
+    )
+    SELECT t.company_code, t.period_start, t.receipts_count, t.items_count, t.total_amount,
+           COALESCE((
+               SELECT jsonb_agg(jsonb_build_object(
+                          'item_type', it.item_type, 'items_count', it.items_count,
+                          'total_amount', it.total_amount) ORDER BY it.rank)
+               FROM item_totals it
+               WHERE it.company_code = t.company_code AND it.period_start = t.period_start
+                 AND it.rank <= top_items
+           ), '[]'::jsonb) AS top_item_types
+    FROM totals t
+    ORDER BY t.company_code, t.period_start;
+$$;
+
+-- Swap in rollups recomputed by sales_report.py (python sales_report.py --rebuild)
+-- in one transaction. They cover receipts up to max_receipt_id; receipts
+-- saved while they were computed are rolled up again from the live tables.
+CREATE OR REPLACE FUNCTION replace_sales_rollups(daily JSONB, daily_items JSONB, max_receipt_id BIGINT)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    DELETE FROM sales_daily WHERE true;
+    DELETE FROM sales_daily_items WHERE true;
+    INSERT INTO sales_daily (company_code, day, receipts_count, items_count, total_amount)
+    SELECT company_code, day, receipts_count, items_count, total_amount
+    FROM jsonb_to_recordset(daily)
+        AS x(company_code VARCHAR, day DATE, receipts_count BIGINT, items_count BIGINT, total_amount NUMERIC);
+    INSERT INTO sales_daily_items (company_code, day, item_type, items_count, total_amount)
+    SELECT company_code, day, item_type, items_count, total_amount
+    FROM jsonb_to_recordset(daily_items)
+        AS x(company_code VARCHAR, day DATE, item_type VARCHAR, items_count BIGINT, total_amount NUMERIC);
+
+    INSERT INTO sales_daily AS d (company_code, day, receipts_count, total_amount)
+    SELECT r.company_code, r.date, COUNT(*), SUM(r.total_amount)
+    FROM receipts r WHERE r.id > max_receipt_id
+    GROUP BY r.company_code, r.date
+    ON CONFLICT (company_code, day) DO UPDATE
+    SET receipts_count = d.receipts_count + excluded.receipts_count,
+        total_amount = d.total_amount + excluded.total_amount;
+    INSERT INTO sales_daily AS d (company_code, day, items_count)
+    SELECT r.company_code, r.date, COUNT(*)
+    FROM items i JOIN receipts r ON r.id = i.receipt_id WHERE i.receipt_id > max_receipt_id
+    GROUP BY r.company_code, r.date
+    ON CONFLICT (company_code, day) DO UPDATE
+    SET items_count = d.items_count + excluded.items_count;
+    INSERT INTO sales_daily_items AS d (company_code, day, item_type, items_count, total_amount)
+    SELECT r.company_code, r.date, i.item_type, COUNT(*), SUM(i.total_price)
+    FROM items i JOIN receipts r ON r.id = i.receipt_id WHERE i.receipt_id > max_receipt_id
+    GROUP BY r.company_code, r.date, i.item_type
+    ON CONFLICT (company_code, day, item_type) DO UPDATE
+    SET items_count = d.items_count + excluded.items_count,
+        total_amount = d.total_amount + excluded.total_amount;
+$$;
+
+GRANT EXECUTE ON FUNCTION sales_report(TEXT, DATE, DATE, TEXT, INT) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION replace_sales_rollups(JSONB, JSONB, BIGINT) TO anon, authenticated;
+
+-- Roll up the receipts that already exist (only when the tables are still empty)
+INSERT INTO sales_daily (company_code, day, receipts_count, items_count, total_amount)
+SELECT r.company_code, r.date, COUNT(*), COALESCE(SUM(i.items_count), 0), SUM(r.total_amount)
+FROM receipts r
+LEFT JOIN (SELECT receipt_id, COUNT(*) AS items_count FROM items GROUP BY receipt_id) i ON i.receipt_id = r.id
+WHERE NOT EXISTS (SELECT 1 FROM sales_daily)
+GROUP BY r.company_code, r.date;
+
+INSERT INTO sales_daily_items (company_code, day, item_type, items_count, total_amount)
+SELECT r.company_code, r.date, i.item_type, COUNT(*), SUM(i.total_price)
+FROM items i
+JOIN receipts r ON r.id = i.receipt_id
+WHERE NOT EXISTS (SELECT 1 FROM sales_daily_items)
+GROUP BY r.company_code, r.date, i.item_type;
+
+SELECT * FROM sales_report('month');
@@ -0,0 +1,123 @@
+-- Full-text search untuk /api/search (nota dan item)
+-- Jalankan script ini di Supabase SQL Editor
+
+-- One search document per receipt: its number, recipient and company name
+-- plus the type, size and color of all its items, so a query like
+-- "budi kaos" finds Budi's receipts that contain a kaos. 'simple' keeps
+-- words as typed (no stemming), which suits names and item codes.
+CREATE TABLE IF NOT EXISTS receipt_search (
+    receipt_id BIGINT PRIMARY KEY REFERENCES receipts(id) ON DELETE CASCADE,
+    document TSVECTOR NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_receipt_search_document ON receipt_search USING GIN (document);
+
+ALTER TABLE receipt_search ENABLE ROW LEVEL SECURITY;
+DROP POLICY IF EXISTS "Allow public access to receipt_search" ON receipt_search;
+CREATE POLICY "Allow public access to receipt_search" ON receipt_search FOR ALL USING (true);
+
+-- (Re)build the document of one receipt; nothing when the receipt is gone
+CREATE OR REPLACE FUNCTION refresh_receipt_search(target_id BIGINT)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO receipt_search (receipt_id, document)
+    SELECT r.id,
+           setweight(to_tsvector('simple', coalesce(r.receipt_number, '')), 'A')
+           || setweight(to_tsvector('simple', coalesce(r.recipient, '')), 'B')
+           || setweight(to_tsvector('simple', coalesce(r.company_name, '')), 'C')
+           || setweight(to_tsvector('simple', coalesce((
+                  SELECT string_agg(concat_ws(' ', i.item_type, i.size, i.color), ' ')
+                  FROM items i WHERE i.receipt_id = r.id
+              ), '')), 'D')
+    FROM receipts r
+    WHERE r.id = target_id
+    ON CONFLICT (receipt_id) DO UPDATE SET document = excluded.document;
+$$;
+
+CREATE OR REPLACE FUNCTION receipt_search_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'receipts' THEN
+        PERFORM refresh_receipt_search(NEW.id);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_receipt_search(OLD.receipt_id);
+    ELSE
+        PERFORM refresh_receipt_search(NEW.receipt_id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS receipts_search_refresh ON receipts;
+CREATE TRIGGER receipts_search_refresh
+    AFTER INSERT OR UPDATE OF receipt_number, recipient, company_name ON receipts
+    FOR EACH ROW EXECUTE FUNCTION receipt_search_trigger();
+
+DROP TRIGGER IF EXISTS items_search_refresh ON items;
+CREATE TRIGGER items_search_refresh
+    AFTER INSERT OR UPDATE OR DELETE ON items
+    FOR EACH ROW EXECUTE FUNCTION receipt_search_trigger();
+
+-- Receipts whose document contains every term (as a prefix), best match
+-- first. Searches matching more than rank_limit receipts are returned newest
+-- first with a NULL score. matched_items lists the items containing any of
+-- the terms and total_count is the number of matches over all pages.
+CREATE OR REPLACE FUNCTION search_receipts(
+    search_terms TEXT[],
+    company_filter TEXT DEFAULT NULL,
+    date_from DATE DEFAULT NULL,
+    date_to DATE DEFAULT NULL,
+    max_rows INT DEFAULT 20,
+    skip INT DEFAULT 0,
+    rank_limit INT DEFAULT 2000
+)
+RETURNS TABLE (
+    id BIGINT, receipt_number VARCHAR, company_code VARCHAR, company_name VARCHAR, date DATE,
+    recipient VARCHAR, address TEXT, total_amount NUMERIC, created_at TIMESTAMPTZ,
+    score REAL, matched_items JSONB, total_count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH query AS (
+        SELECT to_tsquery('simple', string_agg(quote_literal(term) || ':*', ' & ')) AS all_terms,
+               to_tsquery('simple', string_agg(quote_literal(term) || ':*', ' | ')) AS any_term
+        FROM unnest(search_terms) AS term
+    ),
+    matches AS (
+        SELECT s.receipt_id, s.document
+        FROM receipt_search s, query
+        WHERE s.document @@ query.all_terms
+    ),
+    breadth AS (
+        SELECT COUNT(*) > rank_limit AS too_broad FROM matches
+    )
+    SELECT r.id, r.receipt_number, r.company_code, r.company_name, r.date,
+           r.recipient, r.address, r.total_amount, r.created_at,
+           CASE WHEN breadth.too_broad THEN NULL ELSE ts_rank(m.document, query.all_terms) END AS score,
+           (SELECT jsonb_agg(to_jsonb(i) ORDER BY i.id)
+            FROM items i
+            WHERE i.receipt_id = r.id
+              AND to_tsvector('simple', concat_ws(' ', i.item_type, i.size, i.color)) @@ query.any_term
+           ) AS matched_items,
+           COUNT(*) OVER () AS total_count
+    FROM matches m
+    JOIN receipts r ON r.id = m.receipt_id
+    CROSS JOIN query
+    CROSS JOIN breadth
+    WHERE (company_filter IS NULL OR r.company_code = company_filter)
+      AND (search_receipts.date_from IS NULL OR r.date >= search_receipts.date_from)
+      AND (search_receipts.date_to IS NULL OR r.date <= search_receipts.date_to)
+    ORDER BY score DESC NULLS LAST, r.created_at DESC, r.id DESC
+    LIMIT max_rows OFFSET skip;
+$$;
+
+GRANT EXECUTE ON FUNCTION search_receipts(TEXT[], TEXT, DATE, DATE, INT, INT, INT) TO anon, authenticated;
+
+-- Index the receipts that already exist
+DO $$ BEGIN PERFORM refresh_receipt_search(id) FROM receipts; END $$;
+
+SELECT * FROM search_receipts(ARRAY['test']);
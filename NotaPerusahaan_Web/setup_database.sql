@@ -36,6 +36,17 @@ CREATE INDEX idx_receipts_date ON receipts(date);
 CREATE INDEX idx_receipts_created_at ON receipts(created_at);
 CREATE INDEX idx_items_receipt_id ON items(receipt_id);
 
+-- Keyset pagination for GET /api/receipts: (created_at, id) newest first,
+-- optionally narrowed by company
+CREATE INDEX idx_receipts_created_at_id ON receipts(created_at DESC, id DESC);
+CREATE INDEX idx_receipts_company_created_at_id ON receipts(company_code, created_at DESC, id DESC);
+
+-- Trigram indexes so the history search (?q=, ILIKE '%...%') does not scan the table
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX idx_receipts_receipt_number_trgm ON receipts USING GIN (receipt_number gin_trgm_ops);
+CREATE INDEX idx_receipts_recipient_trgm ON receipts USING GIN (recipient gin_trgm_ops);
+CREATE INDEX idx_receipts_company_name_trgm ON receipts USING GIN (company_name gin_trgm_ops);
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE receipts ENABLE ROW LEVEL SECURITY;
 ALTER TABLE items ENABLE ROW LEVEL SECURITY;
@@ -53,3 +64,11 @@ INSERT INTO receipts (receipt_number, company_code, company_name, date, recipien
 -- Verify tables were created
 SELECT 'Tables created successfully' as status;
 SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' AND table_name IN ('receipts', 'items');
+
+-- Penomoran nota: jalankan juga setup_receipt_counters.sql setelah script ini
+-- Simpan nota dalam satu transaksi: jalankan juga create_receipt_rpc.sql
+-- Statistik /api/stats: jalankan juga receipt_stats.sql
+-- Pencarian /api/search: jalankan juga search_index.sql
+-- Laporan penjualan /api/reports/sales: jalankan juga sales_rollups.sql
+-- Impor nota lama /api/import: jalankan juga import_receipts_rpc.sql
+-- ETag /api/receipts dan /api/stats: jalankan juga receipt_version.sql
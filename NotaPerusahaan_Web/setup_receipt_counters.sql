@@ -0,0 +1,37 @@
+-- Receipt number counter untuk Nota Perusahaan Web App
+-- Jalankan script ini di Supabase SQL Editor (setelah setup_database.sql)
+
+-- One row per company; last_value is the last receipt number handed out
+CREATE TABLE IF NOT EXISTS receipt_counters (
+    company_code VARCHAR(10) PRIMARY KEY,
+    last_value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Continue numbering from the receipts that already exist
+INSERT INTO receipt_counters (company_code, last_value)
+SELECT company_code, MAX(NULLIF(regexp_replace(receipt_number, '\D', '', 'g'), '')::BIGINT)
+FROM receipts
+GROUP BY company_code
+ON CONFLICT (company_code) DO UPDATE
+SET last_value = GREATEST(receipt_counters.last_value, EXCLUDED.last_value);
+
+-- Atomically reserve p_count consecutive numbers for a company.
+-- The upsert takes a row lock, so concurrent callers get disjoint blocks.
+CREATE OR REPLACE FUNCTION reserve_receipt_numbers(p_company_code TEXT, p_count INTEGER DEFAULT 1)
+RETURNS TABLE (first_value BIGINT, last_value BIGINT)
+LANGUAGE sql
+AS $$
+    INSERT INTO receipt_counters AS rc (company_code, last_value)
+    VALUES (p_company_code, p_count)
+    ON CONFLICT (company_code) DO UPDATE
+    SET last_value = rc.last_value + p_count, updated_at = NOW()
+    RETURNING rc.last_value - p_count + 1, rc.last_value;
+$$;
+
+ALTER TABLE receipt_counters ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow public access to receipt_counters" ON receipt_counters FOR ALL USING (true);
+GRANT EXECUTE ON FUNCTION reserve_receipt_numbers(TEXT, INTEGER) TO anon, authenticated;
+
+SELECT 'Receipt counters created successfully' as status;
+SELECT * FROM receipt_counters;
@@ -0,0 +1,650 @@
+"""Local SQLite backend (see storage.py).
+
+The schema is not maintained twice: tables and indexes are read from the
+same setup_*.sql scripts that are run in Supabase, translated to SQLite on
+the fly. Postgres-only parts (RLS policies, GIN/trigram indexes, functions,
+sample rows) are skipped; the search index of search_index.sql becomes an
+FTS5 table (SEARCH_SCHEMA) and the plpgsql triggers of sales_rollups.sql
+become SALES_SCHEMA. The database runs in WAL mode so readers never
+block the writer, and each thread keeps its own connection.
+"""
+import os
+import re
+import sqlite3
+import threading
+
+from repository import (
+    RECEIPT_FIELDS, ITEM_FIELDS, QueryError, encode_cursor, decode_cursor, parse_fields,
+    SEARCH_RANK_LIMIT, search_terms, matching_items, _chunks
+)
+from receipt_numbers import format_receipt_number, parse_receipt_number, validate_reservation
+from storage import Storage
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Applied in order, like in the Supabase SQL Editor
+SCHEMA_FILES = (
+    'setup_database.sql',
+    'add_address_column.sql',
+    'setup_users_table.sql',
+    'setup_receipt_counters.sql',
+    'sales_rollups.sql',
+    'receipt_version.sql',
+)
+
+# Postgres type/default -> SQLite equivalent
+_TRANSLATIONS = (
+    (re.compile(r'\bBIGSERIAL\s+PRIMARY\s+KEY\b', re.I), 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    (re.compile(r'\bTIMESTAMP\s+WITH\s+TIME\s+ZONE\b', re.I), 'TEXT'),
+    (re.compile(r'\bDEFAULT\s+NOW\(\)', re.I), "DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))"),
+    (re.compile(r'\bpublic\.', re.I), ''),
+    (re.compile(r'^CREATE\s+TABLE\s+(?!IF\s+NOT\s+EXISTS)', re.I), 'CREATE TABLE IF NOT EXISTS '),
+    (re.compile(r'^CREATE\s+INDEX\s+(?!IF\s+NOT\s+EXISTS)', re.I), 'CREATE INDEX IF NOT EXISTS '),
+)
+
+# Full-text index behind /api/search (search_index.sql in Supabase): one FTS5
+# row per receipt holding its own columns plus the text of its items.
+# Rewriting an FTS row for every item insert would make writes ~10x slower,
+# so triggers only queue the receipt id and search() indexes the queue in
+# one batch before it runs.
+SEARCH_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS receipt_search USING fts5("
+    "receipt_number, recipient, company_name, items, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TABLE IF NOT EXISTS receipt_search_pending (receipt_id INTEGER PRIMARY KEY)",
+    "CREATE TRIGGER IF NOT EXISTS receipt_search_insert AFTER INSERT ON receipts BEGIN "
+    "INSERT OR IGNORE INTO receipt_search_pending VALUES (new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS receipt_search_update AFTER UPDATE ON receipts BEGIN "
+    "INSERT OR IGNORE INTO receipt_search_pending VALUES (new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS receipt_search_delete AFTER DELETE ON receipts BEGIN "
+    "DELETE FROM receipt_search WHERE rowid = old.id; "
+    "DELETE FROM receipt_search_pending WHERE receipt_id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS receipt_search_item_insert AFTER INSERT ON items BEGIN "
+    "INSERT OR IGNORE INTO receipt_search_pending VALUES (new.receipt_id); END",
+    "CREATE TRIGGER IF NOT EXISTS receipt_search_item_update AFTER UPDATE ON items BEGIN "
+    "INSERT OR IGNORE INTO receipt_search_pending VALUES (new.receipt_id); END",
+    "CREATE TRIGGER IF NOT EXISTS receipt_search_item_delete AFTER DELETE ON items BEGIN "
+    "INSERT OR IGNORE INTO receipt_search_pending VALUES (old.receipt_id); END",
+)
+
+# Incremental sales rollups of sales_rollups.sql: every receipt and item
+# insert adds itself to its company's day. Deletes do not subtract; exported
+# and archived receipts were still sold.
+SALES_SCHEMA = (
+    "CREATE TRIGGER IF NOT EXISTS receipts_sales_rollup AFTER INSERT ON receipts BEGIN "
+    "INSERT INTO sales_daily (company_code, day, receipts_count, total_amount) "
+    "VALUES (new.company_code, new.date, 1, new.total_amount) "
+    "ON CONFLICT (company_code, day) DO UPDATE SET receipts_count = receipts_count + 1, "
+    "total_amount = total_amount + excluded.total_amount; END",
+    "CREATE TRIGGER IF NOT EXISTS items_sales_rollup AFTER INSERT ON items BEGIN "
+    "INSERT INTO sales_daily (company_code, day, items_count) "
+    "SELECT company_code, date, 1 FROM receipts WHERE id = new.receipt_id "
+    "ON CONFLICT (company_code, day) DO UPDATE SET items_count = items_count + 1; "
+    "INSERT INTO sales_daily_items (company_code, day, item_type, items_count, total_amount) "
+    "SELECT company_code, date, new.item_type, 1, new.total_price FROM receipts WHERE id = new.receipt_id "
+    "ON CONFLICT (company_code, day, item_type) DO UPDATE SET items_count = items_count + 1, "
+    "total_amount = total_amount + excluded.total_amount; END",
+)
+
+# receipt_version.sql bumps the version once per statement; SQLite triggers
+# fire per row, which gives a different number but the same guarantee
+VERSION_SCHEMA = tuple(
+    f"CREATE TRIGGER IF NOT EXISTS receipts_version_{event.lower()} AFTER {event} ON receipts BEGIN "
+    "UPDATE table_versions SET version = version + 1, updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now') "
+    "WHERE table_name = 'receipts'; END"
+    for event in ('INSERT', 'UPDATE', 'DELETE')
+)
+
+# Rolls up the receipts above ? (a max_receipt_id) into the rollup tables
+SALES_ROLLUP_SINCE = (
+    "INSERT INTO sales_daily (company_code, day, receipts_count, total_amount) "
+    "SELECT company_code, date, COUNT(*), SUM(total_amount) FROM receipts WHERE id > ? "
+    "GROUP BY company_code, date "
+    "ON CONFLICT (company_code, day) DO UPDATE SET receipts_count = receipts_count + excluded.receipts_count, "
+    "total_amount = total_amount + excluded.total_amount",
+    "INSERT INTO sales_daily (company_code, day, items_count) "
+    "SELECT r.company_code, r.date, COUNT(*) FROM items i JOIN receipts r ON r.id = i.receipt_id "
+    "WHERE i.receipt_id > ? GROUP BY r.company_code, r.date "
+    "ON CONFLICT (company_code, day) DO UPDATE SET items_count = items_count + excluded.items_count",
+    "INSERT INTO sales_daily_items (company_code, day, item_type, items_count, total_amount) "
+    "SELECT r.company_code, r.date, i.item_type, COUNT(*), SUM(i.total_price) "
+    "FROM items i JOIN receipts r ON r.id = i.receipt_id WHERE i.receipt_id > ? "
+    "GROUP BY r.company_code, r.date, i.item_type "
+    "ON CONFLICT (company_code, day, item_type) DO UPDATE SET items_count = items_count + excluded.items_count, "
+    "total_amount = total_amount + excluded.total_amount",
+)
+
+# First day of the period containing ``day``; weeks start on Monday
+SALES_PERIOD_START = {
+    'day': 'day',
+    'week': "date(day, 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m-01', day)",
+}
+
+# bm25 weights of receipt_number, recipient, company_name and items
+SEARCH_WEIGHTS = (8.0, 4.0, 1.0, 2.0)
+
+
+def _statements(sql):
+    sql = re.sub(r'\$\$.*?\$\$', '', sql, flags=re.S)  # function bodies
+    sql = re.sub(r'--[^\n]*', '', sql)
+    for statement in sql.split(';'):
+        statement = ' '.join(statement.split())
+        if statement:
+            yield statement
+
+
+def _translate(statement):
+    """SQLite version of a schema statement, or None when it has no SQLite equivalent"""
+    upper = statement.upper()
+    if upper.startswith('CREATE TABLE') or upper.startswith('CREATE INDEX'):
+        if ' USING ' in upper:
+            return None  # GIN/trigram indexes
+    elif re.match(r'ALTER TABLE \S+ ADD COLUMN', upper):
+        pass
+    elif upper.startswith('INSERT INTO') and upper.endswith('DO NOTHING'):
+        pass  # idempotent seed rows (default users)
+    else:
+        return None
+    for pattern, replacement in _TRANSLATIONS:
+        statement = pattern.sub(replacement, statement)
+    return statement
+
+
+def schema_statements(base_dir=BASE_DIR, files=SCHEMA_FILES):
+    """The SQLite statements derived from the setup scripts"""
+    statements = []
+    for name in files:
+        path = os.path.join(base_dir, name)
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding='utf-8') as f:
+            sql = f.read()
+        for statement in _statements(sql):
+            translated = _translate(statement)
+            if translated:
+                statements.append(translated)
+    return statements
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class SQLiteStorage(Storage):
+    """Receipts in a local SQLite database file"""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._create_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _create_schema(self):
+        conn = self._connect()
+        for statement in schema_statements():
+            try:
+                conn.execute(statement)
+            except sqlite3.OperationalError as e:
+                # ALTER TABLE ADD COLUMN has no IF NOT EXISTS in SQLite
+                if 'duplicate column' not in str(e):
+                    raise
+
+        indexed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'receipt_search'").fetchone()
+        rolled_up = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'receipts_sales_rollup'").fetchone()
+        with self._write() as conn:
+            for statement in SEARCH_SCHEMA:
+                conn.execute(statement)
+            if not indexed:  # a database from before the search index
+                conn.execute('INSERT OR IGNORE INTO receipt_search_pending SELECT id FROM receipts')
+            for statement in SALES_SCHEMA + VERSION_SCHEMA:
+                conn.execute(statement)
+            if not rolled_up:  # a database from before the sales rollups
+                conn.execute('DELETE FROM sales_daily')
+                conn.execute('DELETE FROM sales_daily_items')
+                for statement in SALES_ROLLUP_SINCE:
+                    conn.execute(statement, (0,))
+
+    def _query(self, sql, params=()):
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def _write(self):
+        """Serialize writers within this process; SQLite serializes across processes"""
+        return _Transaction(self._connect(), self._write_lock)
+
+    # Receipts
+
+    def _attach_items(self, receipts):
+        by_id = {receipt['id']: receipt for receipt in receipts}
+        for receipt in receipts:
+            receipt['items'] = []
+        for chunk in _chunks(list(by_id), 500):
+            placeholders = ','.join('?' * len(chunk))
+            for item in self._query(
+                f'SELECT * FROM items WHERE receipt_id IN ({placeholders}) ORDER BY id', chunk
+            ):
+                by_id[item['receipt_id']]['items'].append(item)
+        return receipts
+
+    def list_receipts(self, company=None, date_from=None, date_to=None, q=None,
+                      fields=None, limit=50, cursor=None, with_items=False):
+        columns = parse_fields(fields)
+
+        where, params = [], []
+        if company:
+            where.append('company_code = ?')
+            params.append(company)
+        if date_from:
+            where.append('date >= ?')
+            params.append(date_from)
+        if date_to:
+            where.append('date <= ?')
+            params.append(date_to)
+        if q:
+            pattern = f'%{_escape_like(q)}%'
+            where.append(
+                "(receipt_number LIKE ? ESCAPE '\\' OR recipient LIKE ? ESCAPE '\\' "
+                "OR company_name LIKE ? ESCAPE '\\')"
+            )
+            params += [pattern] * 3
+
+        filters = f"WHERE {' AND '.join(where)}" if where else ''
+        total = self._connect().execute(f'SELECT COUNT(*) FROM receipts {filters}', params).fetchone()[0]
+
+        page_where, page_params = list(where), list(params)
+        if cursor:
+            created_at, receipt_id = decode_cursor(cursor)
+            page_where.append('(created_at < ? OR (created_at = ? AND id < ?))')
+            page_params += [created_at, created_at, receipt_id]
+        page_filters = f"WHERE {' AND '.join(page_where)}" if page_where else ''
+
+        rows = self._query(
+            f"SELECT {', '.join(columns)} FROM receipts {page_filters} "
+            f"ORDER BY created_at DESC, id DESC LIMIT ?",
+            page_params + [limit + 1]
+        )
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1])
+        if with_items:
+            self._attach_items(rows)
+        return rows, next_cursor, total
+
+    def get_receipt(self, receipt_id):
+        rows = self._query('SELECT * FROM receipts WHERE id = ?', (receipt_id,))
+        return self._attach_items(rows)[0] if rows else None
+
+    def get_receipts(self, ids):
+        receipts = []
+        for chunk in _chunks(list(ids), 500):
+            placeholders = ','.join('?' * len(chunk))
+            receipts += self._query(f'SELECT * FROM receipts WHERE id IN ({placeholders})', chunk)
+        position = {receipt_id: i for i, receipt_id in enumerate(ids)}
+        receipts.sort(key=lambda r: position.get(r['id'], len(position)))
+        return self._attach_items(receipts)
+
+    def fetch_receipts_for_batch(self, ids=None, company=None, date_from=None, date_to=None,
+                                 max_receipts=500):
+        if ids:
+            if len(ids) > max_receipts:
+                raise QueryError(f'Maximum {max_receipts} receipts per batch')
+            return self.get_receipts(ids)
+
+        if not (company or date_from or date_to):
+            raise QueryError('Provide ids or a company/date range')
+        where, params = [], []
+        for column, op, value in (('company_code', '=', company), ('date', '>=', date_from), ('date', '<=', date_to)):
+            if value:
+                where.append(f'{column} {op} ?')
+                params.append(value)
+        receipts = self._query(
+            f"SELECT * FROM receipts WHERE {' AND '.join(where)} ORDER BY date, id LIMIT ?",
+            params + [max_receipts + 1]
+        )
+        if len(receipts) > max_receipts:
+            raise QueryError(f'Maximum {max_receipts} receipts per batch; narrow the range')
+        return self._attach_items(receipts)
+
+    def search(self, q, company=None, date_from=None, date_to=None, limit=20, offset=0):
+        terms = search_terms(q)
+        match = ' '.join(f'"{term}"*' for term in terms)
+
+        where, params = [], []
+        for column, op, value in (('company_code', '=', company), ('date', '>=', date_from), ('date', '<=', date_to)):
+            if value:
+                where.append(f'r.{column} {op} ?')
+                params.append(value)
+        filters = ''.join(f' AND {condition}' for condition in where)
+
+        conn = self._connect()
+        if conn.execute('SELECT 1 FROM receipt_search_pending LIMIT 1').fetchone():
+            self._index_pending()
+        matches = conn.execute(
+            'SELECT COUNT(*) FROM receipt_search WHERE receipt_search MATCH ?', (match,)
+        ).fetchone()[0]
+        # CROSS JOIN keeps the FTS index as the outer loop; otherwise SQLite may
+        # walk receipts by company and re-run the MATCH for every row
+        joined = 'FROM receipt_search CROSS JOIN receipts r ON r.id = receipt_search.rowid'
+        if matches <= SEARCH_RANK_LIMIT:
+            rows = self._query(
+                f"SELECT r.*, -bm25(receipt_search, {', '.join(map(str, SEARCH_WEIGHTS))}) AS score "
+                f"{joined} WHERE receipt_search MATCH ?{filters} "
+                f"ORDER BY score DESC, r.created_at DESC, r.id DESC LIMIT ? OFFSET ?",
+                [match] + params + [limit, offset]
+            )
+            for row in rows:
+                row['score'] = round(row['score'], 4)
+        else:
+            # Too broad to rank: newest first, straight off the index in rowid order
+            rows = self._query(
+                f"SELECT r.*, NULL AS score {joined} WHERE receipt_search MATCH ?{filters} "
+                f"ORDER BY receipt_search.rowid DESC LIMIT ? OFFSET ?",
+                [match] + params + [limit, offset]
+            )
+
+        total = matches
+        if where:
+            total = conn.execute(
+                f"SELECT COUNT(*) {joined} WHERE receipt_search MATCH ?{filters}", [match] + params
+            ).fetchone()[0]
+
+        for row in self._attach_items(rows):
+            row['matched_items'] = matching_items(row.pop('items'), terms)
+        return rows, total
+
+    def _index_pending(self):
+        """(Re)index the receipts queued by the write triggers"""
+        with self._write() as conn:
+            conn.execute(
+                'DELETE FROM receipt_search WHERE rowid IN (SELECT receipt_id FROM receipt_search_pending)'
+            )
+            conn.execute(
+                "INSERT INTO receipt_search (rowid, receipt_number, recipient, company_name, items) "
+                "SELECT r.id, r.receipt_number, r.recipient, r.company_name, "
+                "(SELECT ifnull(group_concat(i.item_type || ' ' || ifnull(i.size, '') || ' ' || ifnull(i.color, ''), ' '), '') "
+                " FROM items i WHERE i.receipt_id = r.id) "
+                "FROM receipt_search_pending p JOIN receipts r ON r.id = p.receipt_id"
+            )
+            conn.execute('DELETE FROM receipt_search_pending')
+
+    def create_receipt(self, receipt_data, items):
+        receipt_data = {k: v for k, v in receipt_data.items() if k in RECEIPT_FIELDS and k != 'id'}
+        with self._write() as conn:
+            receipt_id = conn.execute(
+                f"INSERT INTO receipts ({', '.join(receipt_data)}) VALUES ({', '.join('?' * len(receipt_data))})",
+                list(receipt_data.values())
+            ).lastrowid
+            if items:
+                columns = [c for c in ITEM_FIELDS if c not in ('id', 'receipt_id')]
+                conn.executemany(
+                    f"INSERT INTO items (receipt_id, {', '.join(columns)}) "
+                    f"VALUES (?, {', '.join('?' * len(columns))})",
+                    [[receipt_id] + [item.get(c) for c in columns] for item in items]
+                )
+        return receipt_id
+
+    def import_receipts(self, receipts):
+        columns = [c for c in RECEIPT_FIELDS if c != 'id']
+        item_columns = [c for c in ITEM_FIELDS if c not in ('id', 'receipt_id')]
+        with self._write() as conn:
+            existing = set()
+            numbers = [receipt['receipt_number'] for receipt in receipts]
+            for chunk in _chunks(numbers, 500):
+                placeholders = ','.join('?' * len(chunk))
+                existing.update(number for (number,) in conn.execute(
+                    f'SELECT receipt_number FROM receipts WHERE receipt_number IN ({placeholders})', chunk
+                ))
+            new = [receipt for receipt in receipts if receipt['receipt_number'] not in existing]
+            if not new:
+                return []
+
+            conn.executemany(
+                f"INSERT INTO receipts ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [[receipt.get(c) for c in columns] for receipt in new]
+            )
+            ids = {}
+            for chunk in _chunks([receipt['receipt_number'] for receipt in new], 500):
+                placeholders = ','.join('?' * len(chunk))
+                ids.update(conn.execute(
+                    f'SELECT receipt_number, id FROM receipts WHERE receipt_number IN ({placeholders})', chunk
+                ))
+            conn.executemany(
+                f"INSERT INTO items (receipt_id, {', '.join(item_columns)}) "
+                f"VALUES (?, {', '.join('?' * len(item_columns))})",
+                [[ids[receipt['receipt_number']]] + [item.get(c) for c in item_columns]
+                 for receipt in new for item in receipt.get('items') or []]
+            )
+
+            # Keep new numbers from colliding with the imported ones
+            last_values = {}
+            for receipt in new:
+                value = parse_receipt_number(receipt['company_code'], receipt['receipt_number'])
+                if value is not None:
+                    last_values[receipt['company_code']] = max(value, last_values.get(receipt['company_code'], 0))
+            conn.executemany(
+                'UPDATE receipt_counters SET last_value = MAX(last_value, ?) WHERE company_code = ?',
+                [(value, code) for code, value in last_values.items()]
+            )
+        return [receipt['receipt_number'] for receipt in new]
+
+    def reserve_receipt_numbers(self, company_code, count=1):
+        validate_reservation(company_code, count)
+        with self._write() as conn:
+            row = conn.execute(
+                'SELECT last_value FROM receipt_counters WHERE company_code = ?', (company_code,)
+            ).fetchone()
+            if row is None:
+                # Continue numbering from the receipts that already exist
+                last_value = 0
+                for (number,) in conn.execute(
+                    'SELECT receipt_number FROM receipts WHERE company_code = ?', (company_code,)
+                ):
+                    last_value = max(last_value, parse_receipt_number(company_code, number) or 0)
+            else:
+                last_value = row['last_value']
+            conn.execute(
+                "INSERT INTO receipt_counters (company_code, last_value) VALUES (?, ?) "
+                "ON CONFLICT (company_code) DO UPDATE SET last_value = excluded.last_value, "
+                "updated_at = strftime('%Y-%m-%dT%H:%M:%f', 'now')",
+                (company_code, last_value + count)
+            )
+        return [format_receipt_number(company_code, value) for value in range(last_value + 1, last_value + count + 1)]
+
+    def fetch_stats(self, companies):
+        stats = {code: {'receipts_count': 0, 'items_count': 0, 'total_amount': 0.0} for code in companies}
+        for row in self._query(
+            'SELECT r.company_code, COUNT(*) AS receipts_count, '
+            'COALESCE(SUM(i.items_count), 0) AS items_count, '
+            'COALESCE(SUM(r.total_amount), 0) AS total_amount '
+            'FROM receipts r LEFT JOIN ('
+            '  SELECT receipt_id, COUNT(*) AS items_count FROM items GROUP BY receipt_id'
+            ') i ON i.receipt_id = r.id GROUP BY r.company_code'
+        ):
+            stats[row['company_code']] = {
+                'receipts_count': row['receipts_count'],
+                'items_count': row['items_count'],
+                'total_amount': float(row['total_amount'])
+            }
+        return stats
+
+    def sales_report(self, period='month', date_from=None, date_to=None, company=None, top_items=5):
+        start = SALES_PERIOD_START[period]
+        where, params = [], []
+        for column, op, value in (('company_code', '=', company), ('day', '>=', date_from), ('day', '<=', date_to)):
+            if value:
+                where.append(f'{column} {op} ?')
+                params.append(value)
+        filters = f"WHERE {' AND '.join(where)}" if where else ''
+
+        rows = self._query(
+            f"SELECT company_code, {start} AS period_start, SUM(receipts_count) AS receipts_count, "
+            f"SUM(items_count) AS items_count, SUM(total_amount) AS total_amount "
+            f"FROM sales_daily {filters} GROUP BY 1, 2 ORDER BY 1, 2",
+            params
+        )
+        top = {}
+        for item in self._query(
+            f"SELECT * FROM ("
+            f"  SELECT company_code, {start} AS period_start, item_type, "
+            f"  SUM(items_count) AS items_count, SUM(total_amount) AS total_amount, "
+            f"  ROW_NUMBER() OVER (PARTITION BY company_code, {start} "
+            f"                     ORDER BY SUM(total_amount) DESC, item_type) AS rank "
+            f"  FROM sales_daily_items {filters} GROUP BY 1, 2, 3"
+            f") WHERE rank <= ? ORDER BY company_code, period_start, rank",
+            params + [top_items]
+        ):
+            top.setdefault((item['company_code'], item['period_start']), []).append({
+                'item_type': item['item_type'],
+                'items_count': item['items_count'],
+                'total_amount': float(item['total_amount']),
+            })
+        for row in rows:
+            row['total_amount'] = float(row['total_amount'])
+            row['top_item_types'] = top.get((row['company_code'], row['period_start']), [])
+        return rows
+
+    def replace_sales_rollups(self, daily, daily_items, max_receipt_id):
+        with self._write() as conn:
+            conn.execute('DELETE FROM sales_daily')
+            conn.execute('DELETE FROM sales_daily_items')
+            conn.executemany(
+                'INSERT INTO sales_daily (company_code, day, receipts_count, items_count, total_amount) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(r['company_code'], r['day'], r['receipts_count'], r['items_count'], r['total_amount']) for r in daily]
+            )
+            conn.executemany(
+                'INSERT INTO sales_daily_items (company_code, day, item_type, items_count, total_amount) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(r['company_code'], r['day'], r['item_type'], r['items_count'], r['total_amount'])
+                 for r in daily_items]
+            )
+            # Receipts saved while the rollups were being computed
+            for statement in SALES_ROLLUP_SINCE:
+                conn.execute(statement, (max_receipt_id or 0,))
+
+    def count_items(self):
+        return self._connect().execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def latest_receipt_id(self):
+        return self._connect().execute('SELECT MAX(id) FROM receipts').fetchone()[0]
+
+    def receipts_watermark(self):
+        row = self._connect().execute(
+            "SELECT version, updated_at, (SELECT MAX(created_at) FROM receipts) "
+            "FROM table_versions WHERE table_name = 'receipts'"
+        ).fetchone()
+        version, updated_at, last_created_at = row or (0, None, None)
+        return {
+            'version': version,
+            # strftime('now') is UTC
+            'updated_at': f'{updated_at}+00:00' if updated_at else None,
+            'last_created_at': last_created_at
+        }
+
+    def iter_rows(self, table, chunk_size=1000, max_receipt_id=None, columns=None):
+        if table not in ('receipts', 'items'):
+            raise ValueError(f'Unknown table: {table}')
+        allowed = RECEIPT_FIELDS if table == 'receipts' else ITEM_FIELDS
+        if columns and not set(columns) <= set(allowed):
+            raise ValueError(f'Unknown column(s) for {table}')
+        select = ', '.join(columns) if columns else '*'
+        key = 'id' if table == 'receipts' else 'receipt_id'
+        last_id = 0
+        while True:
+            sql = f'SELECT {select} FROM {table} WHERE id > ?'
+            params = [last_id]
+            if max_receipt_id is not None:
+                sql += f' AND {key} <= ?'
+                params.append(max_receipt_id)
+            rows = self._query(sql + ' ORDER BY id LIMIT ?', params + [chunk_size])
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1]['id']
+
+    def delete_up_to(self, max_receipt_id):
+        with self._write() as conn:
+            conn.execute('DELETE FROM items WHERE receipt_id <= ?', (max_receipt_id,))
+            conn.execute('DELETE FROM receipts WHERE id <= ?', (max_receipt_id,))
+
+    def iter_receipts(self, chunk_size=500, max_receipt_id=None, date_before=None):
+        last_id = 0
+        while True:
+            sql, params = 'SELECT * FROM receipts WHERE id > ?', [last_id]
+            if max_receipt_id is not None:
+                sql += ' AND id <= ?'
+                params.append(max_receipt_id)
+            if date_before:
+                sql += ' AND date < ?'
+                params.append(date_before)
+            rows = self._query(sql + ' ORDER BY id LIMIT ?', params + [chunk_size])
+            if rows:
+                yield self._attach_items(rows)
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1]['id']
+
+    def delete_receipts(self, ids):
+        with self._write() as conn:
+            for chunk in _chunks(list(ids), 500):
+                placeholders = ','.join('?' * len(chunk))
+                conn.execute(f'DELETE FROM items WHERE receipt_id IN ({placeholders})', chunk)
+                conn.execute(f'DELETE FROM receipts WHERE id IN ({placeholders})', chunk)
+
+    # Users
+
+    def find_user(self, field, value):
+        if field not in ('username', 'email'):
+            raise ValueError(f'Cannot look users up by {field}')
+        rows = self._query(f'SELECT * FROM users WHERE {field} = ? LIMIT 1', (value,))
+        return rows[0] if rows else None
+
+    def create_user(self, user_data):
+        with self._write() as conn:
+            user_id = conn.execute(
+                f"INSERT INTO users ({', '.join(user_data)}) VALUES ({', '.join('?' * len(user_data))})",
+                list(user_data.values())
+            ).lastrowid
+        return self._query('SELECT * FROM users WHERE id = ?', (user_id,))[0]
+
+
+class _Transaction:
+    """``with`` block running one IMMEDIATE transaction, committed or rolled back on exit"""
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.lock.release()
+        return False
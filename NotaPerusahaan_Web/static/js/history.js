@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (window.NotaApp) {
                 initializeHistory();
                 setupEventListeners();
+                setupLiveUpdates();
                 loadReceipts();
             } else {
                 // Wait a bit more for main.js to load
@@ -20,15 +21,20 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 });
 
-let allReceipts = [];
-let filteredReceipts = [];
+let pageReceipts = [];
 let currentPage = 1;
+let totalReceipts = 0;
+let nextCursor = null;
+// pageCursors[i] is the cursor that loads page i + 1 (null for the first page)
+let pageCursors = [null];
 const itemsPerPage = 20;
 
 function initializeHistory() {
-    allReceipts = [];
-    filteredReceipts = [];
+    pageReceipts = [];
     currentPage = 1;
+    totalReceipts = 0;
+    nextCursor = null;
+    pageCursors = [null];
 }
 
 function setupEventListeners() {
@@ -66,6 +72,37 @@ function setupEventListeners() {
     }
 }
 
+// New nota appear without reloading the list; an export empties it
+function setupLiveUpdates() {
+    document.addEventListener('nota:receipt-created', (event) => addNewReceipt(event.detail));
+    document.addEventListener('nota:export-completed', () => loadReceipts(1));
+    document.addEventListener('nota:resync', () => loadReceipts(currentPage));
+    window.NotaApp.connectLiveUpdates();
+}
+
+function addNewReceipt(receipt) {
+    // Searches are left alone; the filtered list only grows by matching nota
+    const companyFilter = document.getElementById('companyFilter')?.value;
+    const dateFilter = document.getElementById('dateFilter')?.value;
+    const searchTerm = document.getElementById('searchInput')?.value.trim();
+    if (searchTerm ||
+        (companyFilter && receipt.company_code !== companyFilter) ||
+        (dateFilter && receipt.date !== dateFilter) ||
+        pageReceipts.some((existing) => existing.id === receipt.id)) {
+        return;
+    }
+    
+    totalReceipts += 1;
+    updateTotalCount();
+    
+    // Only the first page shows the newest nota. Prepended without dropping
+    // the last row, so the next-page cursor stays valid
+    if (currentPage === 1) {
+        pageReceipts.unshift(receipt);
+        updateReceiptsTable();
+    }
+}
+
 function debounce(func, wait) {
     let timeout;
     return function executedFunction(...args) {
@@ -78,21 +115,57 @@ function debounce(func, wait) {
     };
 }
 
-async function loadReceipts() {
+function buildReceiptsQuery(cursor, page) {
+    const params = new URLSearchParams({ limit: itemsPerPage });
+    
+    const searchTerm = document.getElementById('searchInput')?.value.trim();
+    const companyFilter = document.getElementById('companyFilter')?.value;
+    const dateFilter = document.getElementById('dateFilter')?.value;
+    
+    if (companyFilter) params.set('company', companyFilter);
+    if (dateFilter) {
+        params.set('date_from', dateFilter);
+        params.set('date_to', dateFilter);
+    }
+    
+    if (searchTerm) {
+        // Ranked search over receipts and their items; its pages are numbered
+        params.set('q', searchTerm);
+        params.set('page', page);
+        return `/api/search?${params.toString()}`;
+    }
+    
+    if (cursor) params.set('cursor', cursor);
+    return `/api/receipts?${params.toString()}`;
+}
+
+async function loadReceipts(page = 1) {
     try {
         if (window.NotaApp && window.NotaApp.showLoading) {
             window.NotaApp.showLoading();
         }
         
-        const response = await fetch('/api/receipts');
+        if (page === 1) {
+            pageCursors = [null];
+        }
+        
+        const response = await fetch(buildReceiptsQuery(pageCursors[page - 1], page));
         const data = await response.json();
         
         if (data.error) {
             throw new Error(data.error);
         }
         
-        allReceipts = data.receipts || [];
-        filteredReceipts = [...allReceipts];
+        pageReceipts = data.results || data.receipts || [];
+        totalReceipts = data.total || 0;
+        nextCursor = data.next_cursor || (data.has_more ? String(page + 1) : null);
+        currentPage = page;
+        
+        // Remember how to reach the following page
+        pageCursors.length = page;
+        if (nextCursor) {
+            pageCursors.push(nextCursor);
+        }
         
         updateReceiptsTable();
         updatePagination();
@@ -113,38 +186,12 @@ async function loadReceipts() {
 }
 
 function handleSearch() {
-    const searchTerm = document.getElementById('searchInput').value.toLowerCase();
-    
-    if (!searchTerm) {
-        filteredReceipts = [...allReceipts];
-    } else {
-        filteredReceipts = allReceipts.filter(receipt => 
-            receipt.receipt_number.toLowerCase().includes(searchTerm) ||
-            receipt.recipient.toLowerCase().includes(searchTerm) ||
-            receipt.company_name.toLowerCase().includes(searchTerm)
-        );
-    }
-    
-    currentPage = 1;
-    updateReceiptsTable();
-    updatePagination();
-    updateTotalCount();
+    // Search runs on the server; always restart from the first page
+    loadReceipts(1);
 }
 
 function handleFilter() {
-    const companyFilter = document.getElementById('companyFilter').value;
-    const dateFilter = document.getElementById('dateFilter').value;
-    
-    filteredReceipts = allReceipts.filter(receipt => {
-        const companyMatch = !companyFilter || receipt.company_code === companyFilter;
-        const dateMatch = !dateFilter || receipt.date === dateFilter;
-        return companyMatch && dateMatch;
-    });
-    
-    currentPage = 1;
-    updateReceiptsTable();
-    updatePagination();
-    updateTotalCount();
+    loadReceipts(1);
 }
 
 function clearFilters() {
@@ -152,11 +199,7 @@ function clearFilters() {
     document.getElementById('companyFilter').value = '';
     document.getElementById('dateFilter').value = '';
     
-    filteredReceipts = [...allReceipts];
-    currentPage = 1;
-    updateReceiptsTable();
-    updatePagination();
-    updateTotalCount();
+    loadReceipts(1);
 }
 
 function updateReceiptsTable() {
@@ -164,8 +207,6 @@ function updateReceiptsTable() {
     if (!tbody) return;
     
     const startIndex = (currentPage - 1) * itemsPerPage;
-    const endIndex = startIndex + itemsPerPage;
-    const pageReceipts = filteredReceipts.slice(startIndex, endIndex);
     
     if (pageReceipts.length === 0) {
         if (window.NotaApp && window.NotaApp.showNoDataMessage) {
@@ -192,7 +233,7 @@ function updateReceiptsTable() {
             </td>
             <td>${receipt.company_name}</td>
             <td>${window.NotaApp && window.NotaApp.formatDate ? window.NotaApp.formatDate(receipt.date) : receipt.date}</td>
-            <td>${receipt.recipient}</td>
+            <td>${receipt.recipient}${matchedItemsNote(receipt)}</td>
             <td title="${address}">${truncatedAddress}</td>
             <td class="fw-bold">${window.NotaApp && window.NotaApp.formatCurrency ? window.NotaApp.formatCurrency(receipt.total_amount) : `Rp ${receipt.total_amount}`}</td>
             <td>
@@ -217,14 +258,23 @@ function updateReceiptsTable() {
     }
 }
 
+function matchedItemsNote(receipt) {
+    // Search results name the items that matched the query
+    if (!receipt.matched_items || receipt.matched_items.length === 0) return '';
+    const names = receipt.matched_items.map(item =>
+        [item.item_type, item.size, item.color].filter(Boolean).join(' ')
+    );
+    return `<br><small class="text-muted">Item: ${names.join(', ')}</small>`;
+}
+
 function updatePagination() {
-    const totalPages = Math.ceil(filteredReceipts.length / itemsPerPage);
     const pagination = document.getElementById('pagination');
     if (!pagination) return;
     
     pagination.innerHTML = '';
     
-    if (totalPages <= 1) return;
+    const hasNext = Boolean(nextCursor);
+    if (currentPage === 1 && !hasNext) return;
     
     // Previous button
     const prevBtn = document.createElement('li');
@@ -232,28 +282,23 @@ function updatePagination() {
     prevBtn.innerHTML = `<a class="page-link" href="#" onclick="changePage(${currentPage - 1})">Previous</a>`;
     pagination.appendChild(prevBtn);
     
-    // Page numbers
-    for (let i = 1; i <= totalPages; i++) {
-        const pageBtn = document.createElement('li');
-        pageBtn.className = `page-item ${i === currentPage ? 'active' : ''}`;
-        pageBtn.innerHTML = `<a class="page-link" href="#" onclick="changePage(${i})">${i}</a>`;
-        pagination.appendChild(pageBtn);
-    }
+    // Current page (pages are cursor based, so only neighbours are reachable)
+    const pageBtn = document.createElement('li');
+    pageBtn.className = 'page-item active';
+    pageBtn.innerHTML = `<a class="page-link" href="#">${currentPage}</a>`;
+    pagination.appendChild(pageBtn);
     
     // Next button
     const nextBtn = document.createElement('li');
-    nextBtn.className = `page-item ${currentPage === totalPages ? 'disabled' : ''}`;
+    nextBtn.className = `page-item ${hasNext ? '' : 'disabled'}`;
     nextBtn.innerHTML = `<a class="page-link" href="#" onclick="changePage(${currentPage + 1})">Next</a>`;
     pagination.appendChild(nextBtn);
 }
 
-function changePage(page) {
-    const totalPages = Math.ceil(filteredReceipts.length / itemsPerPage);
-    if (page < 1 || page > totalPages) return;
+async function changePage(page) {
+    if (page < 1 || page > pageCursors.length) return;
     
-    currentPage = page;
-    updateReceiptsTable();
-    updatePagination();
+    await loadReceipts(page);
     
     window.scrollTo({ top: 0, behavior: 'smooth' });
 }
@@ -261,7 +306,7 @@ function changePage(page) {
 function updateTotalCount() {
     const totalCount = document.getElementById('totalCount');
     if (totalCount) {
-        totalCount.textContent = filteredReceipts.length;
+        totalCount.textContent = totalReceipts;
     }
 }
 
@@ -324,20 +369,36 @@ function showReceiptDetailsModal(receipt) {
     bootstrapModal.show();
 }
 
-function printReceipt(receiptId) {
+// The server answers 503 + Retry-After while its render queue is full
+const PDF_BUSY_RETRIES = 3;
+
+async function printReceipt(receiptId) {
     try {
         // Show loading
         if (window.NotaApp && window.NotaApp.showToast) {
             window.NotaApp.showToast('Membuat PDF...', 'info');
         }
         
+        let response = await fetch(`/api/receipts/${receiptId}/pdf`);
+        for (let attempt = 0; response.status === 503 && attempt < PDF_BUSY_RETRIES; attempt++) {
+            const seconds = parseInt(response.headers.get('Retry-After') || '1', 10);
+            await new Promise((resolve) => setTimeout(resolve, seconds * 1000));
+            response = await fetch(`/api/receipts/${receiptId}/pdf`);
+        }
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.error || `HTTP error! status: ${response.status}`);
+        }
+        
         // Download PDF
+        const url = URL.createObjectURL(await response.blob());
         const link = document.createElement('a');
-        link.href = `/api/receipts/${receiptId}/pdf`;
+        link.href = url;
         link.download = `nota_${receiptId}.pdf`;
         document.body.appendChild(link);
         link.click();
         document.body.removeChild(link);
+        URL.revokeObjectURL(url);
         
         // Show success message
         setTimeout(() => {
@@ -349,7 +410,7 @@ function printReceipt(receiptId) {
     } catch (error) {
         console.error('Error generating PDF:', error);
         if (window.NotaApp && window.NotaApp.showError) {
-            window.NotaApp.showError('Error saat membuat PDF');
+            window.NotaApp.showError(`Error saat membuat PDF: ${error.message}`);
         } else {
             console.error('Error saat membuat PDF');
         }
@@ -370,15 +431,11 @@ async function handleExport() {
             }
         });
         
-        const data = await response.json();
-        
-        if (data.error) {
-            throw new Error(data.error);
-        }
+        const message = await window.NotaApp.downloadExport(response);
         
         // Success
         if (window.NotaApp && window.NotaApp.showToast) {
-            window.NotaApp.showToast(data.message, 'success');
+            window.NotaApp.showToast(message, 'success');
         }
         
         // Hide modal
@@ -23,6 +23,11 @@ document.addEventListener('DOMContentLoaded', () => {
 let currentCompany = '';
 let currentReceiptNumber = '';
 
+// Receipt numbers reserved by this page, per company. Busy terminals can raise
+// the block size so most nota do not need a round trip for their number.
+const RECEIPT_NUMBER_BLOCK_SIZE = 1;
+const reservedReceiptNumbers = {};
+
 function initializeForm() {
     // Set current date
     const dateInput = document.getElementById('receiptDate');
@@ -193,34 +198,35 @@ async function generateReceiptNumber(companyCode) {
     try {
         console.log('Generating receipt number for company:', companyCode);
         
-        // Get last receipt number for this company
-        const response = await fetch(`/api/receipts?company=${companyCode}`);
-        console.log('API response:', response);
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        const data = await response.json();
-        console.log('API data:', data);
-        
-        let nextNumber = 1;
-        if (data.receipts && data.receipts.length > 0) {
-            const lastReceipt = data.receipts[0];
-            console.log('Last receipt:', lastReceipt);
+        // Reuse a number this page already reserved, otherwise reserve a new block.
+        // Numbers are only consumed after the nota is saved (see consumeReceiptNumber).
+        const queue = reservedReceiptNumbers[companyCode] || [];
+        if (queue.length === 0) {
+            const response = await fetch('/api/receipts/next-number', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ company: companyCode, count: RECEIPT_NUMBER_BLOCK_SIZE })
+            });
             
-            // Extract number from receipt_number (e.g., "CH00001" -> "00001" -> 1)
-            const lastNumberStr = lastReceipt.receipt_number.replace(companyCode, '');
-            const lastNumber = parseInt(lastNumberStr);
-            console.log('Last number:', lastNumber, 'from string:', lastNumberStr);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
             
-            if (!isNaN(lastNumber)) {
-                nextNumber = lastNumber + 1;
+            const data = await response.json();
+            console.log('API data:', data);
+            
+            if (data.error) {
+                throw new Error(data.error);
             }
+            
+            queue.push(...data.receipt_numbers);
+            reservedReceiptNumbers[companyCode] = queue;
         }
         
         // Format: CH00001, CR00001, CP00001
-        const formattedNumber = `${companyCode}${nextNumber.toString().padStart(5, '0')}`;
+        const formattedNumber = queue[0];
         console.log('Generated number:', formattedNumber);
         
         currentReceiptNumber = formattedNumber;
@@ -247,6 +253,14 @@ async function generateReceiptNumber(companyCode) {
     }
 }
 
+function consumeReceiptNumber(companyCode, receiptNumber) {
+    // Drop a number from the reserved queue once a nota has been saved with it
+    const queue = reservedReceiptNumbers[companyCode];
+    if (queue && queue[0] === receiptNumber) {
+        queue.shift();
+    }
+}
+
 function onItemTypeChange(event) {
     try {
         const itemType = event.target.value.toLowerCase();
@@ -680,6 +694,7 @@ async function handleFormSubmit(event) {
         }
         
         // Success
+        consumeReceiptNumber(receiptData.company_code, receiptData.receipt_number);
         window.NotaApp.showToast('Nota berhasil disimpan!', 'success');
         
         // Show success modal safely
@@ -148,6 +148,15 @@ const updateDatabaseStats = async () => {
             return;
         }
         
+        showDatabaseStats(data);
+    } catch (error) {
+        console.error('Error updating stats:', error);
+    }
+};
+
+// Render stats from /api/stats or a stats-changed event
+const showDatabaseStats = (data) => {
+    try {
         // Safely update UI elements if they exist
         const receiptsCountElement = document.getElementById('receiptsCount');
         if (receiptsCountElement) {
@@ -175,62 +184,143 @@ const updateDatabaseStats = async () => {
         }
         
     } catch (error) {
-        console.error('Error updating stats:', error);
+        console.error('Error showing stats:', error);
     }
 };
 
-// Load recipient history safely
-const loadRecipientHistory = async () => {
-    try {
-        const response = await fetch('/api/receipts');
-        const data = await response.json();
-        
-        if (data.error) {
-            console.error('Error loading recipients:', data.error);
-            return;
-        }
-        
-        // Extract unique recipients
-        const recipients = [...new Set(data.receipts.map(r => r.recipient))];
-        recipientHistory = recipients;
-        
-        // Update datalist if it exists
-        const datalist = document.getElementById('recipientList');
-        if (datalist) {
-            datalist.innerHTML = '';
-            recipients.forEach(recipient => {
-                const option = document.createElement('option');
-                option.value = recipient;
-                datalist.appendChild(option);
-            });
-        }
-        
-    } catch (error) {
-        console.error('Error loading recipient history:', error);
+// Live updates from /api/events (Server-Sent Events). Each event is re-dispatched
+// on document as "nota:<event>" with the payload in event.detail. Where the
+// stream is unavailable (old browsers, serverless hosting) stats are polled.
+const LIVE_EVENTS = ['receipt-created', 'export-completed', 'stats-changed', 'resync'];
+const STATS_POLL_MS = 30000;
+const MAX_EVENT_ERRORS = 3;
+let eventSource = null;
+let statsPoller = null;
+
+const pollStats = () => {
+    if (!statsPoller) {
+        statsPoller = setInterval(updateDatabaseStats, STATS_POLL_MS);
     }
 };
 
-// Filter recipients safely
-const filterRecipients = (input) => {
-    if (!input) return;
+const connectLiveUpdates = () => {
+    if (eventSource) {
+        return;
+    }
+    if (!window.EventSource) {
+        pollStats();
+        return;
+    }
     
-    const value = input.value.toLowerCase();
-    const filtered = recipientHistory.filter(recipient => 
-        recipient.toLowerCase().includes(value)
-    );
+    let errors = 0;
+    eventSource = new EventSource('/api/events');
+    eventSource.onopen = () => {
+        errors = 0;
+        if (statsPoller) {
+            clearInterval(statsPoller);
+            statsPoller = null;
+        }
+    };
+    // The browser reconnects by itself; give up after repeated failures
+    eventSource.onerror = () => {
+        errors += 1;
+        if (errors >= MAX_EVENT_ERRORS || eventSource.readyState === EventSource.CLOSED) {
+            eventSource.close();
+            pollStats();
+        }
+    };
+    LIVE_EVENTS.forEach((name) => {
+        eventSource.addEventListener(name, (event) => {
+            const detail = JSON.parse(event.data);
+            document.dispatchEvent(new CustomEvent(`nota:${name}`, { detail }));
+        });
+    });
     
-    // Update datalist if it exists
+    document.addEventListener('nota:stats-changed', (event) => showDatabaseStats(event.detail));
+    document.addEventListener('nota:resync', updateDatabaseStats);
+};
+
+// Recipient autocomplete, served by /api/recipients (server-side prefix index)
+let recipientRequest = null;
+let recipientTimer = null;
+
+const fetchRecipients = async (prefix = '') => {
+    const params = new URLSearchParams({ prefix, limit: 10 });
+    const companySelect = document.getElementById('companySelect');
+    if (companySelect && companySelect.value) {
+        params.set('company', companySelect.value);
+    }
+
+    // Only the latest keystroke matters
+    if (recipientRequest) {
+        recipientRequest.abort();
+    }
+    recipientRequest = new AbortController();
+
+    const response = await fetch(`/api/recipients?${params}`, { signal: recipientRequest.signal });
+    const data = await response.json();
+    if (data.error) {
+        throw new Error(data.error);
+    }
+    return data.recipients;
+};
+
+const renderRecipientOptions = (recipients) => {
+    recipientHistory = recipients;
+
     const datalist = document.getElementById('recipientList');
     if (datalist) {
         datalist.innerHTML = '';
-        filtered.forEach(recipient => {
+        recipients.forEach(recipient => {
             const option = document.createElement('option');
-            option.value = recipient;
+            option.value = recipient.recipient;
+            if (recipient.address) {
+                option.label = recipient.address;
+            }
             datalist.appendChild(option);
         });
     }
 };
 
+// Load the most used recipients safely
+const loadRecipientHistory = async () => {
+    try {
+        renderRecipientOptions(await fetchRecipients(''));
+    } catch (error) {
+        if (error.name !== 'AbortError') {
+            console.error('Error loading recipient history:', error);
+        }
+    }
+};
+
+// Suggest recipients for what has been typed so far
+const filterRecipients = (input) => {
+    if (!input) return;
+
+    clearTimeout(recipientTimer);
+    recipientTimer = setTimeout(async () => {
+        try {
+            renderRecipientOptions(await fetchRecipients(input.value.trim()));
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.error('Error loading recipients:', error);
+            }
+        }
+    }, 150);
+};
+
+// Fill in the latest address when a known recipient is picked
+const fillRecipientAddress = (input) => {
+    const addressInput = document.getElementById('address');
+    if (!input || !addressInput || addressInput.value.trim()) return;
+
+    const value = input.value.trim().toLowerCase();
+    const match = recipientHistory.find(r => r.recipient.toLowerCase() === value);
+    if (match && match.address) {
+        addressInput.value = match.address;
+    }
+};
+
 // Loading functions - NO DUPLICATES
 const showLoading = (targetElement = null) => {
     if (targetElement) {
@@ -266,7 +356,65 @@ const hideNoDataMessage = () => {
     if (receiptsTable) receiptsTable.style.display = 'block';
 };
 
+// Background jobs (export, import, ...): POST returns the job, GET /api/jobs/<id> reports progress
+const JOB_POLL_MS = 1000;
+
+const waitForJob = async (job, onProgress) => {
+    while (!['succeeded', 'failed', 'cancelled'].includes(job.status)) {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_MS));
+        const response = await fetch(`/api/jobs/${job.id}`);
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || `HTTP error! status: ${response.status}`);
+        }
+        job = data;
+        if (onProgress) {
+            onProgress(job);
+        }
+    }
+    return job;
+};
+
 // Export functions
+// Wait for the export job started by POST /api/export, save its workbook and return a summary message
+const downloadExport = async (response, onProgress) => {
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || `HTTP error! status: ${response.status}`);
+    }
+    
+    const job = await waitForJob(data, onProgress);
+    if (job.status === 'cancelled') {
+        throw new Error('Export dibatalkan');
+    }
+    if (job.status !== 'succeeded') {
+        throw new Error(job.error || 'Export gagal');
+    }
+    
+    // Fetch the whole workbook before saving it, so the rows are only reset
+    // (POST /api/jobs/<id>/confirm) once the file is on this machine
+    const download = await fetch(job.download_url);
+    if (!download.ok) {
+        throw new Error(`Download gagal (HTTP ${download.status})`);
+    }
+    const url = URL.createObjectURL(await download.blob());
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = job.result.filename || 'nota_export.xlsx';
+    document.body.appendChild(link);
+    link.click();
+    document.body.removeChild(link);
+    setTimeout(() => URL.revokeObjectURL(url), 60000);
+    
+    const confirmResponse = await fetch(`/api/jobs/${job.id}/confirm`, { method: 'POST' });
+    const confirmed = await confirmResponse.json();
+    if (!confirmResponse.ok) {
+        throw new Error(confirmed.error || `HTTP error! status: ${confirmResponse.status}`);
+    }
+    
+    return `Data berhasil diexport dan database direset! Total ${job.result.receipts_count} nota dan ${job.result.items_count} item.`;
+};
+
 const exportToExcel = async () => {
     try {
         const response = await fetch('/api/export', {
@@ -276,14 +424,10 @@ const exportToExcel = async () => {
             }
         });
         
-        const data = await response.json();
-        
-        if (data.error) {
-            throw new Error(data.error);
-        }
+        const message = await downloadExport(response);
         
         // Success
-        showSuccess(data.message);
+        showSuccess(message);
         
         // Reload page after export
         setTimeout(() => {
@@ -309,20 +453,18 @@ document.addEventListener('DOMContentLoaded', () => {
         if (document.getElementById('receiptsCount') || document.getElementById('dbProgress')) {
             try {
                 updateDatabaseStats();
-                // Auto-refresh stats every 30 seconds
-                setInterval(updateDatabaseStats, 30000);
+                // Counts are pushed on every change (polled when that is unavailable)
+                connectLiveUpdates();
             } catch (statsError) {
                 console.warn('Error loading database stats:', statsError);
             }
         }
         
-        // Load recipient history only if we're on the main form page
-        if (document.getElementById('recipientList')) {
-            try {
-                loadRecipientHistory();
-            } catch (historyError) {
-                console.warn('Error loading recipient history:', historyError);
-            }
+        // Recipient autocomplete only on the main form page
+        const recipientInput = document.getElementById('recipient');
+        if (document.getElementById('recipientList') && recipientInput) {
+            recipientInput.addEventListener('input', () => filterRecipients(recipientInput));
+            recipientInput.addEventListener('change', () => fillRecipientAddress(recipientInput));
         }
     } catch (error) {
         console.error('Error in DOMContentLoaded:', error);
@@ -341,8 +483,13 @@ window.NotaApp = {
     validateForm,
     calculateItemTotal,
     updateDatabaseStats,
+    showDatabaseStats,
+    connectLiveUpdates,
     loadRecipientHistory,
     filterRecipients,
+    fillRecipientAddress,
+    waitForJob,
+    downloadExport,
     exportToExcel,
     showLoading,
     hideLoading,
@@ -0,0 +1,374 @@
+"""Storage backends for receipts, items and users.
+
+The routes in app.py only talk to a ``Storage``; which database sits behind
+it is chosen by ``Config.STORAGE_BACKEND``:
+
+* ``supabase`` (default): PostgREST queries from repository.py over the
+  shared client in database.py; with ``ASYNC_IO`` a request's independent
+  queries are sent concurrently (async_storage.py).
+* ``sqlite``: a local SQLite file in WAL mode (sqlite_storage.py), built from
+  the same setup_*.sql schema. Single-site shops get in-process latency and
+  benchmarks can run without a network.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import repository
+from config import app_path
+from database import init_pool, get_client
+from metrics import DB_SECONDS, DB_ROWS, DB_ERRORS
+from receipt_numbers import reserve_receipt_numbers
+
+
+class Storage(ABC):
+    """Interface shared by all backends; a backend missing a method cannot be instantiated"""
+
+    name = None
+
+    @abstractmethod
+    def list_receipts(self, company=None, date_from=None, date_to=None, q=None,
+                      fields=None, limit=50, cursor=None, with_items=False):
+        """One page of receipts, newest first: ``(rows, next_cursor, total)``"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_receipt(self, receipt_id):
+        """Receipt with ``receipt['items']``, or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_receipts(self, ids):
+        """Receipts with their items, in the order of ``ids``"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch_receipts_for_batch(self, ids=None, company=None, date_from=None, date_to=None,
+                                 max_receipts=500):
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, q, company=None, date_from=None, date_to=None, limit=20, offset=0):
+        """Receipts whose own fields, or one of whose items, match every word of ``q``.
+
+        Best match first: ``(rows, total)``, each row with ``score`` and ``matched_items``.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_receipt(self, receipt_data, items):
+        """Insert a receipt and its items atomically; returns the new id"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def import_receipts(self, receipts):
+        """Insert receipts with their ``receipt['items']`` in one batch.
+
+        Receipt numbers that already exist are skipped with their items.
+        Returns the receipt numbers that were inserted.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def reserve_receipt_numbers(self, company_code, count=1):
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch_stats(self, companies):
+        raise NotImplementedError
+
+    @abstractmethod
+    def sales_report(self, period='month', date_from=None, date_to=None, company=None, top_items=5):
+        """Sales per company and ``period`` (day, week or month) from the rollup tables.
+
+        Rows ordered by company and period, each with ``company_code``,
+        ``period_start``, ``receipts_count``, ``items_count``, ``total_amount``
+        and the ``top_items`` best selling ``top_item_types`` by amount.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def replace_sales_rollups(self, daily, daily_items, max_receipt_id):
+        """Swap in recomputed daily rollups covering receipts up to ``max_receipt_id``"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_items(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def latest_receipt_id(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def receipts_watermark(self):
+        """Version of the receipts table: ``{'version', 'updated_at', 'last_created_at'}``.
+
+        ``version`` changes with every write (insert, export, archive);
+        ``updated_at`` is when it last changed, or None when unknown.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_rows(self, table, chunk_size=1000, max_receipt_id=None, columns=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_up_to(self, max_receipt_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_receipts(self, chunk_size=500, max_receipt_id=None, date_before=None):
+        """Receipts with items in id order, yielded as lists of up to ``chunk_size``"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_receipts(self, ids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_user(self, field, value):
+        """First user whose ``field`` (username or email) equals ``value``, or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_user(self, user_data):
+        """Insert a user; returns the stored row or None"""
+        raise NotImplementedError
+
+
+class SupabaseStorage(Storage):
+    """Supabase/PostgREST backend"""
+
+    name = 'supabase'
+
+    @property
+    def db(self):
+        db = get_client()
+        if db is None:
+            raise RuntimeError('Supabase is not configured')
+        return db
+
+    def list_receipts(self, company=None, date_from=None, date_to=None, q=None,
+                      fields=None, limit=50, cursor=None, with_items=False):
+        return repository.list_receipts(
+            self.db, company=company, date_from=date_from, date_to=date_to, q=q,
+            fields=fields, limit=limit, cursor=cursor, with_items=with_items
+        )
+
+    def get_receipt(self, receipt_id):
+        return repository.get_receipt_with_items(self.db, receipt_id)
+
+    def get_receipts(self, ids):
+        return repository.get_receipts_with_items(self.db, ids)
+
+    def fetch_receipts_for_batch(self, ids=None, company=None, date_from=None, date_to=None,
+                                 max_receipts=500):
+        return repository.fetch_receipts_for_batch(
+            self.db, ids=ids, company=company, date_from=date_from, date_to=date_to,
+            max_receipts=max_receipts
+        )
+
+    def search(self, q, company=None, date_from=None, date_to=None, limit=20, offset=0):
+        return repository.search_receipts(
+            self.db, q, company=company, date_from=date_from, date_to=date_to,
+            limit=limit, offset=offset
+        )
+
+    def create_receipt(self, receipt_data, items):
+        return repository.create_receipt(self.db, receipt_data, items)
+
+    def import_receipts(self, receipts):
+        return repository.import_receipts(self.db, receipts)
+
+    def reserve_receipt_numbers(self, company_code, count=1):
+        return reserve_receipt_numbers(self.db, company_code, count)
+
+    def fetch_stats(self, companies):
+        return repository.fetch_stats(self.db, companies)
+
+    def sales_report(self, period='month', date_from=None, date_to=None, company=None, top_items=5):
+        return repository.sales_report(
+            self.db, period=period, date_from=date_from, date_to=date_to, company=company,
+            top_items=top_items
+        )
+
+    def replace_sales_rollups(self, daily, daily_items, max_receipt_id):
+        repository.replace_sales_rollups(self.db, daily, daily_items, max_receipt_id)
+
+    def count_items(self):
+        return repository.count_items(self.db)
+
+    def latest_receipt_id(self):
+        return repository.latest_receipt_id(self.db)
+
+    def receipts_watermark(self):
+        return repository.receipts_watermark(self.db)
+
+    def iter_rows(self, table, chunk_size=1000, max_receipt_id=None, columns=None):
+        return repository.iter_rows(self.db, table, chunk_size, max_receipt_id, columns)
+
+    def delete_up_to(self, max_receipt_id):
+        repository.delete_up_to(self.db, max_receipt_id)
+
+    def iter_receipts(self, chunk_size=500, max_receipt_id=None, date_before=None):
+        return repository.iter_receipts(self.db, chunk_size, max_receipt_id, date_before)
+
+    def delete_receipts(self, ids):
+        repository.delete_receipts(self.db, ids)
+
+    def find_user(self, field, value):
+        response = self.db.table('users').select('*').eq(field, value).execute()
+        return response.data[0] if response.data else None
+
+    def create_user(self, user_data):
+        response = self.db.table('users').insert(user_data).execute()
+        return response.data[0] if response.data else None
+
+
+# Storage method -> (table, operation) labels for the query metrics
+QUERY_LABELS = {
+    'list_receipts': ('receipts', 'list'),
+    'get_receipt': ('receipts', 'get'),
+    'get_receipts': ('receipts', 'get_many'),
+    'fetch_receipts_for_batch': ('receipts', 'batch'),
+    'search': ('receipts', 'search'),
+    'create_receipt': ('receipts', 'insert'),
+    'import_receipts': ('receipts', 'import'),
+    'reserve_receipt_numbers': ('receipt_counters', 'reserve'),
+    'fetch_stats': ('receipts', 'stats'),
+    'sales_report': ('sales_daily', 'report'),
+    'replace_sales_rollups': ('sales_daily', 'replace'),
+    'count_items': ('items', 'count'),
+    'latest_receipt_id': ('receipts', 'latest_id'),
+    'receipts_watermark': ('table_versions', 'watermark'),
+    'iter_rows': (None, 'scan'),  # table is the first argument
+    'delete_up_to': ('receipts', 'delete'),
+    'iter_receipts': ('receipts', 'scan_with_items'),
+    'delete_receipts': ('receipts', 'delete'),
+    'find_user': ('users', 'get'),
+    'create_user': ('users', 'insert'),
+}
+
+
+def _row_count(method, args, kwargs, result):
+    if result is None:
+        return 0
+    if method == 'create_receipt':  # the receipt plus its items
+        items = args[1] if len(args) > 1 else kwargs.get('items')
+        return 1 + len(items or [])
+    if isinstance(result, tuple):  # list_receipts/search: (rows, ...)
+        return len(result[0])
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+
+class InstrumentedStorage:
+    """Wraps a backend and records duration, row count and errors of every call"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+
+    def __getattr__(self, attr):
+        fn = getattr(self.backend, attr)
+        if attr not in QUERY_LABELS or not callable(fn):
+            return fn
+        if attr in ('iter_rows', 'iter_receipts'):
+            wrapper = self._iter_wrapper(attr, fn)
+        else:
+            wrapper = self._wrapper(attr, fn)
+        setattr(self, attr, wrapper)  # built once per method
+        return wrapper
+
+    def _wrapper(self, method, fn):
+        table, operation = QUERY_LABELS[method]
+        labels = {'backend': self.name, 'table': table, 'operation': operation}
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                DB_ERRORS.inc(**labels)
+                raise
+            finally:
+                DB_SECONDS.observe(time.perf_counter() - start, **labels)
+            DB_ROWS.observe(_row_count(method, args, kwargs, result), **labels)
+            return result
+        return wrapper
+
+    def _iter_wrapper(self, method, fn):
+        table, operation = QUERY_LABELS[method]
+
+        def wrapper(*args, **kwargs):
+            # Only time spent fetching counts, not the caller's work between rows
+            labels = {'backend': self.name, 'table': table or args[0], 'operation': operation}
+            rows = fn(*args, **kwargs)
+            elapsed, count = 0.0, 0
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        row = next(rows)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - start
+                    count += len(row) if method == 'iter_receipts' else 1
+                    yield row
+            except Exception:
+                DB_ERRORS.inc(**labels)
+                raise
+            finally:
+                DB_SECONDS.observe(elapsed, **labels)
+                DB_ROWS.observe(count, **labels)
+        return wrapper
+
+
+_storage = None
+_archive = None
+_storage_lock = threading.Lock()
+
+
+def init_storage(config):
+    """Create the process-wide storage backend from a Flask config mapping.
+
+    Returns None when the selected backend is not configured.
+    """
+    global _storage, _archive
+    backend = (config.get('STORAGE_BACKEND') or 'supabase').lower()
+    with _storage_lock:
+        if backend == 'sqlite':
+            from sqlite_storage import SQLiteStorage
+            _storage = InstrumentedStorage(SQLiteStorage(config.get('SQLITE_PATH') or app_path('nota.db')))
+        elif backend == 'supabase':
+            if init_pool(config) is None:
+                _storage = None
+            elif config.get('ASYNC_IO'):
+                from async_storage import AsyncSupabaseStorage
+                _storage = InstrumentedStorage(AsyncSupabaseStorage(config.get('SUPABASE_MAX_CONNECTIONS', 20)))
+            else:
+                _storage = InstrumentedStorage(SupabaseStorage())
+        else:
+            raise ValueError(f'Unknown STORAGE_BACKEND: {backend}')
+
+        # Old receipts live on in the archive (archive.py); reads fall through to it
+        _archive = None
+        if config.get('ARCHIVE_DIR'):
+            from archive import ReceiptArchive, ArchivedStorage
+            _archive = ReceiptArchive(config['ARCHIVE_DIR'])
+            if _storage is not None:
+                _storage = ArchivedStorage(_storage, _archive)
+    return _storage
+
+
+def get_storage():
+    """The storage backend for this process, or None when not configured"""
+    return _storage
+
+
+def get_archive():
+    """The receipt archive, or None when ARCHIVE_DIR is not set"""
+    return _archive
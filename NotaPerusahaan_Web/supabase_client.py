@@ -0,0 +1,95 @@
+"""Supabase SDK plumbing behind database.SupabasePool.
+
+Importing httpx and supabase-py is the slowest part of starting the app, so
+this module is imported on first use by ``SupabasePool._build_client``
+rather than at start-up.
+"""
+import httpx
+from supabase import create_client
+
+try:
+    from supabase.lib.client_options import SyncClientOptions
+except ImportError:  # older supabase-py without custom httpx client support
+    SyncClientOptions = None
+
+# Errors that mean the connection itself went bad (stale keep-alive socket,
+# server closed the connection, DNS/TCP failure) rather than a query error.
+RECONNECT_ERRORS = (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError, httpx.WriteError)
+
+
+class _CountingTransport(httpx.HTTPTransport):
+    """HTTP transport that counts connection reuse and retries once on a dropped connection"""
+
+    def __init__(self, pool, **kwargs):
+        super().__init__(**kwargs)
+        self._owner = pool
+
+    def handle_request(self, request):
+        try:
+            return self._send(request)
+        except RECONNECT_ERRORS as e:
+            # Nothing reached the server on a connect error, and GET/HEAD are safe to repeat
+            if not isinstance(e, httpx.ConnectError) and request.method not in ('GET', 'HEAD'):
+                self._owner.record_failure(e)
+                raise
+            self._owner.record_reconnect(e)
+
+        try:
+            return self._send(request)
+        except RECONNECT_ERRORS as e:
+            self._owner.record_failure(e)
+            raise
+
+    def _send(self, request):
+        state = {'connected': False}
+
+        def trace(event_name, info):
+            if event_name == 'connection.connect_tcp.complete':
+                state['connected'] = True
+            elif event_name == 'connection.start_tls.complete':
+                self._owner.record_handshake()
+
+        request.extensions = {**request.extensions, 'trace': trace}
+        response = super().handle_request(request)
+        self._owner.record_request(reused=not state['connected'])
+        return response
+
+
+class _TrackedClient(httpx.Client):
+    """HTTP client that tells the pool while a request is in flight on it"""
+
+    def __init__(self, pool, **kwargs):
+        super().__init__(**kwargs)
+        self._owner = pool
+
+    def send(self, request, **kwargs):
+        self._owner.acquire(self)
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            self._owner.release(self)
+
+
+def build_client(pool):
+    """A new ``(httpx_client, supabase_client)`` pair for ``pool``; httpx_client is None on old SDKs"""
+    if SyncClientOptions is None:
+        return None, create_client(pool.url, pool.key)
+
+    http = _TrackedClient(
+        pool,
+        transport=_CountingTransport(
+            pool,
+            limits=httpx.Limits(
+                max_connections=pool.max_connections,
+                max_keepalive_connections=pool.max_connections,
+                keepalive_expiry=pool.keepalive_expiry,
+            ),
+        ),
+        timeout=pool.timeout,
+    )
+    try:
+        client = create_client(pool.url, pool.key, options=SyncClientOptions(httpx_client=http))
+    except Exception:
+        http.close()
+        raise
+    return http, client